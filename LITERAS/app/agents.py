@@ -1,39 +1,82 @@
 
+import asyncio
 import json
-from typing import Dict, List
+import logging
+import os
+import time
+from typing import Dict, List, Optional
 from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.teams import SelectorGroupChat
 from autogen_agentchat.conditions import TextMentionTermination, MaxMessageTermination
 from autogen_agentchat.messages import TextMessage
+from autogen_core.models import ChatCompletionClient
 from autogen_core.tools import FunctionTool
-from autogen_ext.models.openai import OpenAIChatCompletionClient
-from .tools import pubmed_search
+from .tools import pubmed_search, pubmed_multi_search, pubmed_large_search, rank_articles
+from .articles import Article
+from .run_context import RunContext, current_run
+from .metrics import RunMetrics, get_metrics_registry
+from .run_budget import RunBudget, RunBudgetTermination
+from .reference_check import ReferenceConsistencyCritic
+from .citations import FormatterAgent
+from .validator import ShardedValidator
+from .context_manager import TeamContextManager, format_context_report
+from .message_parsing import extract_approved_references, extract_json
+from .model_clients import MeteredModelClient, TokenStreamingClient
+from .model_routing import ModelRouter
+from .topic_cache import TopicCache, get_topic_cache, topic_cache_mode
+
+logger = logging.getLogger(__name__)
+
 
 class AcademicSearchTeam:
-    def __init__(self, model: str = "gpt-4o-mini", api_key: str = None):
+    def __init__(self, model: str = "gpt-4o-mini", api_key: str = None,
+                 model_client: Optional[ChatCompletionClient] = None):
         # model client
         self.start_time = None
         self.refine_search_count = 0
         self.proceed_to_synthesis_count = 0
         self.validator_scores = []
         self.total_studies = 0
-        self.reference_validation_count = 0          
-        self.model_client = OpenAIChatCompletionClient(
-            model=model,
-            temperature=0.7,
-            api_key=api_key
-        )
+        self.reference_validation_count = 0
+        self.approved_papers = []
+        self.planned_queries = []
+        self.run_context = None
+        # A run stopped by its time budget or by cancellation, until reset() drains it
+        self._stopping: Optional[asyncio.Task] = None
+        self.run_budget = RunBudget.from_env()
+        # Per-agent models from MODEL_ROUTES; an injected client (e.g. the benchmark replay client) serves every agent
+        self.model_router = ModelRouter.from_env(model=model, api_key=api_key, model_client=model_client)
+        self.model_client = self.model_router.client_for("default")
+        self.context_manager = TeamContextManager.from_env([
+            "QueryPlanner", "SearchAgent", "Validator", "Critic",
+            "SynthesisAgent", "ReferenceConsistencyCritic", "FormatterAgent"
+        ])
 
         #tools
         self.pubmed_tool = FunctionTool(
             pubmed_search,
             description="Search PubMed for academic articles and return structured results"
         )
+        self.pubmed_multi_tool = FunctionTool(
+            pubmed_multi_search,
+            description="Run a list of PubMed queries concurrently and return the deduplicated "
+                        "articles with per-query hit counts and overlap statistics"
+        )
+        self.pubmed_large_tool = FunctionTool(
+            pubmed_large_search,
+            description="Screen up to thousands of PubMed hits for one broad query and return only "
+                        "the best-matching articles after local pre-scoring"
+        )
+        self.rank_tool = FunctionTool(
+            rank_articles,
+            description="Rank all articles retrieved so far in this run against a topic or "
+                        "subtheme using a local BM25 index"
+        )
 
         #agents
         self.query_planner = AssistantAgent(
             name="QueryPlanner",
-            model_client=self.model_client,
+            model_client=self.context_manager.client_for("QueryPlanner", self.model_router.client_for("QueryPlanner")),
             description="Expert at generating comprehensive search queries",
             system_message="""You are an expert at developing comprehensive academic search strategies.
             For any given research topic:
@@ -59,57 +102,36 @@ class AcademicSearchTeam:
 
         self.search_agent = AssistantAgent(
             name="SearchAgent",
-            model_client=self.model_client,
-            tools=[self.pubmed_tool],
+            model_client=self.context_manager.client_for("SearchAgent", self.model_router.client_for("SearchAgent")),
+            tools=[self.pubmed_multi_tool, self.pubmed_tool, self.pubmed_large_tool, self.rank_tool],
             description="Academic literature search execution specialist",
             system_message="""You are an expert at executing comprehensive academic searches.
-            For each query provided:
-            1. Execute search using pubmed_search tool
-            2. Track which queries yielded the most relevant results
-            3. Remove duplicate results across queries
-            4. Maintain a count of total unique articles found
-            5. For each successful query, report:
+            For the queries provided:
+            1. Execute ALL main_queries in a single pubmed_multi_search call
+               (use pubmed_search only for an individual follow-up query)
+            2. Track which queries yielded the most relevant results using query_stats
+            3. Duplicates across queries are already removed in the returned articles;
+               articles marked "already_returned" were sent earlier in this run and are
+               identified only by their citation_key
+            4. Report the total unique articles found from the overlap statistics
+               and the best-matching papers from topic_ranking; use rank_articles to
+               check coverage of a specific subtheme without searching again
+            5. For a broad topic where the focused queries return few relevant papers,
+               use pubmed_large_search on the core query to screen a large result set
+            6. For each successful query, report:
                - Number of results found
                - Brief assessment of result relevance
                - Any suggested query refinements"""
         )
 
-        self.validator_agent = AssistantAgent(
-            name="Validator",
-            model_client=self.model_client,
-            description="Paper scoring specialist",
-            system_message="""Score each article using these criteria (total 25 points):
-            1. Direct relevance to the research topic (0-5 points)
-            2. Recency of publication (0-5 points)
-            3. Study type/methodology (0-5 points)
-            4. Clinical applicability (0-5 points)
-            5. Innovation/novelty (0-5 points)
-            
-            Format output as:
-            {
-                "scored_papers": [
-                    {
-                        "title": "paper title",
-                        "doi": "doi number",
-                        "relevance_score": X,
-                        "recency_score": Y,
-                        "methodology_score": Z,
-                        "applicability_score": A,
-                        "innovation_score": B,
-                        "total_score": N,
-                        "reason": "explanation"
-                    }
-                ],
-                "summary": {
-                    "total_papers": N,
-                    "high_quality_papers": M  # papers scoring ≥20 total
-                }
-            }"""
+        # Scores the round's papers in concurrent shards and merges them into one scored_papers message
+        self.validator_agent = ShardedValidator(
+            model_client=self.context_manager.client_for("Validator", self.model_router.client_for("Validator"))
         )
 
         self.critic_agent = AssistantAgent(
             name="Critic",
-            model_client=self.model_client,
+            model_client=self.context_manager.client_for("Critic", self.model_router.client_for("Critic")),
             description="Search and validation quality critic",
             system_message="""Evaluate both search results and validation scores.
 
@@ -138,7 +160,7 @@ class AcademicSearchTeam:
                     "year": "YYYY",
                     "journal": "full journal name",
                     "doi": "doi number",
-                    "citation_key": "Author2024" // FirstAuthorYear format
+                    "citation_key": "Author2024" // use the citation_key returned by the search tools
                 },
                 // ... other papers
             ]
@@ -158,7 +180,9 @@ class AcademicSearchTeam:
         
         self.synthesis_agent = AssistantAgent(
             name="SynthesisAgent",
-            model_client=self.model_client,
+            model_client=self.context_manager.client_for(
+                "SynthesisAgent", TokenStreamingClient(self.model_router.client_for("SynthesisAgent"), stage="synthesis_token")
+            ),
             description="Medical research paper introduction specialist",
             system_message="""You are an expert at writing medical research paper introductions with proper citations.
             IMPORTANT: Only use references that have been validated by the Critic agent.
@@ -167,6 +191,7 @@ class AcademicSearchTeam:
             2. NO external citations (e.g., WHO, general statistics)
             3. ALL claims must be supported by approved references
             4. NO general statements without specific citations
+            5. Cite in the text by citation_key in square brackets, e.g. [Smith2024] or [Smith2024; Lee2023b]
             
             Create a structured introduction following this format:
 
@@ -199,90 +224,51 @@ class AcademicSearchTeam:
             State "SYNTHESIS_COMPLETE\""""
         )
         
-        #reference consistency critic
-        self.reference_consistency_critic = AssistantAgent(
-            name="ReferenceConsistencyCritic",
-            model_client=self.model_client,
-            description="Validates synthesis references against approved list",
-            system_message="""Validate that synthesis ONLY uses approved references.
-
-            CHECK EACH:
-            1. Extract all citations from synthesis text
-            2. Compare against approved_references from critic agent
-            3. Verify:
-               - Citation format matches citation_key
-               - Claims align with cited paper content
-               
-            Output Format if ANY issues:
-            ```
-            REVISE_NEEDED
-
-            Invalid Citations:
-            1. Line: [text with citation]
-               Found: [current citation]
-               Required: [correct citation_key]
-               
-            Available Approved References:
-            [List citation_keys and details]
-
-            Revise synthesized text to use correct citations.
-            ```
-
-            Output if all valid:
-            ```
-            PROCEED_TO_FORMATTING
-
-            Validation Summary:
-            - Total citations: [number]
-            - All citations match approved keys
-            - Citation contexts verified
-            ```"""
+        #reference consistency critic: deterministic citation check, optional LLM claim check
+        self.reference_consistency_critic = ReferenceConsistencyCritic(
+            claim_check_client=self.context_manager.client_for(
+                "ReferenceConsistencyCritic", self.model_router.client_for("ReferenceConsistencyCritic")
+            )
+            if os.getenv("REFERENCE_CLAIM_CHECK", "false").lower() == "true" else None
         )
 
-        self.formatter_agent = AssistantAgent(
-            name="FormatterAgent",
-            model_client=self.model_client,
-            description="Medical paper formatter specialist",
-            system_message="""Format the final paper in markdown:
-            
-            # [Paper Title]
-            
-            ## Introduction
-            [Copy introduction sections from synthesis]
-            
-            ## References
-            
-            1. Author(s). Title. *Journal*. Year;Volume(Issue):Pages. DOI
-            2. [Continue reference list]
-            
-            State '**TERMINATE**' when complete."""
-        )
+        # Deterministic formatter: reference list rendered from PubMed metadata (CITATION_STYLE)
+        self.formatter_agent = FormatterAgent()
         
         self.current_phase = "SEARCH"
 
         def selector_func(messages):
-            if not messages:
+            # The thread always holds the task message, so a run starts with exactly that one message
+            if len(messages) == 1 and messages[-1].source == "user" and self.current_phase == "SEARCH":
                 self.start_time = time.time()
+                if self.run_context is not None:
+                    self.run_context.metrics.enter_phase("SEARCH")
                 return "QueryPlanner"
             
             last_message = messages[-1]
             content = str(last_message.content).upper()
 
-            # Track metrics - keep existing tracking
-            if last_message.source == "Critic":
-                if "REFINE_SEARCH" in content:
-                    self.refine_search_count += 1
-                if "PROCEED_TO_SYNTHESIS" in content:
-                    self.proceed_to_synthesis_count += 1
-                    
+            # Publish structured progress for the client
+            if self.run_context is not None:
+                if last_message.source == "QueryPlanner":
+                    plan = extract_json(last_message.content)
+                    if isinstance(plan, dict) and plan.get("main_queries"):
+                        self.planned_queries = plan["main_queries"]
+                        self.run_context.emit("queries_planned", plan["main_queries"])
+
+            # Track metrics; loop counters are incremented where the loop is taken below.
+            # Each Validator turn scores only the round's new papers, so totals use the merged list
             if last_message.source == "Validator":
-                try:
-                    scores = json.loads(content)
-                    if "scored_papers" in scores:
-                        self.validator_scores.extend(scores["scored_papers"])
-                        self.total_studies = len(scores["scored_papers"])
-                except:
-                    pass
+                scores = extract_json(last_message.content)
+                if isinstance(scores, dict) and isinstance(scores.get("scored_papers"), list):
+                    self.validator_scores.extend(scores["scored_papers"])
+                    self.total_studies = len(self.validator_scores)
+                    if self.run_context is not None:
+                        self.run_context.emit("validator_scores", list(self.validator_scores))
+
+            # Warm start from the topic cache: the approved references are in the task message
+            if last_message.source == "user" and self.current_phase == "SYNTHESIS":
+                return "SynthesisAgent"
 
             # Selection logic with reference validation
             if self.current_phase == "SEARCH":
@@ -291,19 +277,36 @@ class AcademicSearchTeam:
                 if last_message.source == "Validator":
                     return "Critic"
                 if last_message.source == "Critic":
+                    if "REFINE_SEARCH" in content and not self.run_budget.refine_allowed(self.refine_search_count):
+                        # Out of refine loops: synthesize from the best papers scored so far
+                        self.current_phase = "SYNTHESIS"
+                        self.approved_papers = self._fallback_references()
+                        if self.run_context is not None:
+                            self.run_context.metrics.record_budget(
+                                f"refine limit of {self.run_budget.max_refine_loops} reached; "
+                                f"proceeding with {len(self.approved_papers)} best-scored papers"
+                            )
+                            self.run_context.metrics.enter_phase("SYNTHESIS")
+                            self.run_context.approved_references = self.approved_papers
+                            self.run_context.emit("approved_references", self.approved_papers)
+                        return "SynthesisAgent"
                     if "REFINE_SEARCH" in content:
                         self.refine_search_count += 1
-
+                        if self.run_context is not None:
+                            self.run_context.metrics.count_loop("refine_search")
+                            self.run_context.metrics.enter_phase("SEARCH")
                         return "QueryPlanner"
                     if "PROCEED_TO_SYNTHESIS" in content:
                         self.current_phase = "SYNTHESIS"
                         self.proceed_to_synthesis_count += 1
+                        if self.run_context is not None:
+                            self.run_context.metrics.enter_phase("SYNTHESIS")
 
                         # Store approved papers from critic for reference validation
-                        try:
-                            self.approved_papers = json.loads(last_message.content).get("approved_papers", [])
-                        except:
-                            self.approved_papers = []
+                        self.approved_papers = extract_approved_references(last_message.content)
+                        if self.run_context is not None:
+                            self.run_context.approved_references = self.approved_papers
+                            self.run_context.emit("approved_references", self.approved_papers)
                         return "SynthesisAgent"
                 if last_message.source == "QueryPlanner":
                     return "SearchAgent"
@@ -313,12 +316,23 @@ class AcademicSearchTeam:
                     if "SYNTHESIS_COMPLETE" in content:
                         return "ReferenceConsistencyCritic"
                 if last_message.source == "ReferenceConsistencyCritic":
+                    if "REVISE_NEEDED" in content and not self.run_budget.revise_allowed(self.reference_validation_count):
+                        # Out of revise loops: format the latest synthesis as it stands
+                        if self.run_context is not None:
+                            self.run_context.metrics.record_budget(
+                                f"revise limit of {self.run_budget.max_revise_loops} reached; formatting latest draft"
+                            )
+                            self.run_context.metrics.enter_phase("FORMATTING")
+                        return "FormatterAgent"
                     if "REVISE_NEEDED" in content:
                         self.reference_validation_count += 1  # Increment counter
-
-
+                        if self.run_context is not None:
+                            self.run_context.metrics.count_loop("revise_synthesis")
+                            self.run_context.metrics.enter_phase("SYNTHESIS")
                         return "SynthesisAgent"
                     if "PROCEED_TO_FORMATTING" in content:
+                        if self.run_context is not None:
+                            self.run_context.metrics.enter_phase("FORMATTING")
                         return "FormatterAgent"
                 if last_message.source == "FormatterAgent" and "TERMINATE" in content:
                     return None
@@ -336,14 +350,118 @@ class AcademicSearchTeam:
                 self.reference_consistency_critic,  # Add new critic
                 self.formatter_agent
             ],
-            model_client=self.model_client,
-            termination_condition=TextMentionTermination("TERMINATE"),
+            model_client=MeteredModelClient(self.model_router.client_for("Selector"), "Selector"),
+            termination_condition=self._termination_condition(),
             selector_func=selector_func
         )
 
         
-    async def process_query(self, query: str):
+    def _termination_condition(self):
+        """
+        Stop on TERMINATE, or when the message, token or wall-time budget runs out.
+        """
+        condition = TextMentionTermination("TERMINATE") | RunBudgetTermination(self.run_budget)
+        if self.run_budget.max_messages:
+            condition = condition | MaxMessageTermination(self.run_budget.max_messages)
+        return condition
+
+    def _fallback_references(self, limit: int = 10) -> List[Dict]:
+        """
+        Best papers of the run so far, by Validator total score or else by prescore.
+        """
+        run = self.run_context
+        if run is None:
+            return []
+
+        def total(paper: Dict) -> float:
+            try:
+                return float(paper.get("total_score") or 0)
+            except (TypeError, ValueError):
+                return 0.0
+
+        articles = []
+        for paper in sorted(self.validator_scores, key=total, reverse=True):
+            article = run.articles.get_by_key(paper["citation_key"]) if paper.get("citation_key") else None
+            article = article or run.articles.get(doi=paper.get("doi"))
+            if article is not None and article not in articles:
+                articles.append(article)
+        if not articles:
+            ranked = sorted(run.prescores.items(), key=lambda item: item[1]["prescore_total"], reverse=True)
+            articles = [run.articles.get_by_key(key) for key, _ in ranked]
+
+        return [
+            {
+                "title": article.title,
+                "authors": article.author_names(limit=3),
+                "year": article.year,
+                "journal": article.journal,
+                "doi": article.doi,
+                "citation_key": article.citation_key
+            }
+            for article in articles[:limit] if article is not None
+        ]
+
+    def _best_result(self, reason: str, draft: Optional[str]) -> str:
+        """
+        Markdown for a run stopped by its budget: the latest draft, or the best references found.
+        """
+        lines = [f"_Run stopped early ({reason}); showing the best result so far._", ""]
+        if draft:
+            lines.append(draft.replace("SYNTHESIS_COMPLETE", "").strip())
+            return "\n".join(lines)
+
+        references = self.approved_papers or self._fallback_references()
+        lines.append("## Best references found")
+        lines.append("")
+        for i, ref in enumerate(references, 1):
+            authors = ", ".join(ref.get("authors") or [])
+            doi = f" DOI: {ref['doi']}" if ref.get("doi") else ""
+            lines.append(f"{i}. {authors}. {ref.get('title')}. *{ref.get('journal')}*. {ref.get('year')}.{doi}")
+        if not references:
+            lines.append("No papers were retrieved before the budget ran out.")
+        return "\n".join(lines)
+
+    async def process_query(self, query: str, run_id: Optional[str] = None):
+        """
+        Run the pipeline for one topic, yielding agent updates and progress events.
+
+        Progress events from tools, the selector and the synthesis token
+        stream are interleaved with agent messages as soon as they happen.
+        Closing the generator cancels the run. run_id names the run in the
+        metrics (a job passes its own ID).
+        """
+        await self._drain()
+        events: asyncio.Queue = asyncio.Queue()
+        self.run_context = RunContext(topic=query, events=events, metrics=RunMetrics(query, run_id))
+        metrics = self.run_context.metrics
+        registry = get_metrics_registry()
+        registry.start(metrics)
+        run_token = current_run.set(self.run_context)
+        run_task = None
         try:
+            cache = get_topic_cache()
+            cached = cache.lookup(query) if cache is not None else None
+            if cache is not None:
+                metrics.record_cache("topic", int(cached is not None), int(cached is None))
+            warm_note = ""
+            if cached is not None:
+                entry, similarity = cached
+                mode = topic_cache_mode()
+                yield {"type": "progress", "stage": "topic_cache_hit", "data": {
+                    "topic": entry["topic"], "similarity": similarity,
+                    "age_s": round(time.time() - entry["created"]), "mode": mode
+                }}
+                if mode == "serve" and entry.get("markdown"):
+                    yield {"type": "update", "agent": "FormatterAgent", "content": entry["markdown"]}
+                    metrics.finish("completed")
+                    return
+                approved = self._warm_start(entry)
+                warm_note = (
+                    "\n\nWarm start: a previous run on a similar topic already completed the search phase.\n"
+                    "Approved References:\n" + json.dumps(approved, indent=2) +
+                    "\nProceed directly to synthesis using only these references."
+                )
+
             initial_message = TextMessage(
                 content=f"""Research Topic: {query}
 
@@ -378,22 +496,183 @@ class AcademicSearchTeam:
                 - All synthesis revisions require critic approval
                 - Citations must exactly match approved references
                 - No reference hallucination
-                - Maintain academic integrity through validation cycles""",
+                - Maintain academic integrity through validation cycles""" + warm_note,
                 source="user"
             )
             
-            async for message in self.team.run_stream(task=initial_message):
-                if hasattr(message, 'source') and hasattr(message, 'content'):
-                    yield {
-                        "type": "update",
-                        "agent": message.source,
-                        "content": message.content
-                    }
+            finished = object()
+            outcome = {"formatted": False, "draft": None, "stop_reason": None, "markdown": None}
+
+            async def run_team():
+                last_source = None
+                last_time = time.perf_counter()
+                try:
+                    async for message in self.team.run_stream(task=initial_message):
+                        if hasattr(message, 'stop_reason'):
+                            outcome["stop_reason"] = message.stop_reason
+                        if hasattr(message, 'source') and hasattr(message, 'content'):
+                            if message.source == "SynthesisAgent" and isinstance(message.content, str):
+                                outcome["draft"] = message.content
+                            if message.source == "FormatterAgent":
+                                outcome["formatted"] = True
+                                outcome["markdown"] = message.content
+                            # Time since the previous message is charged to the agent that produced this one
+                            now = time.perf_counter()
+                            if message.source != "user":
+                                metrics.record_turn(message.source, now - last_time, message.source != last_source)
+                            last_source, last_time = message.source, now
+                            events.put_nowait({
+                                "type": "update",
+                                "agent": message.source,
+                                "content": message.content
+                            })
+                finally:
+                    events.put_nowait(finished)
+
+            # The task inherits this context, so tools and clients see the RunContext
+            run_task = asyncio.create_task(run_team())
+            max_wall_time = self.run_budget.max_wall_time_s
+            while True:
+                try:
+                    update = await asyncio.wait_for(
+                        events.get(),
+                        timeout=max(max_wall_time - metrics.elapsed(), 0) if max_wall_time else None
+                    )
+                except asyncio.TimeoutError:
+                    # A hard deadline: the team is stopped mid-turn and drained later, by reset()
+                    metrics.record_budget_stop(f"time budget of {max_wall_time:g}s reached")
+                    self._abort_run(run_task)
+                    break
+                if update is finished:
+                    break
+                yield update
+            if self._stopping is None:
+                await run_task
+
+            if not outcome["formatted"] and outcome["stop_reason"] and metrics.budget_stop is None \
+                    and "TERMINATE" not in outcome["stop_reason"]:
+                metrics.record_budget_stop(outcome["stop_reason"])
+            if not outcome["formatted"] and metrics.budget_stop is not None:
+                yield {"type": "progress", "stage": "budget_exhausted", "data": metrics.budget_stop}
+                yield {
+                    "type": "update",
+                    "agent": "RunBudget",
+                    "content": self._best_result(metrics.budget_stop, outcome["draft"])
+                }
             
-            await self.team.reset()
+            if self._stopping is None:
+                await self.team.reset()
+            if cache is not None and outcome["formatted"] and metrics.budget_stop is None:
+                self._store_topic(cache, query, outcome["markdown"], cached[0] if cached else None)
+            # Budget-stopped runs stay out of the completed totals and wall-time percentiles
+            metrics.finish("budget_stopped" if metrics.budget_stop is not None else "completed")
+            # Per-model tokens, latency and cost are in the metrics registry and the run trace
+            logger.info(format_context_report(self.run_context.context_stats))
+            logger.info("Run %s finished in %.1fs (%d refine, %d revise loops)", metrics.run_id, metrics.wall_time_s,
+                        metrics.loops["refine_search"], metrics.loops["revise_synthesis"])
             
         except Exception as e:
+            metrics.finish("failed")
             yield {
                 "type": "error",
                 "message": str(e)
             }
+        finally:
+            # Still running here means the consumer closed the generator early
+            metrics.finish("cancelled")
+            registry.finish(metrics)
+            if run_task is not None and not run_task.done():
+                self._abort_run(run_task)
+            try:
+                current_run.reset(run_token)
+            except ValueError:
+                # The generator was closed from a different context
+                pass
+
+    def _abort_run(self, run_task: asyncio.Task):
+        """
+        Stop the team's run now, without waiting for the current agent turn.
+
+        Cancelling run_task alone is not enough: run_stream's cleanup waits
+        for the runtime to go idle, which lets an in-flight LLM call or PubMed
+        search finish first. The runtime's message handlers are cancelled
+        too, and the stopped run is drained by reset() or the next run.
+        """
+        for task in list(getattr(self.team._runtime, "_background_tasks", ())):
+            task.cancel()
+        run_task.cancel()
+        self._stopping = run_task
+
+    async def _drain(self):
+        """
+        Wait for a stopped run to unwind and reset the team for reuse.
+        """
+        if self._stopping is None:
+            return
+        task, self._stopping = self._stopping, None
+        await asyncio.wait([task])
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Stopped run ended with an error", exc_info=task.exception())
+        await self.team.reset()
+
+    def _warm_start(self, entry: Dict) -> List[Dict]:
+        """
+        Seed the run with a cached topic's approved articles and skip to synthesis.
+
+        The cached records are added to the run's store, so citation keys are
+        reassigned there and the approved references follow the new keys.
+        """
+        run = self.run_context
+        keys = {}
+        articles = []
+        for record in entry.get("articles") or []:
+            article, _ = run.articles.add(Article.from_record(record))
+            keys[record.get("citation_key")] = article.citation_key
+            articles.append(article)
+        run.index.add_articles(articles)
+
+        self.approved_papers = [
+            {**ref, "citation_key": keys.get(ref.get("citation_key"), ref.get("citation_key"))}
+            for ref in entry.get("approved_references") or []
+        ]
+        self.current_phase = "SYNTHESIS"
+        run.approved_references = self.approved_papers
+        run.metrics.enter_phase("SYNTHESIS")
+        run.emit("approved_references", self.approved_papers)
+        return self.approved_papers
+
+    def _store_topic(self, cache: TopicCache, query: str, markdown: str, warm_entry: Optional[Dict]):
+        """
+        Store the run's approved articles; a warm-started run keeps its entry's queries and age.
+        """
+        run = self.run_context
+        articles = []
+        for ref in self.approved_papers:
+            article = run.articles.get_by_key(ref["citation_key"]) if ref.get("citation_key") else None
+            if article is not None:
+                articles.append(article.to_record())
+        try:
+            cache.put(query, self.planned_queries or (warm_entry["queries"] if warm_entry else []),
+                      self.approved_papers, articles, markdown,
+                      created=warm_entry["created"] if warm_entry else None)
+        except Exception:
+            logger.exception("Error storing topic cache entry")
+
+    async def reset(self):
+        """
+        Clear per-run state so the team can be reused for the next query.
+        """
+        self.start_time = None
+        self.refine_search_count = 0
+        self.proceed_to_synthesis_count = 0
+        self.validator_scores = []
+        self.total_studies = 0
+        self.reference_validation_count = 0
+        self.approved_papers = []
+        self.planned_queries = []
+        self.run_context = None
+        self.current_phase = "SEARCH"
+        if self._stopping is not None:
+            await self._drain()
+        else:
+            await self.team.reset()
@@ -0,0 +1,172 @@
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+@dataclass(slots=True)
+class Article:
+    """
+    Compact in-memory PubMed article record.
+
+    Missing metadata is None instead of placeholder strings. Records built
+    from the parser/cache dicts are shared through ArticleStore, so a paper
+    found by several queries or refine loops is one object per run.
+    """
+    pmid: str
+    title: Optional[str] = None
+    abstract_sections: List[Dict] = field(default_factory=list)
+    journal: Optional[str] = None
+    journal_abbreviation: Optional[str] = None
+    volume: Optional[str] = None
+    issue: Optional[str] = None
+    pages: Optional[str] = None
+    year: Optional[str] = None
+    month: Optional[str] = None
+    doi: Optional[str] = None
+    authors: List[Dict] = field(default_factory=list)
+    mesh_terms: List[str] = field(default_factory=list)
+    publication_types: List[str] = field(default_factory=list)
+    citation_key: Optional[str] = None
+
+    @classmethod
+    def from_record(cls, record: Dict) -> "Article":
+        return cls(**{name: record.get(name) for name in cls.__dataclass_fields__ if name in record})
+
+    def to_record(self) -> Dict:
+        return asdict(self)
+
+    @property
+    def abstract(self) -> Optional[str]:
+        if not self.abstract_sections:
+            return None
+        return "\n".join(
+            f"{s['label']}: {s['text']}" if s.get("label") else s["text"] for s in self.abstract_sections
+        )
+
+    @property
+    def first_author_last_name(self) -> Optional[str]:
+        return self.authors[0]["last_name"] if self.authors else None
+
+    def author_names(self, limit: Optional[int] = None) -> List[str]:
+        """
+        Authors as "LastName Initials", optionally truncated with "et al.".
+        """
+        names = [
+            f"{a['last_name']} {a['initials']}" if a.get("initials") else a["last_name"]
+            for a in self.authors if a.get("last_name")
+        ]
+        if limit is not None and len(names) > limit:
+            return names[:limit] + ["et al."]
+        return names
+
+    def to_prompt_dict(self) -> Dict:
+        """
+        Compact representation for tool results sent to the LLM.
+        """
+        data = {
+            "citation_key": self.citation_key,
+            "pmid": self.pmid,
+            "title": self.title,
+            "authors": self.author_names(limit=3),
+            "journal": self.journal,
+            "year": self.year,
+            "doi": self.doi,
+            "publication_types": self.publication_types,
+            "abstract": self.abstract
+        }
+        return {key: value for key, value in data.items() if value}
+
+
+def normalize_doi(doi: Optional[str]) -> Optional[str]:
+    if not doi:
+        return None
+    doi = doi.strip().lower()
+    for prefix in ("https://doi.org/", "http://doi.org/", "http://dx.doi.org/", "doi:"):
+        if doi.startswith(prefix):
+            doi = doi[len(prefix):]
+    return doi or None
+
+
+# Candidate DOIs; extract_dois() trims the punctuation that follows them in prose
+DOI_PATTERN = re.compile(r"10\.\d{4,9}/[^\s\"'<>]+")
+
+
+def extract_dois(text: str) -> List[str]:
+    """
+    DOIs in free text, in order of appearance and without duplicates.
+
+    DOIs may contain parentheses, as in 10.1016/S0140-6736(20)30183-5, so
+    a match runs to the next whitespace or quote, and only trailing
+    punctuation and unbalanced closing brackets are stripped from it.
+    """
+    dois = []
+    for doi in DOI_PATTERN.findall(text or ""):
+        while doi:
+            if doi[-1] in ".,;:":
+                doi = doi[:-1]
+            elif doi[-1] == ")" and doi.count("(") < doi.count(")"):
+                doi = doi[:-1]
+            elif doi[-1] == "]" and doi.count("[") < doi.count("]"):
+                doi = doi[:-1]
+            else:
+                break
+        if doi and doi not in dois:
+            dois.append(doi)
+    return dois
+
+
+class ArticleStore:
+    """
+    Per-run registry of articles keyed by PMID and DOI.
+
+    Repeated hits resolve to the same Article object, and each article is
+    given a unique FirstAuthorYear citation key the first time it is seen.
+    """
+
+    def __init__(self):
+        self._by_pmid: Dict[str, Article] = {}
+        self._by_doi: Dict[str, Article] = {}
+        self._by_key: Dict[str, Article] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def __iter__(self) -> Iterator[Article]:
+        return iter(self._by_key.values())
+
+    def get(self, pmid: Optional[str] = None, doi: Optional[str] = None) -> Optional[Article]:
+        if pmid and pmid in self._by_pmid:
+            return self._by_pmid[pmid]
+        doi = normalize_doi(doi)
+        if doi and doi in self._by_doi:
+            return self._by_doi[doi]
+        return None
+
+    def get_by_key(self, citation_key: str) -> Optional[Article]:
+        return self._by_key.get(citation_key)
+
+    def add(self, article: Article) -> Tuple[Article, bool]:
+        """
+        Register an article; returns the canonical object and whether it was new.
+        """
+        existing = self.get(article.pmid, article.doi)
+        if existing is not None:
+            return existing, False
+
+        article.citation_key = self._make_key(article)
+        self._by_key[article.citation_key] = article
+        if article.pmid:
+            self._by_pmid[article.pmid] = article
+        doi = normalize_doi(article.doi)
+        if doi:
+            self._by_doi[doi] = article
+        return article, True
+
+    def _make_key(self, article: Article) -> str:
+        name = re.sub(r"[^A-Za-z]", "", article.first_author_last_name or "") or "Anon"
+        base = f"{name}{article.year or 'ND'}"
+        key, suffix = base, ord("b")
+        while key in self._by_key:
+            key = f"{base}{chr(suffix)}"
+            suffix += 1
+        return key
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from contextlib import aclosing
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from .agents import AcademicSearchTeam
+from .team_pool import TeamPool
+from .tools import close_session
+
+
+class RunStore:
+    """
+    Append-only JSONL store with one record per finished topic.
+
+    Records are fsynced as they are written, so an interrupted batch can be
+    restarted with the same file and only the unfinished topics are rerun.
+    Failed runs are recorded too, but do not count as finished.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, Dict] = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._load()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        complete = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Torn last line from a crash; that topic is simply rerun
+                    break
+                complete += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                # Later records win, so a retried topic replaces its failure
+                self.records[record["topic"]] = record
+        if complete < os.path.getsize(self.path):
+            # Cut the torn line off so the rerun topic's record does not get appended to it
+            with open(self.path, "r+b") as f:
+                f.truncate(complete)
+
+    def is_done(self, topic: str) -> bool:
+        record = self.records.get(topic)
+        return record is not None and record.get("status") == "completed"
+
+    def append(self, record: Dict):
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records[record["topic"]] = record
+
+    def close(self):
+        self._file.close()
+
+
+def read_topics(path: str, column: str = "titles") -> List[str]:
+    """
+    Topics from the given column of a .csv or Excel sheet, blanks and duplicates removed.
+    """
+    if path.endswith(".csv"):
+        df = pd.read_csv(path)
+    else:
+        df = pd.read_excel(path)
+    if column not in df.columns:
+        raise ValueError(f"Column '{column}' not found in {path}")
+    topics = [str(topic).strip() for topic in df[column].dropna()]
+    return list(dict.fromkeys(topic for topic in topics if topic))
+
+
+def _final_markdown(content: str) -> str:
+    return content.replace("**TERMINATE**", "").replace("TERMINATE", "").strip()
+
+
+async def run_topic(pool: TeamPool, topic: str) -> Dict:
+    """
+    Run the full pipeline for one topic on a leased team and build its store record.
+    """
+    async with pool.lease() as team:
+        start = time.perf_counter()
+        markdown = None
+        error = None
+        try:
+            async with aclosing(team.process_query(topic)) as updates:
+                async for update in updates:
+                    if update.get("type") == "error":
+                        error = update.get("message")
+                    elif update.get("agent") in ("FormatterAgent", "RunBudget") and isinstance(update.get("content"), str):
+                        markdown = _final_markdown(update["content"])
+        except Exception as e:
+            error = str(e)
+
+        # Read the run state before the lease is released and the team reset
+        run = team.run_context
+        if error is None and markdown is None:
+            error = "Run ended without a formatted document"
+        return {
+            "topic": topic,
+            "status": "failed" if error else "completed",
+            "error": error,
+            "markdown": markdown,
+            "approved_references": run.approved_references if run is not None else [],
+            "metrics": {
+                "wall_time_s": round(time.perf_counter() - start, 3),
+                "refine_search_count": team.refine_search_count,
+                "reference_validation_count": team.reference_validation_count,
+                "articles_retrieved": len(run.articles) if run is not None else 0,
+                "context_stats": run.context_stats if run is not None else {},
+                "run": run.metrics.summary() if run is not None else None
+            },
+            "finished_at": datetime.now(timezone.utc).isoformat()
+        }
+
+
+async def run_batch(topics: List[str], store: RunStore, pool: TeamPool) -> Dict[str, int]:
+    """
+    Run every topic without a completed record, at most pool.size at a time.
+    """
+    pending = [topic for topic in topics if not store.is_done(topic)]
+    print(f"{len(topics) - len(pending)} topics already completed, {len(pending)} to run "
+          f"on {pool.size} teams")
+    counts = {"completed": 0, "failed": 0}
+
+    async def worker(topic: str):
+        record = await run_topic(pool, topic)
+        store.append(record)
+        counts[record["status"]] += 1
+        done = counts["completed"] + counts["failed"]
+        print(f"[{done}/{len(pending)}] {record['status']}: {topic} "
+              f"({record['metrics']['wall_time_s']:.1f}s)")
+        if record["error"]:
+            print(f"  Error: {record['error']}")
+
+    await asyncio.gather(*(worker(topic) for topic in pending))
+    return counts
+
+
+def export_results(topics: List[str], store: RunStore, path: str):
+    """
+    Write one row per completed topic, in input order, to .csv or Excel.
+    """
+    rows = []
+    for topic in topics:
+        if not store.is_done(topic):
+            continue
+        record = store.records[topic]
+        rows.append({
+            "Title": topic,
+            "Markdown": record["markdown"],
+            "Approved References": json.dumps(record["approved_references"], ensure_ascii=False),
+            "Wall Time (s)": record["metrics"]["wall_time_s"],
+            "Refine Loops": record["metrics"]["refine_search_count"],
+            "Revise Loops": record["metrics"]["reference_validation_count"],
+            "Articles Retrieved": record["metrics"]["articles_retrieved"],
+            "Budget Stop": (record["metrics"].get("run") or {}).get("budget_stop")
+        })
+    df = pd.DataFrame(rows)
+    if path.endswith(".csv"):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+    print(f"Exported {len(rows)} results to {path}")
+
+
+async def main(args: argparse.Namespace):
+    topics = read_topics(args.input, args.column)
+    store = RunStore(args.store)
+    pool = TeamPool(lambda: AcademicSearchTeam(api_key=os.getenv("OPENAI_API_KEY")), size=args.concurrency)
+    try:
+        counts = await run_batch(topics, store, pool)
+        print(f"Batch finished: {counts['completed']} completed, {counts['failed']} failed")
+    finally:
+        store.close()
+        await close_session()
+    if args.export:
+        export_results(topics, store, args.export)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the LITERAS pipeline headlessly over a sheet of titles.")
+    parser.add_argument("input", help="Excel or .csv file with one title per row")
+    parser.add_argument("--column", default="titles", help="Column holding the titles")
+    parser.add_argument("--store", default="runs/batch_runs.jsonl",
+                        help="Append-only run store; rerun with the same file to resume")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("TEAM_POOL_SIZE", "2")),
+                        help="Number of team instances running in parallel")
+    parser.add_argument("--export", help="Optional .xlsx or .csv summary of the completed runs")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(main(parse_args()))
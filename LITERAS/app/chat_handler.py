@@ -1,10 +1,19 @@
+import asyncio
 import json
-from fastapi import WebSocket
+from typing import Optional
+from fastapi import WebSocket, WebSocketDisconnect
 from .agents import AcademicSearchTeam
+from .jobs import Job, JobManager
+from .team_pool import TeamPool
 
 class ChatHandler:
-    def __init__(self, openai_api_key: str):
-        self.search_team = AcademicSearchTeam(api_key=openai_api_key)
+    def __init__(self, openai_api_key: str, pool_size: int = 2):
+        self.team_pool = TeamPool(
+            lambda: AcademicSearchTeam(api_key=openai_api_key),
+            size=pool_size
+        )
+        # Background workers run the queries; sockets only subscribe to them
+        self.jobs = JobManager.from_env(self.team_pool)
     
     def serialize_object(self, obj):
         """
@@ -35,26 +44,86 @@ class ChatHandler:
         except Exception as e:
             return f"Unserializable object of type {type(obj).__name__}: {e}"
     
+    def parse_request(self, raw: str) -> dict:
+        """
+        Client messages are JSON: {"type": "user_message", "content": ...},
+        {"type": "subscribe", "job_id": ..., "after": seq} or {"type": "cancel", "job_id": ...};
+        plain text is treated as a query for older clients.
+        """
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return {"type": "user_message", "content": raw}
+        if not isinstance(data, dict):
+            return {"type": "user_message", "content": raw}
+        return {
+            "type": data.get("type", "user_message"),
+            "content": data.get("content", ""),
+            "job_id": data.get("job_id"),
+            "after": data.get("after", -1)
+        }
+
+    async def send(self, websocket: WebSocket, message: dict):
+        # Use custom serializer with json.dumps
+        await websocket.send_text(json.dumps(message, default=self.serialize_object))
+
+    async def follow(self, websocket: WebSocket, job: Job, after: int = -1):
+        """
+        Send a job's events after seq `after` to the socket, then its live events until it finishes.
+        """
+        await self.send(websocket, {"type": "job", **job.summary()})
+        async for event in job.stream(after):
+            await self.send(websocket, event)
+
     async def handle_websocket(self, websocket: WebSocket):
+        """
+        Submit queries as jobs and stream their events.
+
+        The run belongs to the job manager, not to the socket: a disconnect
+        only stops the forwarding, and the client can subscribe again with
+        the job ID and the last seq it received.
+        """
         await websocket.accept()
-        
+        follow_task: Optional[asyncio.Task] = None
+        job: Optional[Job] = None
+
         try:
             while True:
-                message = await websocket.receive_text()
-                
-                # Process messages with robust serialization
-                async for update in self.search_team.process_query(message):
-                    # Filter out unnecessary agent updates
-                    if update.get('agent') not in ['SearchAgent', 'QueryPlanner', 'Critic', 'Validator','SynthesisAgent','ReferenceConsistencyCritic']:
-                        # Use custom serializer with json.dumps
-                        serialized_update = json.dumps(update, default=self.serialize_object)
-                        await websocket.send_text(serialized_update)
-                
+                request = self.parse_request(await websocket.receive_text())
+
+                if request["type"] == "cancel":
+                    job_id = request["job_id"] or (job.id if job is not None else None)
+                    if job_id is not None:
+                        self.jobs.cancel(job_id)
+                    continue
+
+                if request["type"] == "subscribe":
+                    subscribed = self.jobs.get(request["job_id"] or "")
+                    if subscribed is None:
+                        await self.send(websocket, {"type": "error", "message": "Unknown or expired run."})
+                        continue
+                    job = subscribed
+                else:
+                    if job is not None and not job.done:
+                        await self.send(websocket, {
+                            "type": "error",
+                            "message": "A query is already running. Cancel it before starting another."
+                        })
+                        continue
+                    job = self.jobs.submit(request["content"])
+                    request["after"] = -1
+
+                if follow_task is not None and not follow_task.done():
+                    follow_task.cancel()
+                # Forward in the background so the socket can still receive a cancel request
+                follow_task = asyncio.create_task(self.follow(websocket, job, int(request["after"])))
+
+        except WebSocketDisconnect:
+            pass
         except Exception as e:
             # Serialize error message as well
-            error_message = json.dumps({
-                "type": "error",
-                "message": str(e)
-            })
-            await websocket.send_text(error_message)
-
+            await self.send(websocket, {"type": "error", "message": str(e)})
+        finally:
+            # The job keeps running; only stop forwarding to this socket
+            if follow_task is not None and not follow_task.done():
+                follow_task.cancel()
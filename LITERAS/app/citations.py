@@ -0,0 +1,286 @@
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import ChatMessage, TextMessage
+from autogen_core import CancellationToken
+from .articles import Article
+from .reference_check import split_references_section
+from .run_context import get_run_context
+from .verification import ReferenceVerifier, summarize
+
+STYLES = ("vancouver", "ama", "apa")
+
+_CITATION_GROUP = re.compile(r"(\s*)\[([^\[\]]+)\]")
+_SUPERSCRIPT = str.maketrans("0123456789,–", "⁰¹²³⁴⁵⁶⁷⁸⁹˒⁻")
+
+
+def _sentence(text: Optional[str]) -> str:
+    return (text or "").strip().rstrip(".")
+
+
+def _initials(author: Dict, apa: bool = False) -> str:
+    initials = author.get("initials") or "".join(
+        part[0] for part in (author.get("fore_name") or "").replace("-", " ").split() if part
+    )
+    if apa:
+        return " ".join(f"{letter}." for letter in initials)
+    return initials
+
+
+def _authors(article: Article, style: str) -> str:
+    authors = [a for a in article.authors if a.get("last_name")]
+    if not authors:
+        return ""
+    if style == "apa":
+        names = [f"{a['last_name']}, {_initials(a, apa=True)}".rstrip(", ") for a in authors]
+        if len(names) > 20:
+            # APA 7: first 19, an ellipsis, then the last author
+            return ", ".join(names[:19]) + ", . . . " + names[-1]
+        if len(names) == 1:
+            return names[0]
+        return ", ".join(names[:-1]) + ", & " + names[-1]
+
+    names = [f"{a['last_name']} {_initials(a)}".strip() for a in authors]
+    if style == "ama" and len(names) > 6:
+        return ", ".join(names[:3]) + ", et al"
+    if style == "vancouver" and len(names) > 6:
+        return ", ".join(names[:6]) + ", et al"
+    return ", ".join(names)
+
+
+def _source(article: Article) -> str:
+    """
+    "Year;Volume(Issue):Pages" as used by Vancouver and AMA.
+    """
+    text = article.year or ""
+    if article.volume:
+        text += f";{article.volume}"
+        if article.issue:
+            text += f"({article.issue})"
+    if article.pages:
+        text += f":{article.pages}"
+    return text
+
+
+def format_reference(article: Article, style: str = "ama") -> str:
+    """
+    One reference list entry rendered from PubMed metadata.
+    """
+    authors = _authors(article, style)
+    title = _sentence(article.title)
+
+    if style == "apa":
+        parts = [f"{authors} ({article.year or 'n.d.'})." if authors else f"({article.year or 'n.d.'}).", f"{title}."]
+        journal = f"*{article.journal}*" if article.journal else ""
+        if article.volume:
+            journal += f", *{article.volume}*"
+            if article.issue:
+                journal += f"({article.issue})"
+        if article.pages:
+            journal += f", {article.pages.replace('-', '–')}"
+        if journal:
+            parts.append(f"{journal}.")
+        if article.doi:
+            parts.append(f"https://doi.org/{article.doi}")
+        return " ".join(parts)
+
+    journal = article.journal_abbreviation or article.journal or ""
+    if style == "ama":
+        journal = f"*{journal}*" if journal else ""
+    parts = [f"{authors}." if authors else "", f"{title}.", f"{journal}." if journal else "", f"{_source(article)}."]
+    if article.doi:
+        parts.append(f"doi:{article.doi}" if style == "ama" else f"doi: {article.doi}")
+    return " ".join(part for part in parts if part and part != ".")
+
+
+def _in_text_apa(article: Article) -> str:
+    authors = [a["last_name"] for a in article.authors if a.get("last_name")]
+    year = article.year or "n.d."
+    if not authors:
+        return f"{_sentence(article.title)[:40]}, {year}"
+    if len(authors) == 1:
+        return f"{authors[0]}, {year}"
+    if len(authors) == 2:
+        return f"{authors[0]} & {authors[1]}, {year}"
+    return f"{authors[0]} et al., {year}"
+
+
+def _compress(numbers: List[int]) -> str:
+    """
+    [1, 2, 3, 5] -> "1–3,5"
+    """
+    numbers = sorted(set(numbers))
+    ranges = []
+    start = previous = numbers[0]
+    for number in numbers[1:] + [None]:
+        if number is not None and number == previous + 1:
+            previous = number
+            continue
+        ranges.append(str(start) if start == previous else f"{start}–{previous}" if previous > start + 1
+                      else f"{start},{previous}")
+        if number is not None:
+            start = previous = number
+    return ",".join(ranges)
+
+
+def render_document(title: str, synthesis: str, articles: Dict[str, Article],
+                    style: str = "ama") -> Tuple[str, List[Article]]:
+    """
+    Markdown paper for a synthesis that cites by [citation_key].
+
+    Keys are numbered in order of first citation (Vancouver/AMA) or shown
+    author-year (APA), and the reference list is built from the article
+    records. Returns the markdown and the cited articles in list order.
+    Brackets that are not citation keys are left untouched.
+    """
+    if style not in STYLES:
+        raise ValueError(f"Unknown citation style '{style}'; expected one of {', '.join(STYLES)}")
+    body, _ = split_references_section(synthesis.replace("SYNTHESIS_COMPLETE", ""))
+    lookup = {key.lower(): key for key in articles}
+    numbers: Dict[str, int] = {}
+
+    def replace(match: re.Match) -> str:
+        space, group = match.groups()
+        keys = [lookup.get(part.strip().lower()) for part in re.split(r"[;,]", group)]
+        if not keys or None in keys:
+            return match.group(0)
+        for key in keys:
+            numbers.setdefault(key, len(numbers) + 1)
+        if style == "apa":
+            return space + "(" + "; ".join(_in_text_apa(articles[key]) for key in keys) + ")"
+        cited = _compress([numbers[key] for key in keys])
+        # AMA superscripts attach directly to the preceding word
+        return cited.translate(_SUPERSCRIPT) if style == "ama" else f"{space}[{cited}]"
+
+    body = _CITATION_GROUP.sub(replace, body).strip()
+    cited = [articles[key] for key in numbers]
+
+    if style == "apa":
+        entries = sorted(cited, key=lambda a: (a.first_author_last_name or "", a.year or ""))
+        reference_lines = [format_reference(article, style) for article in entries]
+    else:
+        entries = cited
+        reference_lines = [f"{i}. {format_reference(article, style)}" for i, article in enumerate(entries, 1)]
+
+    if not body.lstrip().startswith("#"):
+        body = "## Introduction\n\n" + body
+    document = f"# {title}\n\n{body}\n\n## References\n\n" + "\n".join(
+        reference_lines if style != "apa" else [f"- {line}" for line in reference_lines]
+    )
+    return document, entries
+
+
+def _article_from_reference(ref: Dict) -> Article:
+    """
+    Fallback record for an approved reference that is missing from the run's articles.
+    """
+    authors = []
+    for name in ref.get("authors") or []:
+        if name and "et al" not in name:
+            last, _, initials = str(name).partition(" ")
+            authors.append({"last_name": last, "initials": initials.replace(".", "") or None})
+    return Article(
+        pmid=str(ref.get("pmid") or ""),
+        title=ref.get("title"),
+        journal=ref.get("journal"),
+        year=str(ref["year"]) if ref.get("year") else None,
+        doi=ref.get("doi"),
+        authors=authors,
+        citation_key=ref.get("citation_key")
+    )
+
+
+class FormatterAgent(BaseChatAgent):
+    """
+    Template-based replacement for the formatter LLM call.
+
+    Builds the final markdown from the latest synthesis and the PubMed
+    records of the cited papers, so volume, issue, pages and DOI are copied
+    from metadata rather than regenerated. CITATION_STYLE selects
+    vancouver, ama (default) or apa.
+    """
+
+    def __init__(self, name: str = "FormatterAgent", style: Optional[str] = None):
+        super().__init__(name, "Medical paper formatter specialist")
+        self.style = (style or os.getenv("CITATION_STYLE", "ama")).lower()
+        if self.style not in STYLES:
+            raise ValueError(f"Unknown CITATION_STYLE '{self.style}'; expected one of {', '.join(STYLES)}")
+        self._synthesis: Optional[str] = None
+        self._topic: Optional[str] = None
+
+    @property
+    def produced_message_types(self) -> List[type[ChatMessage]]:
+        return [TextMessage]
+
+    async def on_messages(self, messages: Sequence[ChatMessage], cancellation_token: CancellationToken) -> Response:
+        for message in messages:
+            if not isinstance(message.content, str):
+                continue
+            if message.source == "SynthesisAgent":
+                self._synthesis = message.content
+            elif message.source == "user" and self._topic is None:
+                match = re.search(r"Research Topic:\s*(.+)", message.content)
+                self._topic = match.group(1).strip() if match else None
+
+        run = get_run_context()
+        title = (run.topic if run is not None else None) or self._topic or "Literature Review"
+        articles: Dict[str, Article] = {}
+        if run is not None:
+            for ref in run.approved_references:
+                key = ref.get("citation_key")
+                article = run.articles.get_by_key(key) if key else run.articles.get(doi=ref.get("doi"))
+                if article is None and key:
+                    article = _article_from_reference(ref)
+                if article is not None:
+                    articles[article.citation_key] = article
+            # Cited keys outside the approved list still resolve if they were retrieved
+            for article in run.articles:
+                articles.setdefault(article.citation_key, article)
+
+        document, cited = render_document(title, self._synthesis or "", articles, self.style)
+        if cited and os.getenv("REFERENCE_VERIFICATION", "true").lower() == "true":
+            document += await self._verification_note(cited)
+        return Response(chat_message=TextMessage(content=f"{document}\n\n**TERMINATE**", source=self.name))
+
+    async def _verification_note(self, cited: List[Article]) -> str:
+        """
+        Re-check the final reference list against PubMed; returns a note listing any problems.
+
+        Every cited PMID and DOI is resolved through the verified-ID index
+        and ESummary. The run's articles only tell apart references the
+        Critic approved without them being retrieved; those are flagged if
+        they carry no identifier to check.
+        """
+        run = get_run_context()
+        references = [
+            {"title": a.title, "first_author": a.first_author_last_name, "year": a.year, "doi": a.doi,
+             "pmid": a.pmid or None}
+            for a in cited
+        ]
+        try:
+            results = await ReferenceVerifier().verify(references)
+        except Exception as e:
+            print(f"Reference verification failed: {str(e)}")
+            return ""
+        if run is not None:
+            for article, result in zip(cited, results):
+                if result["status"] == "no_identifier" and run.articles.get_by_key(article.citation_key) is None:
+                    result["status"] = "not_found"
+                    result["issues"] = ["not retrieved from PubMed and has no PMID or DOI"]
+
+        summary = summarize(results)
+        if run is not None:
+            run.emit("reference_verification", summary)
+        flagged = [(i, result) for i, result in enumerate(results, 1) if result["status"] in ("mismatch", "not_found")]
+        if not flagged:
+            return ""
+        lines = ["", "", f"> **Reference check:** {len(flagged)} of {len(results)} references need attention."]
+        for i, result in flagged:
+            lines.append(f"> - Reference {i}: {'; '.join(result['issues'])}")
+        return "\n".join(lines)
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        self._synthesis = None
+        self._topic = None
@@ -0,0 +1,216 @@
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    AssistantMessage,
+    ChatCompletionClient,
+    CreateResult,
+    FunctionExecutionResult,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    SystemMessage,
+    UserMessage,
+)
+from autogen_core.tools import Tool, ToolSchema
+from .message_parsing import extract_json
+from .model_clients import DelegatingChatCompletionClient
+from .run_context import get_run_context
+
+_CITATION_KEY = re.compile(r'"citation_key":\s*"([^"]+)"')
+
+
+class TeamContextManager:
+    """
+    Enforces a per-agent prompt token budget for the AcademicSearchTeam.
+
+    When an agent's history exceeds its budget, older messages are
+    compacted oldest-first: search tool output is reduced to citation keys,
+    Validator JSON to a score digest, other long messages are truncated,
+    and as a last resort old turns are dropped. The most recent messages
+    and the task message are always kept verbatim, and a digest of the
+    approved references is pinned after the system prompt.
+    """
+
+    def __init__(self, default_budget: int = 12000, budgets: Optional[Dict[str, int]] = None,
+                 keep_recent: int = 4, truncate_chars: int = 1500):
+        self.default_budget = default_budget
+        self.budgets = budgets or {}
+        self.keep_recent = keep_recent
+        self.truncate_chars = truncate_chars
+
+    @classmethod
+    def from_env(cls, agent_names: Sequence[str]) -> "TeamContextManager":
+        """
+        CONTEXT_TOKEN_BUDGET sets the default; CONTEXT_TOKEN_BUDGET_<AGENT> overrides one agent.
+        """
+        budgets = {}
+        for name in agent_names:
+            value = os.getenv(f"CONTEXT_TOKEN_BUDGET_{name.upper()}")
+            if value:
+                budgets[name] = int(value)
+        return cls(default_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000")), budgets=budgets)
+
+    def budget_for(self, agent_name: str) -> int:
+        return self.budgets.get(agent_name, self.default_budget)
+
+    def client_for(self, agent_name: str, inner: ChatCompletionClient) -> "BudgetedModelClient":
+        return BudgetedModelClient(inner, agent_name, self)
+
+    def compact(self, messages: Sequence[LLMMessage], budget: int, count) -> List[LLMMessage]:
+        """
+        Return a copy of messages that fits the budget as far as possible.
+
+        count(messages) -> int is the model client's token counter.
+        """
+        messages = list(messages)
+        head = 0
+        while head < len(messages) and isinstance(messages[head], SystemMessage):
+            head += 1
+        system, history = messages[:head], messages[head:]
+
+        # The task message and the most recent turns are never touched
+        protected_tail = max(len(history) - self.keep_recent, 1)
+        sizes = [count([message]) for message in history]
+        fixed = count(system)
+
+        for i in range(1, protected_tail):
+            if fixed + sum(sizes) <= budget:
+                break
+            compacted = self._compact_message(history[i])
+            if compacted is not history[i]:
+                history[i] = compacted
+                sizes[i] = count([compacted])
+
+        digest = self._approved_digest()
+        if digest is not None:
+            system = system + [digest]
+            fixed += count([digest])
+
+        # Drop the oldest compactable turns until the budget is met
+        i = 1
+        while fixed + sum(sizes) > budget and i < len(history) - self.keep_recent:
+            drop = 1
+            if isinstance(history[i], AssistantMessage) and isinstance(history[i].content, list):
+                # A tool call and its results must be dropped together
+                if i + 1 < len(history) and isinstance(history[i + 1], FunctionExecutionResultMessage):
+                    drop = 2
+            elif isinstance(history[i], FunctionExecutionResultMessage):
+                i += 1
+                continue
+            del history[i:i + drop]
+            del sizes[i:i + drop]
+
+        return system + history
+
+    def _compact_message(self, message: LLMMessage) -> LLMMessage:
+        if isinstance(message, FunctionExecutionResultMessage):
+            return message.model_copy(update={"content": [
+                FunctionExecutionResult(content=self._compact_text(result.content, "SearchAgent"), call_id=result.call_id)
+                for result in message.content
+            ]})
+        if isinstance(message, (UserMessage, AssistantMessage)) and isinstance(message.content, str):
+            text = self._compact_text(message.content, message.source)
+            if text != message.content:
+                return message.model_copy(update={"content": text})
+        return message
+
+    def _compact_text(self, text: str, source: str) -> str:
+        keys = list(dict.fromkeys(_CITATION_KEY.findall(text)))
+        if source == "Validator":
+            scores = extract_json(text)
+            if isinstance(scores, dict) and isinstance(scores.get("scored_papers"), list):
+                rows = [
+                    f"{paper.get('citation_key') or paper.get('doi') or paper.get('title', '')[:60]}"
+                    f"={paper.get('total_score')}"
+                    for paper in scores["scored_papers"] if isinstance(paper, dict)
+                ]
+                return "[Earlier Validator scores, details omitted] " + ", ".join(rows)
+        if keys and len(text) > self.truncate_chars:
+            return (f"[Earlier search output omitted: {len(keys)} articles, "
+                    f"referenced by citation_key: {', '.join(keys)}]")
+        if len(text) > self.truncate_chars:
+            return text[:self.truncate_chars] + " … [truncated]"
+        return text
+
+    def _approved_digest(self) -> Optional[UserMessage]:
+        run = get_run_context()
+        if run is None or not run.approved_references:
+            return None
+        compact = [
+            {key: ref.get(key) for key in ("citation_key", "title", "year", "doi") if ref.get(key)}
+            for ref in run.approved_references
+        ]
+        return UserMessage(
+            content="Approved references so far (digest):\n" + json.dumps(compact),
+            source="ContextManager"
+        )
+
+
+class BudgetedModelClient(DelegatingChatCompletionClient):
+    """
+    Per-agent client that compacts the prompt to the agent's token budget
+    and records prompt tokens before/after compaction and call latency.
+    """
+
+    def __init__(self, inner: ChatCompletionClient, agent_name: str, manager: TeamContextManager):
+        super().__init__(inner)
+        self.agent_name = agent_name
+        self.manager = manager
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        budget = self.manager.budget_for(self.agent_name)
+        tokens_before = self.count_tokens(messages, tools=tools)
+        tokens_after = tokens_before
+        if tokens_before > budget:
+            messages = self.manager.compact(messages, budget, self.count_tokens)
+            tokens_after = self.count_tokens(messages, tools=tools)
+
+        start = time.perf_counter()
+        result = await super().create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token
+        )
+        self._record(tokens_before, tokens_after, time.perf_counter() - start, result)
+        return result
+
+    def _record(self, tokens_before: int, tokens_after: int, latency: float, result: CreateResult):
+        run = get_run_context()
+        if run is None:
+            return
+        run.metrics.record_llm(
+            self.agent_name,
+            self.model_name,
+            result.usage.prompt_tokens,
+            result.usage.completion_tokens,
+            latency
+        )
+        stats = run.context_stats.setdefault(
+            self.agent_name, {"calls": 0, "tokens_before": 0, "tokens_after": 0, "latency_s": 0.0}
+        )
+        stats["calls"] += 1
+        stats["tokens_before"] += tokens_before
+        stats["tokens_after"] += tokens_after
+        stats["latency_s"] = round(stats["latency_s"] + latency, 3)
+
+
+def format_context_report(context_stats: Dict[str, Dict]) -> str:
+    lines = ["Context budget report (prompt tokens before -> after compaction):"]
+    for agent, stats in context_stats.items():
+        lines.append(
+            f"  {agent}: {stats['calls']} calls, {stats['tokens_before']} -> {stats['tokens_after']} tokens, "
+            f"{stats['latency_s']:.1f}s"
+        )
+    return "\n".join(lines)
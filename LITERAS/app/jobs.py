@@ -0,0 +1,205 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Optional
+from .team_pool import TeamPool
+
+# Intermediate agent messages are not sent to clients; progress events carry what they need
+HIDDEN_AGENTS = {"SearchAgent", "QueryPlanner", "Critic", "Validator", "SynthesisAgent", "ReferenceConsistencyCritic"}
+FINISHED = ("completed", "failed", "cancelled")
+
+
+class Job:
+    """
+    One pipeline run and every event it has produced so far.
+
+    Events are numbered with "seq", so a client that reconnects can replay
+    everything after the last event it saw and then follow the live run.
+    """
+
+    def __init__(self, query: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.query = query
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict] = []
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    def publish(self, event: Dict):
+        self.events.append({**event, "job_id": self.id, "seq": len(self.events)})
+        # Wake every subscriber waiting on the current event, then start a fresh one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def finish(self, status: str, event: Optional[Dict] = None):
+        if self.done:
+            return
+        self.status = status
+        self.finished_at = time.time()
+        if event is not None:
+            self.publish(event)
+        self.publish({"type": "done", "status": status})
+
+    async def stream(self, after: int = -1) -> AsyncGenerator[Dict, None]:
+        """
+        Events with seq greater than after, then new ones as they happen, until the job finishes.
+        """
+        index = max(after + 1, 0)
+        while True:
+            # Taken before draining, so an event published while we yield is not missed
+            changed = self._changed
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                return
+            await changed.wait()
+
+    def result(self) -> Optional[str]:
+        for event in reversed(self.events):
+            if event.get("type") == "update" and event.get("agent") in ("FormatterAgent", "RunBudget"):
+                return event.get("content")
+        return None
+
+    def summary(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "query": self.query,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "events": len(self.events)
+        }
+
+
+class JobManager:
+    """
+    Runs queries as background jobs on a fixed number of workers.
+
+    submit() returns at once with a job; workers take queued jobs in FIFO
+    order and run each on a team leased from the pool. Clients follow a job
+    through Job.stream() and may disconnect and reconnect without affecting
+    the run. Finished jobs are kept for retention_s (at most history of
+    them) so a late or reconnecting client can still replay them.
+    """
+
+    def __init__(self, team_pool: TeamPool, workers: Optional[int] = None,
+                 history: int = 200, retention_s: float = 3600):
+        self.team_pool = team_pool
+        self.workers = workers or team_pool.size
+        self.history = history
+        self.retention_s = retention_s
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker_tasks: List[asyncio.Task] = []
+
+    @classmethod
+    def from_env(cls, team_pool: TeamPool) -> "JobManager":
+        return cls(
+            team_pool,
+            workers=int(os.getenv("JOB_WORKERS", "0")) or None,
+            history=int(os.getenv("JOB_HISTORY", "200")),
+            retention_s=float(os.getenv("JOB_RETENTION", "3600"))
+        )
+
+    def start(self):
+        if not self._worker_tasks:
+            self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for job in self.jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, query: str) -> Job:
+        self.start()
+        self._prune()
+        job = Job(query)
+        self.jobs[job.id] = job
+        queued = sum(1 for j in self.jobs.values() if j.status == "queued")
+        if self.running + queued > self.workers:
+            job.publish({
+                "type": "queued",
+                "position": queued + self.running - self.workers,
+                "message": "All research teams are busy. Your query is queued and will start shortly."
+            })
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job; returns False if it is unknown or already finished.
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.done:
+            return False
+        if job.task is None:
+            # Still queued: the worker skips finished jobs
+            job.finish("cancelled", {"type": "cancelled", "message": "Run cancelled."})
+        else:
+            job.task.cancel()
+        return True
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == "running")
+
+    def stats(self) -> Dict:
+        counts = {status: 0 for status in ("queued", "running") + FINISHED}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {"workers": self.workers, **counts}
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_s
+        finished = [job for job in self.jobs.values() if job.done]
+        for i, job in enumerate(finished):
+            if job.finished_at < cutoff or len(finished) - i > self.history:
+                del self.jobs[job.id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            if job.status != "queued":
+                continue
+            job.task = asyncio.create_task(self._run(job))
+            # wait() rather than await, so cancelling the job does not stop the worker
+            await asyncio.wait([job.task])
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        job.publish({"type": "started"})
+        failed = False
+        try:
+            async with self.team_pool.lease() as team:
+                async with aclosing(team.process_query(job.query, run_id=job.id)) as updates:
+                    async for update in updates:
+                        if update.get("agent") in HIDDEN_AGENTS:
+                            continue
+                        failed = failed or update.get("type") == "error"
+                        job.publish(update)
+            job.finish("failed" if failed else "completed")
+        except asyncio.CancelledError:
+            job.finish("cancelled", {"type": "cancelled", "message": "Run cancelled."})
+            raise
+        except Exception as e:
+            job.finish("failed", {"type": "error", "message": str(e)})
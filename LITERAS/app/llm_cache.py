@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Mapping, Optional, Sequence
+from autogen_core.models import CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+
+# Truncated or filtered completions are not worth replaying
+CACHEABLE_FINISH_REASONS = ("stop", "function_calls")
+
+
+def request_key(model: str, create_args: Mapping[str, Any], messages: Sequence[LLMMessage],
+                tools: Sequence[Tool | ToolSchema], json_output: Optional[bool]) -> str:
+    """
+    Hash of everything that decides a completion: model and create arguments
+    (temperature included), messages, tool schemas and json_output.
+    """
+    payload = {
+        "model": model,
+        "create_args": dict(create_args),
+        "messages": [message.model_dump(mode="json") for message in messages],
+        "tools": [getattr(tool, "schema", tool) for tool in tools],
+        "json_output": json_output
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class InFlight:
+    """
+    A model call shared by every caller that sent the same request while it was running.
+
+    The call runs in its own task so one caller being cancelled does not
+    cancel it for the others; it is cancelled only when nobody is waiting.
+    """
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+    async def join(self) -> CreateResult:
+        self.waiters += 1
+        try:
+            return await asyncio.shield(self.task)
+        finally:
+            self.waiters -= 1
+            if self.waiters == 0 and not self.task.done():
+                self.task.cancel()
+
+
+class CompletionCache:
+    """
+    Persistent SQLite cache of model completions keyed by request_key().
+
+    Entries expire after ttl_seconds and the table is trimmed to max_entries
+    using least-recently-used eviction. in_flight holds the requests being
+    answered right now, so identical concurrent requests (from different
+    teams, say) can wait for one call instead of each paying for it.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 30 * 24 * 3600, max_entries: int = 20000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.in_flight: Dict[str, InFlight] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, data TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions(accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[CreateResult]:
+        """
+        Return the cached completion for a request key, or None on a miss.
+        """
+        now = time.time()
+        row = self._conn.execute("SELECT data, created FROM completions WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            self.misses += 1
+            return None
+
+        self._conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        self.hits += 1
+        return CreateResult.model_validate_json(row[0])
+
+    def put(self, key: str, model: str, result: CreateResult):
+        if result.finish_reason not in CACHEABLE_FINISH_REASONS:
+            return
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO completions (key, model, data, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, model, result.model_dump_json(), now, now)
+        )
+        self._evict()
+        self._conn.commit()
+
+    def _evict(self):
+        # Expired rows go first, then the least recently used ones over the limit
+        self._conn.execute("DELETE FROM completions WHERE created < ?", (time.time() - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM completions WHERE rowid IN (SELECT rowid FROM completions ORDER BY accessed ASC LIMIT ?)",
+                (excess,)
+            )
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "in_flight": len(self.in_flight),
+            "entries": self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0],
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+_cache: Optional[CompletionCache] = None
+
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """
+    Process-wide completion cache configured from the environment.
+
+    Set LLM_CACHE_PATH to an empty string to disable it.
+    """
+    global _cache
+    if _cache is None:
+        path = os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite3")
+        if not path:
+            return None
+        _cache = CompletionCache(
+            path,
+            ttl_seconds=int(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600))),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+        )
+    return _cache
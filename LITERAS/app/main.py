@@ -1,9 +1,14 @@
-from fastapi import FastAPI, WebSocket
+from fastapi import Body, FastAPI, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 from dotenv import load_dotenv
 from .chat_handler import ChatHandler
+from .tools import close_session
+from .metrics import get_metrics_registry
+from .pubmed_cache import get_pubmed_cache
+from .topic_cache import get_topic_cache
+from .llm_cache import get_completion_cache
 
 load_dotenv()
 
@@ -22,7 +27,15 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Initialize chat handler
-chat_handler = ChatHandler(openai_api_key=os.getenv("OPENAI_API_KEY"))
+chat_handler = ChatHandler(
+    openai_api_key=os.getenv("OPENAI_API_KEY"),
+    pool_size=int(os.getenv("TEAM_POOL_SIZE", "2"))
+)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await chat_handler.jobs.stop()
+    await close_session()
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -30,4 +43,60 @@ async def websocket_endpoint(websocket: WebSocket):
 
 @app.get("/")
 async def read_root():
-    return {"status": "Academic Search Bot is running"}
\ No newline at end of file
+    return {"status": "Academic Search Bot is running"}
+
+@app.get("/metrics")
+async def metrics():
+    pool = chat_handler.team_pool
+    cache = get_pubmed_cache()
+    topic_cache = get_topic_cache()
+    llm_cache = get_completion_cache()
+    return {
+        **get_metrics_registry().snapshot(),
+        "team_pool": {"size": pool.size, "busy": pool.busy, "waiting": pool.waiting},
+        "jobs": chat_handler.jobs.stats(),
+        "pubmed_cache": cache.stats() if cache else None,
+        "topic_cache": topic_cache.stats() if topic_cache else None,
+        "llm_cache": llm_cache.stats() if llm_cache else None
+    }
+
+@app.get("/metrics/runs/{run_id}")
+async def run_trace(run_id: str):
+    run_metrics = get_metrics_registry().get(run_id)
+    if run_metrics is None:
+        raise HTTPException(status_code=404, detail="Unknown run")
+    return run_metrics.to_dict()
+
+def get_job_or_404(job_id: str):
+    job = chat_handler.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+@app.post("/jobs", status_code=202)
+async def create_job(query: str = Body(..., embed=True)):
+    return chat_handler.jobs.submit(query).summary()
+
+@app.get("/jobs")
+async def list_jobs():
+    return {
+        "stats": chat_handler.jobs.stats(),
+        "jobs": [job.summary() for job in reversed(chat_handler.jobs.jobs.values())]
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = get_job_or_404(job_id)
+    return {**job.summary(), "result": job.result()}
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, after: int = -1):
+    job = get_job_or_404(job_id)
+    return {"status": job.status, "events": job.events[max(after + 1, 0):]}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = get_job_or_404(job_id)
+    if not chat_handler.jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return job.summary()
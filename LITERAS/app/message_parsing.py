@@ -0,0 +1,70 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+# `// comment` after JSON punctuation or whitespace; leaves URLs like https:// alone
+_LINE_COMMENT = re.compile(r"(?m)(?<=[\s,\[\]{}])//.*$")
+_TRAILING_COMMA = re.compile(r",(\s*[\]}])")
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+def _clean(text: str) -> str:
+    return _TRAILING_COMMA.sub(r"\1", _LINE_COMMENT.sub("", text))
+
+
+def _decode_from(text: str, start: int) -> Optional[Any]:
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+        return value
+    except ValueError:
+        return None
+
+
+def extract_json(text: str) -> Optional[Any]:
+    """
+    Best-effort extraction of the first JSON object or array in an agent message.
+
+    Handles bare JSON, ```json fences, surrounding prose and // comments
+    that the agents copy from their prompt templates.
+    """
+    if not isinstance(text, str):
+        return None
+    text = _clean(text)
+
+    candidates = [text] + _FENCE.findall(text)
+    for candidate in candidates:
+        candidate = candidate.strip()
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            pass
+
+    for match in re.finditer(r"[\[{]", text):
+        value = _decode_from(text, match.start())
+        if isinstance(value, (dict, list)) and value:
+            return value
+    return None
+
+
+def extract_approved_references(text: str) -> List[Dict]:
+    """
+    Approved reference list from a Critic PROCEED_TO_SYNTHESIS message.
+    """
+    if not isinstance(text, str):
+        return []
+    text = _clean(text)
+
+    marker = re.search(r"approved[ _]references\s*:?", text, re.IGNORECASE)
+    if marker:
+        bracket = text.find("[", marker.end())
+        if bracket != -1:
+            value = _decode_from(text, bracket)
+            if isinstance(value, list):
+                return [item for item in value if isinstance(item, dict)]
+
+    value = extract_json(text)
+    if isinstance(value, dict):
+        for key in ("approved_references", "approved_papers", "Approved References"):
+            if isinstance(value.get(key), list):
+                return [item for item in value[key] if isinstance(item, dict)]
+    return []
@@ -0,0 +1,318 @@
+import json
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+# USD per million prompt / completion tokens; MODEL_PRICES adds or overrides entries
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "o1-mini": (3.00, 12.00),
+    "o1-preview": (15.00, 60.00)
+}
+
+_prices: Optional[Dict[str, Tuple[float, float]]] = None
+
+
+def model_prices() -> Dict[str, Tuple[float, float]]:
+    global _prices
+    if _prices is None:
+        _prices = dict(DEFAULT_PRICES)
+        for model, price in json.loads(os.getenv("MODEL_PRICES") or "{}").items():
+            _prices[model] = (float(price[0]), float(price[1]))
+    return _prices
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """
+    Estimated USD cost of one call, or None for a model without a known price.
+
+    Dated snapshots match their base model by longest prefix, so
+    gpt-4o-mini-2024-07-18 is priced as gpt-4o-mini.
+    """
+    prices = model_prices()
+    match = max((name for name in prices if model.startswith(name)), key=len, default=None)
+    if match is None:
+        return None
+    prompt_price, completion_price = prices[match]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+class RunMetrics:
+    """
+    Counters, timings and a trace for one AcademicSearchTeam run.
+
+    Agent turns, LLM calls, PubMed requests, cache lookups and phase changes
+    are recorded as they happen, so a slow run can be attributed to the
+    model, to NCBI or to extra refine/revise loops.
+    """
+
+    def __init__(self, topic: str, run_id: Optional[str] = None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.topic = topic
+        self.status = "running"
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.wall_time_s: Optional[float] = None
+        self._start = time.perf_counter()
+
+        self.agents: Dict[str, Dict] = {}
+        self.llm: Dict[str, Dict] = {}
+        self.models: Dict[str, Dict] = {}
+        self.pubmed: Dict[str, Dict] = {}
+        self.cache = {"search_hits": 0, "search_misses": 0, "article_hits": 0, "article_misses": 0,
+                      "topic_hits": 0, "topic_misses": 0, "llm_hits": 0, "llm_misses": 0}
+        self.phases: Dict[str, Dict] = {}
+        self.loops = {"refine_search": 0, "revise_synthesis": 0}
+        # Budget limits that changed the run's course, and the one that stopped it early
+        self.budget_events: List[str] = []
+        self.budget_stop: Optional[str] = None
+        self.trace: List[Dict] = []
+        self._phase: Optional[str] = None
+        self._phase_start = 0.0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def _event(self, kind: str, **data):
+        self.trace.append({"t": round(self.elapsed(), 3), "kind": kind, **data})
+
+    def record_turn(self, agent: str, latency: float, new_turn: bool):
+        """
+        Time spent producing one message; consecutive messages from an agent form one turn.
+        """
+        stats = self.agents.setdefault(agent, {"turns": 0, "messages": 0, "latency_s": 0.0})
+        stats["messages"] += 1
+        stats["turns"] += int(new_turn)
+        stats["latency_s"] = round(stats["latency_s"] + latency, 3)
+        self._event("message", agent=agent, duration_s=round(latency, 3))
+
+    def record_llm(self, agent: str, model: str, prompt_tokens: int, completion_tokens: int, latency: float):
+        """
+        One model call, counted under its agent and under its model; cost is None for unpriced models.
+        """
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        for stats in (
+            self.llm.setdefault(agent, {
+                "model": model, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_s": 0.0,
+                "cost_usd": 0.0
+            }),
+            self.models.setdefault(model, {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_s": 0.0, "cost_usd": 0.0
+            })
+        ):
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["latency_s"] = round(stats["latency_s"] + latency, 3)
+            stats["cost_usd"] = None if cost is None or stats["cost_usd"] is None else round(stats["cost_usd"] + cost, 6)
+        self._event("llm_call", agent=agent, model=model, prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens, duration_s=round(latency, 3))
+
+    def record_pubmed(self, endpoint: str, latency: float, ok: bool = True):
+        stats = self.pubmed.setdefault(endpoint, {"calls": 0, "errors": 0, "latency_s": 0.0})
+        stats["calls"] += 1
+        stats["errors"] += int(not ok)
+        stats["latency_s"] = round(stats["latency_s"] + latency, 3)
+        self._event("pubmed", endpoint=endpoint, ok=ok, duration_s=round(latency, 3))
+
+    def record_cache(self, kind: str, hits: int, misses: int):
+        self.cache[f"{kind}_hits"] += hits
+        self.cache[f"{kind}_misses"] += misses
+
+    def enter_phase(self, phase: str):
+        """
+        Count one iteration of a phase; switching phase closes the previous one's timer.
+        """
+        now = self.elapsed()
+        if phase != self._phase:
+            self._close_phase(now)
+            self._phase = phase
+            self._phase_start = now
+        stats = self.phases.setdefault(phase, {"iterations": 0, "time_s": 0.0})
+        stats["iterations"] += 1
+        self._event("phase", phase=phase, iteration=stats["iterations"])
+
+    def _close_phase(self, now: float):
+        if self._phase is not None:
+            stats = self.phases[self._phase]
+            stats["time_s"] = round(stats["time_s"] + now - self._phase_start, 3)
+
+    def count_loop(self, name: str):
+        self.loops[name] += 1
+        self._event("loop", name=name, count=self.loops[name])
+
+    def total_tokens(self) -> int:
+        return sum(stats["prompt_tokens"] + stats["completion_tokens"] for stats in self.llm.values())
+
+    def total_cost(self) -> Optional[float]:
+        costs = [stats["cost_usd"] for stats in self.models.values()]
+        if any(cost is None for cost in costs):
+            return None
+        return round(sum(costs), 6)
+
+    def record_budget(self, event: str):
+        self.budget_events.append(event)
+        self._event("budget", event=event)
+
+    def record_budget_stop(self, reason: str):
+        if self.budget_stop is None:
+            self.budget_stop = reason
+            self.record_budget(f"stopped: {reason}")
+
+    def finish(self, status: str):
+        if self.status != "running":
+            return
+        now = self.elapsed()
+        self._close_phase(now)
+        self._phase = None
+        self.status = status
+        self.wall_time_s = round(now, 3)
+
+    def summary(self) -> Dict:
+        """
+        Everything except the event trace.
+        """
+        return {
+            "run_id": self.run_id,
+            "topic": self.topic,
+            "status": self.status,
+            "started_at": self.started_at,
+            "wall_time_s": self.wall_time_s if self.wall_time_s is not None else round(self.elapsed(), 3),
+            "agents": self.agents,
+            "llm": self.llm,
+            "models": self.models,
+            "cost_usd": self.total_cost(),
+            "pubmed": self.pubmed,
+            "cache": self.cache,
+            "phases": self.phases,
+            "loops": self.loops,
+            "budget_events": self.budget_events,
+            "budget_stop": self.budget_stop
+        }
+
+    def to_dict(self) -> Dict:
+        return {**self.summary(), "trace": self.trace}
+
+
+class MetricsRegistry:
+    """
+    Process-wide view of active and recently finished runs for /metrics.
+
+    Finished runs are kept in a bounded history and, if trace_dir is set,
+    each one is also written to <trace_dir>/<run_id>.json.
+    """
+
+    def __init__(self, history: int = 100, trace_dir: Optional[str] = None):
+        self.active: Dict[str, RunMetrics] = {}
+        self.recent = deque(maxlen=history)
+        self.trace_dir = trace_dir
+        self.totals = {"runs": 0, "completed": 0, "budget_stopped": 0, "failed": 0, "cancelled": 0}
+        if trace_dir:
+            os.makedirs(trace_dir, exist_ok=True)
+
+    def start(self, metrics: RunMetrics):
+        self.active[metrics.run_id] = metrics
+
+    def finish(self, metrics: RunMetrics):
+        self.active.pop(metrics.run_id, None)
+        self.recent.append(metrics)
+        self.totals["runs"] += 1
+        self.totals[metrics.status] = self.totals.get(metrics.status, 0) + 1
+        if self.trace_dir:
+            try:
+                with open(os.path.join(self.trace_dir, f"{metrics.run_id}.json"), "w", encoding="utf-8") as f:
+                    json.dump(metrics.to_dict(), f, indent=2, default=str)
+            except OSError as e:
+                print(f"Error writing run trace: {str(e)}")
+
+    def get(self, run_id: str) -> Optional[RunMetrics]:
+        if run_id in self.active:
+            return self.active[run_id]
+        for metrics in self.recent:
+            if metrics.run_id == run_id:
+                return metrics
+        return None
+
+    def snapshot(self) -> Dict:
+        """
+        Aggregates over the recent history plus per-run summaries.
+        """
+        finished = list(self.recent)
+        wall_times = [m.wall_time_s for m in finished if m.status == "completed" and m.wall_time_s is not None]
+
+        llm_by_model: Dict[str, Dict] = {}
+        pubmed: Dict[str, Dict] = {}
+        cache = {"search_hits": 0, "search_misses": 0, "article_hits": 0, "article_misses": 0,
+                 "topic_hits": 0, "topic_misses": 0, "llm_hits": 0, "llm_misses": 0}
+        call_latencies: Dict[str, List[float]] = {}
+        for m in finished:
+            for model, stats in m.models.items():
+                total = llm_by_model.setdefault(model, {
+                    "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_s": 0.0, "cost_usd": 0.0
+                })
+                for key in ("calls", "prompt_tokens", "completion_tokens"):
+                    total[key] += stats[key]
+                total["latency_s"] = round(total["latency_s"] + stats["latency_s"], 3)
+                if total["cost_usd"] is not None:
+                    total["cost_usd"] = None if stats["cost_usd"] is None else round(total["cost_usd"] + stats["cost_usd"], 6)
+            for event in m.trace:
+                if event["kind"] == "llm_call":
+                    call_latencies.setdefault(event["model"], []).append(event["duration_s"])
+            for endpoint, stats in m.pubmed.items():
+                total = pubmed.setdefault(endpoint, {"calls": 0, "errors": 0, "latency_s": 0.0})
+                for key in total:
+                    total[key] += stats[key]
+            for key in cache:
+                cache[key] += m.cache[key]
+
+        for model, total in llm_by_model.items():
+            latencies = call_latencies.get(model, [])
+            total["latency_p50_s"] = _percentile(latencies, 0.5)
+            total["latency_p95_s"] = _percentile(latencies, 0.95)
+            # Completion tokens per second of model time, for comparing routes by throughput
+            total["tokens_per_s"] = round(total["completion_tokens"] / total["latency_s"], 1) if total["latency_s"] else None
+
+        return {
+            "totals": dict(self.totals),
+            "active_runs": [m.summary() for m in self.active.values()],
+            "recent": {
+                "runs": len(finished),
+                "wall_time_s": {"p50": _percentile(wall_times, 0.5), "p95": _percentile(wall_times, 0.95)},
+                "refine_search_loops": sum(m.loops["refine_search"] for m in finished),
+                "revise_synthesis_loops": sum(m.loops["revise_synthesis"] for m in finished),
+                "budget_stops": sum(1 for m in finished if m.budget_stop),
+                "llm_by_model": llm_by_model,
+                "pubmed": pubmed,
+                "cache": cache
+            },
+            "recent_runs": [m.summary() for m in reversed(finished)]
+        }
+
+
+_registry: Optional[MetricsRegistry] = None
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """
+    Shared registry; METRICS_HISTORY bounds the history, an empty TRACE_DIR disables trace files.
+    """
+    global _registry
+    if _registry is None:
+        _registry = MetricsRegistry(
+            history=int(os.getenv("METRICS_HISTORY", "100")),
+            trace_dir=os.getenv("TRACE_DIR", "runs/traces") or None
+        )
+    return _registry
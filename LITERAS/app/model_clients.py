@@ -0,0 +1,310 @@
+import asyncio
+import time
+from typing import Any, AsyncGenerator, Dict, Mapping, Optional, Sequence, Union
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage, ModelCapabilities, RequestUsage
+from autogen_core.tools import Tool, ToolSchema
+from autogen_ext.models.openai import AzureOpenAIChatCompletionClient, OpenAIChatCompletionClient
+from .llm_cache import CompletionCache, InFlight, request_key
+from .run_context import get_run_context
+
+
+class DelegatingChatCompletionClient(ChatCompletionClient):
+    """
+    Base for model-client wrappers: forwards every call to the inner client.
+
+    Subclasses override create/create_stream to add behaviour around the
+    real call while the agents keep talking to a normal ChatCompletionClient.
+    """
+
+    def __init__(self, inner: ChatCompletionClient):
+        self.inner = inner
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        return await self.inner.create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token
+        )
+
+    def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        return self.inner.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token
+        )
+
+    def actual_usage(self) -> RequestUsage:
+        return self.inner.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self.inner.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], tools: Sequence[Tool | ToolSchema] = []) -> int:
+        try:
+            return self.inner.count_tokens(messages, tools=tools)
+        except Exception:
+            # Rough fallback when the inner client cannot count (e.g. unknown model)
+            return sum(len(str(getattr(message, "content", ""))) for message in messages) // 4
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self.inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:
+        return self.inner.capabilities
+
+    @property
+    def innermost(self) -> ChatCompletionClient:
+        """
+        The client that actually calls the model.
+        """
+        if isinstance(self.inner, DelegatingChatCompletionClient):
+            return self.inner.innermost
+        return self.inner
+
+    @property
+    def create_args(self) -> Dict[str, Any]:
+        """
+        Create arguments (model, temperature, ...) of the innermost client.
+        """
+        if isinstance(self.inner, DelegatingChatCompletionClient):
+            return self.inner.create_args
+        return dict(getattr(self.inner, "_create_args", {}))
+
+    @property
+    def model_name(self) -> str:
+        """
+        Model served by the innermost client, for metrics.
+        """
+        return str(self.create_args.get("model", type(self.inner).__name__))
+
+
+def streams_usage_on_request(client: ChatCompletionClient) -> bool:
+    """
+    Whether a client leaves token usage out of a stream unless stream_options.include_usage is set.
+
+    The OpenAI clients do; so does a replay client built with stream_usage_opt_in.
+    """
+    return isinstance(client, (OpenAIChatCompletionClient, AzureOpenAIChatCompletionClient)) \
+        or bool(getattr(client, "stream_usage_opt_in", False))
+
+
+class TokenStreamingClient(DelegatingChatCompletionClient):
+    """
+    Streams completions from the inner client and publishes each text chunk
+    as a progress event, while still returning one CreateResult to the agent.
+
+    Usage is requested in the stream, so streamed calls still count towards
+    token metrics, run budgets and cost.
+    """
+
+    def __init__(self, inner: ChatCompletionClient, stage: str):
+        super().__init__(inner)
+        self.stage = stage
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        run = get_run_context()
+        if run is None or run.events is None:
+            return await super().create(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=cancellation_token
+            )
+
+        if streams_usage_on_request(self.innermost):
+            extra_create_args = {"stream_options": {"include_usage": True}, **extra_create_args}
+        result = None
+        async for chunk in self.inner.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token
+        ):
+            if isinstance(chunk, str):
+                run.emit(self.stage, chunk)
+            else:
+                result = chunk
+        if result is None:
+            raise RuntimeError("Model stream ended without a final result")
+        return result
+
+
+class MeteredModelClient(DelegatingChatCompletionClient):
+    """
+    Records the model, tokens and latency of each call under agent_name,
+    for callers that are not agents with a context budget (the selector).
+    """
+
+    def __init__(self, inner: ChatCompletionClient, agent_name: str):
+        super().__init__(inner)
+        self.agent_name = agent_name
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        start = time.perf_counter()
+        result = await super().create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token
+        )
+        run = get_run_context()
+        if run is not None:
+            run.metrics.record_llm(
+                self.agent_name,
+                self.model_name,
+                result.usage.prompt_tokens,
+                result.usage.completion_tokens,
+                time.perf_counter() - start
+            )
+        return result
+
+
+class CachingChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Answers repeated requests from a CompletionCache and lets identical
+    concurrent requests share one call to the inner client.
+
+    Completions served from the cache or from another caller's in-flight
+    call come back with cached=True and zero usage, since nothing was paid
+    for them, so run budgets and token metrics only count real calls.
+    """
+
+    def __init__(self, inner: ChatCompletionClient, cache: CompletionCache):
+        super().__init__(inner)
+        self.cache = cache
+
+    def _key(self, messages: Sequence[LLMMessage], tools: Sequence[Tool | ToolSchema], json_output: Optional[bool],
+             extra_create_args: Mapping[str, Any]) -> str:
+        return request_key(self.model_name, {**self.create_args, **extra_create_args}, messages, tools, json_output)
+
+    @staticmethod
+    def _served(result: CreateResult) -> CreateResult:
+        return result.model_copy(update={"cached": True, "usage": RequestUsage(prompt_tokens=0, completion_tokens=0)})
+
+    @staticmethod
+    def _record(hit: bool):
+        run = get_run_context()
+        if run is not None:
+            run.metrics.record_cache("llm", int(hit), int(not hit))
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        key = self._key(messages, tools, json_output, extra_create_args)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._record(True)
+            return self._served(cached)
+
+        shared = self.cache.in_flight.get(key)
+        if shared is not None:
+            self.cache.coalesced += 1
+            self._record(True)
+            return self._served(await self._join(shared, cancellation_token))
+
+        self._record(False)
+        # The call belongs to every caller that joins it, so no caller's token is passed to it;
+        # InFlight.join cancels it once the last waiter is gone
+        shared = InFlight(asyncio.ensure_future(self._fetch(key, messages, tools, json_output, extra_create_args)))
+        self.cache.in_flight[key] = shared
+        shared.task.add_done_callback(lambda _: self.cache.in_flight.pop(key, None))
+        return await self._join(shared, cancellation_token)
+
+    @staticmethod
+    async def _join(shared: InFlight, cancellation_token: Optional[CancellationToken]) -> CreateResult:
+        """
+        Wait for a shared call; cancelling the token stops only this caller's wait.
+        """
+        waiting = asyncio.ensure_future(shared.join())
+        if cancellation_token is not None:
+            cancellation_token.link_future(waiting)
+        return await waiting
+
+    async def _fetch(self, key: str, messages, tools, json_output, extra_create_args) -> CreateResult:
+        result = await self.inner.create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args
+        )
+        self.cache.put(key, self.model_name, result)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        key = self._key(messages, tools, json_output, extra_create_args)
+        cached = self.cache.get(key)
+        if cached is None and key in self.cache.in_flight:
+            self.cache.coalesced += 1
+            cached = await self._join(self.cache.in_flight[key], cancellation_token)
+        if cached is not None:
+            # A hit arrives as one chunk followed by the result
+            self._record(True)
+            if isinstance(cached.content, str):
+                yield cached.content
+            yield self._served(cached)
+            return
+
+        # Streams are not shared: the caller wants its own tokens as they arrive
+        self._record(False)
+        result = None
+        async for chunk in self.inner.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token
+        ):
+            if not isinstance(chunk, str):
+                result = chunk
+            yield chunk
+        if result is not None:
+            self.cache.put(key, self.model_name, result)
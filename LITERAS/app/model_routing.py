@@ -0,0 +1,114 @@
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+from autogen_core.models import ChatCompletionClient
+from autogen_ext.models.openai import OpenAIChatCompletionClient
+from .llm_cache import get_completion_cache
+from .model_clients import CachingChatCompletionClient
+
+# Assumed for models the OpenAI client does not know, e.g. local OpenAI-compatible servers
+DEFAULT_CAPABILITIES = {"vision": False, "function_calling": True, "json_output": True}
+
+
+class ModelRoute:
+    """
+    The model, sampling temperature and endpoint one agent is served by.
+
+    base_url points the OpenAI client at any OpenAI-compatible server (a
+    local model, say); api_key_env names the variable holding its key.
+    """
+
+    def __init__(self, model: str, temperature: Optional[float] = 0.7, base_url: Optional[str] = None,
+                 api_key_env: Optional[str] = None, capabilities: Optional[Dict[str, bool]] = None):
+        self.model = model
+        self.temperature = temperature
+        self.base_url = base_url
+        self.api_key_env = api_key_env
+        self.capabilities = capabilities
+
+    @classmethod
+    def parse(cls, spec: Any, default: "ModelRoute") -> "ModelRoute":
+        """
+        A route from a model name or from an object whose missing fields come from default.
+        """
+        if isinstance(spec, str):
+            spec = {"model": spec}
+        if not isinstance(spec, dict) or not spec.get("model"):
+            raise ValueError(f"Invalid model route {spec!r}; expected a model name or an object with \"model\"")
+        return cls(
+            model=spec["model"],
+            temperature=spec.get("temperature", default.temperature),
+            base_url=spec.get("base_url"),
+            api_key_env=spec.get("api_key_env"),
+            capabilities=spec.get("capabilities")
+        )
+
+    def key(self) -> Tuple:
+        return self.model, self.temperature, self.base_url, self.api_key_env, json.dumps(self.capabilities)
+
+    def build(self, api_key: Optional[str]) -> ChatCompletionClient:
+        kwargs: Dict[str, Any] = {"model": self.model}
+        if self.temperature is not None:
+            kwargs["temperature"] = self.temperature
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+            kwargs["model_capabilities"] = self.capabilities or DEFAULT_CAPABILITIES
+        elif self.capabilities:
+            kwargs["model_capabilities"] = self.capabilities
+        kwargs["api_key"] = os.getenv(self.api_key_env) if self.api_key_env else api_key
+        return OpenAIChatCompletionClient(**kwargs)
+
+
+class ModelRouter:
+    """
+    Hands each agent the model client of its route.
+
+    Agents without a route use the default model. "Selector" routes
+    SelectorGroupChat's own speaker-selection calls. Agents on the same
+    route share one client, and every client goes through the completion
+    cache when it is enabled. An injected client (the replay benchmark's)
+    serves every agent regardless of routes.
+    """
+
+    def __init__(self, default: ModelRoute, routes: Optional[Dict[str, ModelRoute]] = None,
+                 api_key: Optional[str] = None, model_client: Optional[ChatCompletionClient] = None):
+        self.default = default
+        self.routes = routes or {}
+        self.api_key = api_key
+        self._injected = model_client
+        self._clients: Dict[Tuple, ChatCompletionClient] = {}
+
+    @classmethod
+    def from_env(cls, model: str = "gpt-4o-mini", api_key: Optional[str] = None,
+                 model_client: Optional[ChatCompletionClient] = None) -> "ModelRouter":
+        """
+        MODEL_ROUTES is a JSON object mapping agent names to a model name or to
+        {"model", "temperature", "base_url", "api_key_env", "capabilities"}.
+        A "default" entry replaces the team's default model.
+        """
+        routes = json.loads(os.getenv("MODEL_ROUTES") or "{}")
+        if not isinstance(routes, dict):
+            raise ValueError("MODEL_ROUTES must be a JSON object mapping agent names to routes")
+        default = ModelRoute(model)
+        if "default" in routes:
+            default = ModelRoute.parse(routes.pop("default"), default)
+        return cls(
+            default,
+            {agent: ModelRoute.parse(spec, default) for agent, spec in routes.items()},
+            api_key=api_key,
+            model_client=model_client
+        )
+
+    def route_for(self, agent_name: str) -> ModelRoute:
+        return self.routes.get(agent_name, self.default)
+
+    def client_for(self, agent_name: str) -> ChatCompletionClient:
+        route = self.route_for(agent_name)
+        key = ("injected",) if self._injected is not None else route.key()
+        if key not in self._clients:
+            client = self._injected or route.build(self.api_key)
+            completion_cache = get_completion_cache()
+            if completion_cache is not None:
+                client = CachingChatCompletionClient(client, completion_cache)
+            self._clients[key] = client
+        return self._clients[key]
@@ -0,0 +1,187 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Bump when the shape of cached article records changes
+SCHEMA_VERSION = 3
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize query text so trivially different spellings share a cache entry.
+    """
+    return " ".join(query.lower().split())
+
+
+class PubMedCache:
+    """
+    Persistent SQLite cache for PubMed E-utilities responses.
+
+    esearch results are keyed by normalized query text plus retmax, efetch
+    article records by PMID. Entries expire after ttl_seconds and each table
+    is trimmed to max_entries using least-recently-used eviction.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 7 * 24 * 3600, max_entries: int = 50000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = {"search": 0, "article": 0}
+        self.misses = {"search": 0, "article": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS articles")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches ("
+            "key TEXT PRIMARY KEY, ids TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            "pmid TEXT PRIMARY KEY, data TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS searches_accessed ON searches(accessed)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS articles_accessed ON articles(accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def _search_key(query: str, retmax: int) -> str:
+        return f"{normalize_query(query)}|{retmax}"
+
+    def get_search(self, query: str, retmax: int) -> Optional[List[str]]:
+        """
+        Return the cached PMID list for a query, or None on a miss.
+        """
+        key = self._search_key(query, retmax)
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT ids, created FROM searches WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None or now - row[1] > self.ttl_seconds:
+            self.misses["search"] += 1
+            return None
+
+        self._conn.execute("UPDATE searches SET accessed = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        self.hits["search"] += 1
+        return json.loads(row[0])
+
+    def put_search(self, query: str, retmax: int, ids: List[str]):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO searches (key, ids, created, accessed) VALUES (?, ?, ?, ?)",
+            (self._search_key(query, retmax), json.dumps(ids), now, now)
+        )
+        self._evict("searches")
+        self._conn.commit()
+
+    def get_articles(self, pmids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Return cached article records for the given PMIDs, keyed by PMID.
+
+        PMIDs that are missing or expired are simply absent from the result.
+        """
+        pmids = list(dict.fromkeys(pmids))
+        if not pmids:
+            return {}
+
+        now = time.time()
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for i in range(0, len(pmids), 500):
+            chunk = pmids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT pmid, data, created FROM articles WHERE pmid IN ({placeholders})", chunk
+            ).fetchall()
+            for pmid, data, created in rows:
+                if now - created <= self.ttl_seconds:
+                    found[pmid] = json.loads(data)
+
+        if found:
+            self._conn.executemany(
+                "UPDATE articles SET accessed = ? WHERE pmid = ?",
+                [(now, pmid) for pmid in found]
+            )
+            self._conn.commit()
+
+        self.hits["article"] += len(found)
+        self.misses["article"] += len(pmids) - len(found)
+        return found
+
+    def put_articles(self, articles: Iterable[Dict]):
+        now = time.time()
+        rows = [
+            (article["pmid"], json.dumps(article), now, now)
+            for article in articles if article.get("pmid")
+        ]
+        if not rows:
+            return
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO articles (pmid, data, created, accessed) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        self._evict("articles")
+        self._conn.commit()
+
+    def _evict(self, table: str):
+        # Expired rows go first, then the least recently used ones over the limit
+        self._conn.execute(f"DELETE FROM {table} WHERE created < ?", (time.time() - self.ttl_seconds,))
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN "
+                f"(SELECT rowid FROM {table} ORDER BY accessed ASC LIMIT ?)",
+                (excess,)
+            )
+
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters and current table sizes, for sizing the cache.
+        """
+        searches = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+        articles = self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        lookups = sum(self.hits.values()) + sum(self.misses.values())
+        return {
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "hit_rate": sum(self.hits.values()) / lookups if lookups else 0.0,
+            "entries": {"searches": searches, "articles": articles},
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+_cache: Optional[PubMedCache] = None
+
+
+def get_pubmed_cache() -> Optional[PubMedCache]:
+    """
+    Process-wide cache configured from the environment.
+
+    Set PUBMED_CACHE_PATH to an empty string to disable caching.
+    """
+    global _cache
+    if _cache is None:
+        path = os.getenv("PUBMED_CACHE_PATH", "cache/pubmed_cache.sqlite3")
+        if not path:
+            return None
+        _cache = PubMedCache(
+            path,
+            ttl_seconds=int(os.getenv("PUBMED_CACHE_TTL", str(7 * 24 * 3600))),
+            max_entries=int(os.getenv("PUBMED_CACHE_MAX_ENTRIES", "50000"))
+        )
+    return _cache
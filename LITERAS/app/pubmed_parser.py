@@ -0,0 +1,156 @@
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, Optional, Union
+
+_ARTICLE_TAGS = ("PubmedArticle", "PubmedBookArticle")
+
+
+def _text(element: Optional[ET.Element]) -> Optional[str]:
+    """
+    Full text content of an element, including inline markup such as <i>.
+    """
+    if element is None:
+        return None
+    text = "".join(element.itertext()).strip()
+    return text or None
+
+
+def parse_article_element(article: ET.Element) -> Dict:
+    """
+    Build a plain article record from a PubmedArticle element.
+
+    Each path is looked up once. Missing fields are None rather than
+    placeholder strings; see articles.Article for the in-memory form.
+    """
+    citation = article.find("MedlineCitation")
+    if citation is None:
+        citation = article.find("BookDocument")
+    if citation is None:
+        citation = article
+    art = citation.find("Article")
+    if art is None:
+        art = citation.find("Book")
+    if art is None:
+        art = citation
+
+    # Abstract sections keep their labels (BACKGROUND, METHODS, ...)
+    abstract_sections = []
+    abstract = art.find("Abstract")
+    if abstract is None:
+        abstract = citation.find("Abstract")
+    if abstract is not None:
+        for section in abstract.iterfind("AbstractText"):
+            text = _text(section)
+            if text:
+                abstract_sections.append({"label": section.get("Label"), "text": text})
+
+    authors = []
+    for author in art.iterfind("AuthorList/Author"):
+        collective = author.find("CollectiveName")
+        if collective is not None:
+            authors.append({"last_name": _text(collective), "fore_name": None, "initials": None})
+            continue
+        last_name = author.find("LastName")
+        if last_name is None:
+            continue
+        fore_name = author.find("ForeName")
+        initials = author.find("Initials")
+        authors.append({
+            "last_name": last_name.text,
+            "fore_name": fore_name.text if fore_name is not None else None,
+            "initials": initials.text if initials is not None else None
+        })
+
+    journal = art.find("Journal")
+    journal_issue = journal.find("JournalIssue") if journal is not None else None
+    pub_date = journal_issue.find("PubDate") if journal_issue is not None else None
+
+    year = month = None
+    if pub_date is not None:
+        year_element = pub_date.find("Year")
+        month_element = pub_date.find("Month")
+        year = year_element.text if year_element is not None else None
+        month = month_element.text if month_element is not None else None
+        if year is None:
+            # e.g. <MedlineDate>2023 Nov-Dec</MedlineDate>
+            match = re.search(r"\d{4}", _text(pub_date.find("MedlineDate")) or "")
+            year = match.group(0) if match else None
+
+    # The article's own DOI lives in PubmedData; ReferenceList entries also carry ArticleIds
+    doi = None
+    doi_element = article.find("PubmedData/ArticleIdList/ArticleId[@IdType='doi']")
+    if doi_element is None:
+        doi_element = art.find("ELocationID[@EIdType='doi']")
+    if doi_element is not None:
+        doi = doi_element.text
+
+    pmid = citation.find("PMID")
+    title = art.find("ArticleTitle")
+    if title is None:
+        title = art.find("BookTitle")
+
+    return {
+        "pmid": pmid.text if pmid is not None else "",
+        "title": _text(title),
+        "abstract_sections": abstract_sections,
+        "journal": _text(journal.find("Title")) if journal is not None else None,
+        "journal_abbreviation": _text(journal.find("ISOAbbreviation")) if journal is not None else None,
+        "volume": _text(journal_issue.find("Volume")) if journal_issue is not None else None,
+        "issue": _text(journal_issue.find("Issue")) if journal_issue is not None else None,
+        "pages": _text(art.find("Pagination/MedlinePgn")),
+        "year": year,
+        "month": month,
+        "doi": doi,
+        "authors": authors,
+        "mesh_terms": [
+            term for term in map(_text, citation.iterfind("MeshHeadingList/MeshHeading/DescriptorName")) if term
+        ],
+        "publication_types": [
+            kind for kind in map(_text, art.iterfind("PublicationTypeList/PublicationType")) if kind
+        ]
+    }
+
+
+class PubmedArticleStreamParser:
+    """
+    Incremental parser for efetch PubmedArticleSet responses.
+
+    Feed response chunks as they arrive; each call yields the articles that
+    have been completed so far. Parsed elements are cleared immediately, so
+    peak memory is bounded by one article rather than the whole batch.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("end",))
+
+    def feed(self, chunk: Union[bytes, str]) -> Iterator[Dict]:
+        self._parser.feed(chunk)
+        return self._drain()
+
+    def close(self) -> Iterator[Dict]:
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> Iterator[Dict]:
+        for _, element in self._parser.read_events():
+            if element.tag not in _ARTICLE_TAGS:
+                continue
+            try:
+                yield parse_article_element(element)
+            except Exception as e:
+                print(f"Error processing article: {str(e)}")
+            finally:
+                # Only an empty shell stays attached to the PubmedArticleSet root
+                element.clear()
+
+
+def parse_pubmed_xml(content: Union[bytes, str], chunk_size: int = 65536) -> List[Dict]:
+    """
+    Parse a complete efetch payload with the streaming parser.
+    """
+    parser = PubmedArticleStreamParser()
+    articles = []
+    for i in range(0, len(content), chunk_size):
+        articles.extend(parser.feed(content[i:i + chunk_size]))
+    articles.extend(parser.close())
+    return articles
@@ -0,0 +1,270 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import ChatMessage, TextMessage
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, SystemMessage, UserMessage
+from .articles import ArticleStore, extract_dois, normalize_doi
+from .message_parsing import extract_approved_references, extract_json
+from .run_context import get_run_context
+
+_BRACKETED = re.compile(r"\[([^\[\]]+)\]|\(([^()]+)\)")
+# "Smith2024", "Smith2024b", "Smith 2024", "Smith et al., 2024", "O'Neil-Lee et al. 2023a"
+_AUTHOR_YEAR = re.compile(r"^([A-Z][A-Za-z'\-]+)(?:\s+(?:et\s+al\.?|and\s+[A-Z][A-Za-z'\-]+))?,?\s*((?:19|20)\d{2}[a-z]?)$")
+_NUMERIC = re.compile(r"^\d+(?:\s*[-–]\s*\d+)?$")
+_REFERENCES_HEADING = re.compile(r"(?im)^\s*(?:#+\s*)?(?:\d+\.\s*)?references\s*:?\s*$")
+_PMID = re.compile(r"PMID:?\s*(\d{5,9})", re.IGNORECASE)
+
+
+@dataclass
+class ReferenceReport:
+    citations: List[str] = field(default_factory=list)
+    # {"line", "found", "required"} for every citation that must change
+    invalid: List[Dict] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.citations) and not self.invalid
+
+
+def split_references_section(text: str):
+    """
+    (body, references) split at the first "References" heading.
+    """
+    match = _REFERENCES_HEADING.search(text)
+    if match is None:
+        return text, ""
+    return text[:match.start()], text[match.end():]
+
+
+def extract_citations(text: str) -> List[Dict]:
+    """
+    In-text citation markers as {"marker", "key", "line"}.
+
+    Recognizes [Smith2024], [Smith2024; Lee2023b], (Smith et al., 2024) and
+    numeric markers like [3], which get key None.
+    """
+    citations = []
+    for line in text.splitlines():
+        for match in _BRACKETED.finditer(line):
+            inner = match.group(1) or match.group(2)
+            is_square = match.group(1) is not None
+            for piece in re.split(r"\s*;\s*", inner.strip()):
+                parts = [piece] if _AUTHOR_YEAR.match(piece) else re.split(r"\s*,\s*", piece)
+                for part in parts:
+                    author_year = _AUTHOR_YEAR.match(part)
+                    if author_year:
+                        key = author_year.group(1) + author_year.group(2)
+                        citations.append({"marker": part, "key": key, "line": line.strip()})
+                    elif is_square and _NUMERIC.match(part):
+                        citations.append({"marker": part, "key": None, "line": line.strip()})
+    return citations
+
+
+def _approved_keys(approved: List[Dict], store: Optional[ArticleStore]) -> Dict[str, Dict]:
+    """
+    Approved references by citation_key, recovering missing keys from the run's articles by DOI.
+    """
+    keys = {}
+    for ref in approved:
+        key = ref.get("citation_key")
+        if not key and store is not None and ref.get("doi"):
+            article = store.get(doi=ref["doi"])
+            key = article.citation_key if article is not None else None
+        if key:
+            keys[key] = ref
+    return keys
+
+
+def _resolve(key: str, approved_keys: Dict[str, Dict]) -> List[str]:
+    """
+    Approved keys a citation can refer to: the exact key, else keys that extend it (Smith2024 -> Smith2024b).
+    """
+    by_lower = {k.lower(): k for k in approved_keys}
+    if key.lower() in by_lower:
+        return [by_lower[key.lower()]]
+    return [k for k in approved_keys if k.lower().startswith(key.lower())]
+
+
+def check_references(synthesis: str, approved: List[Dict], store: Optional[ArticleStore] = None) -> ReferenceReport:
+    """
+    Check every citation, DOI and PMID in a synthesis against the approved references.
+
+    DOIs and PMIDs are also resolved in the run's article store, so a
+    reference that was never retrieved from PubMed is flagged even if the
+    Critic approved it.
+    """
+    report = ReferenceReport()
+    approved_keys = _approved_keys(approved, store)
+    available = ", ".join(approved_keys) or "none"
+    body, _ = split_references_section(synthesis)
+
+    for citation in extract_citations(body):
+        report.citations.append(citation["marker"])
+        if citation["key"] is None:
+            report.invalid.append({
+                "line": citation["line"],
+                "found": f"[{citation['marker']}]",
+                "required": f"cite by citation_key, one of: {available}"
+            })
+            continue
+        matches = _resolve(citation["key"], approved_keys)
+        if len(matches) == 1:
+            if matches[0] != citation["marker"]:
+                report.invalid.append({
+                    "line": citation["line"],
+                    "found": citation["marker"],
+                    "required": matches[0]
+                })
+            continue
+        report.invalid.append({
+            "line": citation["line"],
+            "found": citation["marker"],
+            "required": (f"one of {', '.join(matches)}" if matches
+                         else f"remove, or replace with an approved citation_key ({available})")
+        })
+
+    approved_dois = {normalize_doi(ref.get("doi")) for ref in approved_keys.values() if ref.get("doi")}
+    approved_articles = set(approved_keys)
+    # The reference list is rebuilt from PubMed metadata by the formatter, so only the body is checked
+    for doi in extract_dois(body):
+        normalized = normalize_doi(doi)
+        article = store.get(doi=doi) if store is not None else None
+        if normalized not in approved_dois and (article is None or article.citation_key not in approved_articles):
+            report.invalid.append({"line": doi, "found": f"DOI {doi}", "required": "DOI of an approved reference"})
+        elif store is not None and article is None:
+            report.invalid.append({"line": doi, "found": f"DOI {doi}",
+                                   "required": "remove; not found among the articles retrieved from PubMed"})
+    for pmid in dict.fromkeys(_PMID.findall(body)):
+        article = store.get(pmid=pmid) if store is not None else None
+        if store is not None and (article is None or article.citation_key not in approved_articles):
+            report.invalid.append({"line": f"PMID {pmid}", "found": f"PMID {pmid}",
+                                   "required": "PMID of an approved, retrieved reference"})
+    return report
+
+
+def format_report(report: ReferenceReport, approved: List[Dict]) -> str:
+    """
+    Render the check in the REVISE_NEEDED / PROCEED_TO_FORMATTING format the selector expects.
+    """
+    if report.ok:
+        return (
+            "PROCEED_TO_FORMATTING\n\n"
+            "Validation Summary:\n"
+            f"- Total citations: {len(report.citations)}\n"
+            f"- Distinct references cited: {len(set(report.citations))}\n"
+            "- All citations match approved keys"
+        )
+
+    lines = ["REVISE_NEEDED", ""]
+    if not report.citations:
+        lines.append("No in-text citations found. Cite every claim as [citation_key].")
+        lines.append("")
+    if report.invalid:
+        lines.append("Invalid Citations:")
+        for i, issue in enumerate(report.invalid, 1):
+            lines.append(f"{i}. Line: {issue['line'][:200]}")
+            lines.append(f"   Found: {issue['found']}")
+            lines.append(f"   Required: {issue['required']}")
+        lines.append("")
+    lines.append("Available Approved References:")
+    for ref in approved:
+        lines.append(f"- {ref.get('citation_key')}: {ref.get('title')} ({ref.get('year') or 'n.d.'})")
+    lines.append("")
+    lines.append("Revise synthesized text to use correct citations.")
+    return "\n".join(lines)
+
+
+class ReferenceConsistencyCritic(BaseChatAgent):
+    """
+    Deterministic replacement for the LLM reference-consistency critic.
+
+    Checks the latest synthesis against the Critic-approved references and
+    the run's article store in milliseconds. If a model client is given, an
+    additional LLM pass checks that cited claims are supported by the cited
+    papers' abstracts; that pass only runs once the citations themselves are valid.
+    """
+
+    def __init__(self, name: str = "ReferenceConsistencyCritic",
+                 claim_check_client: Optional[ChatCompletionClient] = None):
+        super().__init__(name, "Validates synthesis references against approved list")
+        self.claim_check_client = claim_check_client
+        self._synthesis: Optional[str] = None
+        self._approved_from_messages: List[Dict] = []
+
+    @property
+    def produced_message_types(self) -> List[type[ChatMessage]]:
+        return [TextMessage]
+
+    async def on_messages(self, messages: Sequence[ChatMessage], cancellation_token: CancellationToken) -> Response:
+        for message in messages:
+            if not isinstance(message.content, str):
+                continue
+            if message.source == "SynthesisAgent":
+                self._synthesis = message.content
+            elif message.source == "Critic" and "PROCEED_TO_SYNTHESIS" in message.content.upper():
+                self._approved_from_messages = extract_approved_references(message.content)
+
+        run = get_run_context()
+        approved = run.approved_references if run is not None and run.approved_references \
+            else self._approved_from_messages
+        store = run.articles if run is not None else None
+
+        if self._synthesis is None:
+            content = "REVISE_NEEDED\n\nNo synthesis found to validate."
+        else:
+            report = check_references(self._synthesis, approved, store)
+            if report.ok and self.claim_check_client is not None and store is not None:
+                report.invalid.extend(await self._check_claims(self._synthesis, store, cancellation_token))
+            content = format_report(report, approved)
+        return Response(chat_message=TextMessage(content=content, source=self.name))
+
+    async def _check_claims(self, synthesis: str, store: ArticleStore,
+                            cancellation_token: CancellationToken) -> List[Dict]:
+        body, _ = split_references_section(synthesis)
+        claims = {}
+        for citation in extract_citations(body):
+            article = store.get_by_key(citation["marker"])
+            if article is not None:
+                claims.setdefault(citation["line"], set()).add(article.citation_key)
+        if not claims:
+            return []
+
+        keys = sorted({key for cited in claims.values() for key in cited})
+        papers = {key: {"title": store.get_by_key(key).title, "abstract": store.get_by_key(key).abstract}
+                  for key in keys}
+        prompt = (
+            "For each sentence, decide whether the cited papers support the claim, using only the "
+            "titles and abstracts given. Reply with JSON: "
+            '{"unsupported": [{"sentence": "...", "citation_key": "...", "reason": "..."}]}\n\n'
+            f"Sentences: {json.dumps([{'sentence': s, 'cited': sorted(k)} for s, k in claims.items()])}\n\n"
+            f"Papers: {json.dumps(papers)}"
+        )
+        try:
+            result = await self.claim_check_client.create(
+                [SystemMessage(content="You verify that citations support the claims they are attached to."),
+                 UserMessage(content=prompt, source=self.name)],
+                cancellation_token=cancellation_token
+            )
+        except Exception as e:
+            print(f"Claim check failed, skipping: {str(e)}")
+            return []
+
+        verdict = extract_json(result.content) if isinstance(result.content, str) else None
+        if not isinstance(verdict, dict) or not isinstance(verdict.get("unsupported"), list):
+            return []
+        return [
+            {
+                "line": str(item.get("sentence", "")),
+                "found": str(item.get("citation_key", "")),
+                "required": f"a citation that supports the claim ({item.get('reason', 'not supported')})"
+            }
+            for item in verdict["unsupported"] if isinstance(item, dict)
+        ]
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        self._synthesis = None
+        self._approved_from_messages = []
@@ -0,0 +1,162 @@
+import importlib
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from .articles import Article
+from .scoring import terms
+
+# Takes a list of texts and returns an (n, d) array of embeddings
+Embedder = Callable[[List[str]], np.ndarray]
+
+
+def _document_text(article: Article) -> str:
+    return " ".join(filter(None, [article.title, " ".join(article.mesh_terms), article.abstract]))
+
+
+class RelevanceIndex:
+    """
+    In-process BM25 index over the articles retrieved during a run.
+
+    Documents are appended incrementally: only new articles are tokenized,
+    and each add keeps its term-frequency rows (and embeddings) as a
+    separate block instead of copying the whole matrix, so each refine loop
+    costs time proportional to what it adds. A query reads the query-term
+    columns of every block. An optional embedder adds a dense
+    cosine-similarity component.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, embedder: Optional[Embedder] = None,
+                 embedding_weight: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.embedder = embedder
+        self.embedding_weight = embedding_weight
+
+        self._vocabulary: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._positions: Dict[str, int] = {}
+        # One CSR block per add(), as wide as the vocabulary was at the time
+        self._tf_blocks: List[sparse.csr_matrix] = []
+        self._doc_freq: List[int] = []
+        self._doc_len: List[int] = []
+        self._embedding_blocks: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._positions
+
+    def add(self, documents: List[Tuple[str, str]]):
+        """
+        Index (key, text) pairs, ignoring keys that are already indexed.
+        """
+        documents = [(key, text) for key, text in documents if key not in self._positions]
+        if not documents:
+            return
+
+        data, indices, indptr, lengths = [], [], [0], []
+        for key, text in documents:
+            counts: Dict[int, int] = {}
+            tokens = terms(text)
+            for token in tokens:
+                column = self._vocabulary.setdefault(token, len(self._vocabulary))
+                counts[column] = counts.get(column, 0) + 1
+            indices.extend(counts)
+            data.extend(counts.values())
+            indptr.append(len(indices))
+            lengths.append(len(tokens))
+            self._positions[key] = len(self._keys)
+            self._keys.append(key)
+
+        vocabulary_size = len(self._vocabulary)
+        self._tf_blocks.append(sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+            shape=(len(documents), vocabulary_size)
+        ))
+        self._doc_freq.extend([0] * (vocabulary_size - len(self._doc_freq)))
+        for column in indices:
+            self._doc_freq[column] += 1
+        self._doc_len.extend(lengths)
+
+        if self.embedder is not None:
+            vectors = self._normalize(np.asarray(self.embedder([text for _, text in documents]), dtype=np.float32))
+            self._embedding_blocks.append(vectors)
+
+    def add_articles(self, articles: List[Article]):
+        self.add([(article.citation_key or article.pmid, _document_text(article)) for article in articles])
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    @staticmethod
+    def _columns(block: sparse.csr_matrix, columns: List[int]) -> np.ndarray:
+        """
+        Dense term frequencies of the given columns; terms newer than the block are zero.
+        """
+        tf = np.zeros((block.shape[0], len(columns)), dtype=np.float32)
+        known = [i for i, column in enumerate(columns) if column < block.shape[1]]
+        if known:
+            tf[:, known] = block[:, [columns[i] for i in known]].toarray()
+        return tf
+
+    def bm25(self, query: str) -> np.ndarray:
+        """
+        BM25 score of every indexed document against the query.
+        """
+        n = len(self._keys)
+        columns = sorted({self._vocabulary[t] for t in terms(query) if t in self._vocabulary})
+        if n == 0 or not columns:
+            return np.zeros(n, dtype=np.float32)
+
+        tf = np.vstack([self._columns(block, columns) for block in self._tf_blocks])
+        df = np.asarray([self._doc_freq[column] for column in columns], dtype=np.float32)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        doc_len = np.asarray(self._doc_len, dtype=np.float32)
+        avg_len = doc_len.mean() or 1.0
+        norm = self.k1 * (1 - self.b + self.b * doc_len / avg_len)
+        return ((tf * (self.k1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = self.bm25(query)
+        if self.embedder is None or not self._embedding_blocks or not len(scores):
+            return scores
+
+        # Blend max-normalized BM25 with cosine similarity
+        peak = scores.max()
+        lexical = scores / peak if peak > 0 else scores
+        query_vector = self._normalize(np.asarray(self.embedder([query]), dtype=np.float32))[0]
+        dense = np.concatenate([block @ query_vector for block in self._embedding_blocks])
+        return (1 - self.embedding_weight) * lexical + self.embedding_weight * dense
+
+    def rank(self, query: str, top_k: int = 20) -> List[Tuple[str, float]]:
+        scores = self.scores(query)
+        if not len(scores) or top_k <= 0:
+            return []
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(self._keys[i], round(float(scores[i]), 4)) for i in best if scores[i] > 0]
+
+
+def _load_embedder() -> Optional[Embedder]:
+    """
+    Resolve RELEVANCE_EMBEDDER="package.module:function" to a local embedding callable.
+    """
+    target = os.getenv("RELEVANCE_EMBEDDER")
+    if not target:
+        return None
+    module_name, _, attribute = target.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def create_relevance_index() -> RelevanceIndex:
+    return RelevanceIndex(
+        embedder=_load_embedder(),
+        embedding_weight=float(os.getenv("RELEVANCE_EMBEDDING_WEIGHT", "0.5"))
+    )
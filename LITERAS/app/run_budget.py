@@ -0,0 +1,82 @@
+import os
+from dataclasses import dataclass
+from typing import Optional, Sequence
+from autogen_agentchat.base import TerminatedException, TerminationCondition
+from autogen_agentchat.messages import AgentMessage, StopMessage
+from .run_context import get_run_context
+
+
+@dataclass
+class RunBudget:
+    """
+    Per-run limits on refine/revise loops, LLM tokens, wall time and messages.
+
+    Loop limits are enforced by the selector, which moves the run forward
+    with the best material so far instead of looping again. Token and
+    message limits stop the group chat; the wall-time limit is also a hard
+    deadline on the whole run. A limit of 0 disables it.
+    """
+    max_refine_loops: int = 3
+    max_revise_loops: int = 2
+    max_tokens: int = 250000
+    max_wall_time_s: float = 600.0
+    max_messages: int = 80
+
+    @classmethod
+    def from_env(cls) -> "RunBudget":
+        return cls(
+            max_refine_loops=int(os.getenv("RUN_MAX_REFINE_LOOPS", "3")),
+            max_revise_loops=int(os.getenv("RUN_MAX_REVISE_LOOPS", "2")),
+            max_tokens=int(os.getenv("RUN_MAX_TOKENS", "250000")),
+            max_wall_time_s=float(os.getenv("RUN_MAX_WALL_TIME", "600")),
+            max_messages=int(os.getenv("RUN_MAX_MESSAGES", "80"))
+        )
+
+    def refine_allowed(self, refine_count: int) -> bool:
+        return not self.max_refine_loops or refine_count < self.max_refine_loops
+
+    def revise_allowed(self, revise_count: int) -> bool:
+        return not self.max_revise_loops or revise_count < self.max_revise_loops
+
+    def exceeded(self, tokens: int, elapsed_s: float) -> Optional[str]:
+        """
+        Name of the first token or wall-time limit that has been reached, if any.
+        """
+        if self.max_tokens and tokens >= self.max_tokens:
+            return f"token budget of {self.max_tokens} reached ({tokens} used)"
+        if self.max_wall_time_s and elapsed_s >= self.max_wall_time_s:
+            return f"time budget of {self.max_wall_time_s:g}s reached"
+        return None
+
+
+class RunBudgetTermination(TerminationCondition):
+    """
+    Stops the group chat once the current run exceeds its token or wall-time budget.
+
+    Usage and elapsed time are read from the RunContext metrics, so the
+    condition needs no state of its own beyond whether it has fired.
+    """
+
+    def __init__(self, budget: RunBudget):
+        self._budget = budget
+        self._terminated = False
+
+    @property
+    def terminated(self) -> bool:
+        return self._terminated
+
+    async def __call__(self, messages: Sequence[AgentMessage]) -> StopMessage | None:
+        if self._terminated:
+            raise TerminatedException("Termination condition has already been reached")
+        run = get_run_context()
+        if run is None:
+            return None
+        reason = self._budget.exceeded(run.metrics.total_tokens(), run.metrics.elapsed())
+        if reason is None:
+            return None
+        self._terminated = True
+        run.metrics.record_budget_stop(reason)
+        return StopMessage(content=f"Run budget exhausted: {reason}", source="RunBudgetTermination")
+
+    async def reset(self) -> None:
+        self._terminated = False
@@ -0,0 +1,50 @@
+import asyncio
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from .articles import ArticleStore
+from .metrics import RunMetrics
+from .relevance_index import RelevanceIndex, create_relevance_index
+
+
+@dataclass
+class RunContext:
+    """
+    State scoped to a single AcademicSearchTeam run.
+
+    The active context is published through a ContextVar so tool functions
+    called by the agents can reach per-run state without extra arguments
+    that would leak into the LLM tool schema.
+    """
+    topic: str
+    articles: ArticleStore = field(default_factory=ArticleStore)
+    # Metadata-derived scores keyed by citation_key (see scoring.py)
+    prescores: Dict[str, Dict] = field(default_factory=dict)
+    # BM25 index over the run's articles, extended as refine loops add papers
+    index: RelevanceIndex = field(default_factory=create_relevance_index)
+    # Critic-approved references once the run reaches synthesis
+    approved_references: List[Dict] = field(default_factory=list)
+    # Per-agent prompt tokens before/after compaction and LLM latency
+    context_stats: Dict[str, Dict] = field(default_factory=dict)
+    # Progress events for the client; None when nobody is listening
+    events: Optional[asyncio.Queue] = None
+    # Timings, token usage and PubMed counters reported on /metrics
+    metrics: RunMetrics = None
+
+    def __post_init__(self):
+        if self.metrics is None:
+            self.metrics = RunMetrics(self.topic)
+
+    def emit(self, stage: str, data: Any):
+        """
+        Publish a structured progress event as soon as a stage produces it.
+        """
+        if self.events is not None:
+            self.events.put_nowait({"type": "progress", "stage": stage, "data": data})
+
+
+current_run: ContextVar[Optional[RunContext]] = ContextVar("current_run", default=None)
+
+
+def get_run_context() -> Optional[RunContext]:
+    return current_run.get()
@@ -0,0 +1,136 @@
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from .articles import Article
+
+# PubMed PublicationType -> methodology score (0-5); the best type wins
+METHODOLOGY_SCORES = {
+    "meta-analysis": 5,
+    "systematic review": 5,
+    "randomized controlled trial": 5,
+    "practice guideline": 5,
+    "guideline": 4,
+    "clinical trial, phase iii": 4,
+    "clinical trial, phase iv": 4,
+    "clinical trial": 4,
+    "controlled clinical trial": 4,
+    "pragmatic clinical trial": 4,
+    "multicenter study": 4,
+    "clinical trial, phase ii": 3,
+    "observational study": 3,
+    "comparative study": 3,
+    "validation study": 3,
+    "review": 3,
+    "clinical trial, phase i": 2,
+    "evaluation study": 2,
+    "journal article": 2,
+    "case reports": 1,
+    "letter": 0,
+    "comment": 0,
+    "editorial": 0,
+    "news": 0,
+    "published erratum": 0,
+    "retracted publication": 0,
+}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it",
+    "of", "on", "or", "that", "the", "to", "with", "without", "among", "between", "within",
+    "patients", "study", "studies", "effect", "effects", "role", "impact", "association",
+    "analysis", "review", "using", "based", "versus", "vs",
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def _stem(token: str) -> str:
+    # Crude plural folding is enough for matching topic terms against titles
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def terms(text: Optional[str]) -> List[str]:
+    """
+    Tokenized, stopword-free and plural-folded terms used for lexical matching.
+    """
+    return [_stem(t) for t in tokenize(text)]
+
+
+def recency_score(year: Optional[str], current_year: Optional[int] = None) -> int:
+    if not year or not year[:4].isdigit():
+        return 1
+    age = (current_year or datetime.now().year) - int(year[:4])
+    if age <= 1:
+        return 5
+    if age <= 3:
+        return 4
+    if age <= 5:
+        return 3
+    if age <= 10:
+        return 2
+    return 1
+
+
+def methodology_score(publication_types: List[str]) -> int:
+    scores = [METHODOLOGY_SCORES.get(kind.lower()) for kind in publication_types]
+    scores = [score for score in scores if score is not None]
+    return max(scores) if scores else 2
+
+
+def relevance_score(article: Article, topic_terms: Set[str]) -> float:
+    """
+    Lexical coverage of topic terms, weighting title and MeSH above abstract.
+    """
+    if not topic_terms:
+        return 0.0
+    title = set(terms(article.title))
+    mesh = {t for term in article.mesh_terms for t in terms(term)}
+    abstract = set(terms(article.abstract))
+
+    weight = 0.0
+    for term in topic_terms:
+        if term in title:
+            weight += 1.0
+        elif term in mesh:
+            weight += 0.75
+        elif term in abstract:
+            weight += 0.5
+    return round(5 * weight / len(topic_terms), 2)
+
+
+def prescore_article(article: Article, topic_terms: Set[str], current_year: Optional[int] = None) -> Dict:
+    scores = {
+        "relevance_score": relevance_score(article, topic_terms),
+        "recency_score": recency_score(article.year, current_year),
+        "methodology_score": methodology_score(article.publication_types)
+    }
+    scores["prescore_total"] = round(sum(scores.values()), 2)
+    return scores
+
+
+def prescore_articles(articles: List[Article], topic: str, top_k: int = 25,
+                      min_relevance: float = 0.5) -> Tuple[List[Tuple[Article, Dict]], int]:
+    """
+    Score articles from metadata alone and keep the best top_k.
+
+    Articles whose lexical relevance to the topic is below min_relevance are
+    pruned. Returns the kept (article, scores) pairs, best first, and the
+    number of pruned articles.
+    """
+    topic_terms = set(terms(topic))
+    current_year = datetime.now().year
+
+    scored = [(article, prescore_article(article, topic_terms, current_year)) for article in articles]
+    kept = [pair for pair in scored if not topic_terms or pair[1]["relevance_score"] >= min_relevance]
+    kept.sort(key=lambda pair: pair[1]["prescore_total"], reverse=True)
+    kept = kept[:top_k]
+    return kept, len(scored) - len(kept)
@@ -0,0 +1,76 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional, Set
+from .agents import AcademicSearchTeam
+
+
+class TeamPool:
+    """
+    Fixed-size pool of AcademicSearchTeam instances.
+
+    Every connection leases its own team for the duration of a query, so
+    concurrent users never share phase state or counters. The pool size
+    bounds how many pipeline runs execute at once; extra queries wait in
+    FIFO order until a team is returned.
+    """
+
+    def __init__(self, factory: Callable[[], AcademicSearchTeam], size: int = 2):
+        if size < 1:
+            raise ValueError("Team pool size must be at least 1")
+        self.size = size
+        self._factory = factory
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._waiting = 0
+        self._releasing: Set[asyncio.Task] = set()
+        for _ in range(size):
+            self._idle.put_nowait(factory())
+
+    @property
+    def available(self) -> int:
+        return self._idle.qsize()
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @property
+    def busy(self) -> int:
+        return self.size - self._idle.qsize()
+
+    @asynccontextmanager
+    async def lease(self, on_wait: Optional[Callable[[int], Awaitable[None]]] = None):
+        """
+        Borrow a team, waiting in the queue if every team is busy.
+
+        on_wait is awaited with the caller's queue position before blocking,
+        so the caller can tell its client that the query has been queued.
+        """
+        if self._idle.empty() and on_wait is not None:
+            await on_wait(self._waiting + 1)
+
+        self._waiting += 1
+        try:
+            team = await self._idle.get()
+        finally:
+            self._waiting -= 1
+
+        try:
+            yield team
+        finally:
+            # Reset in the background: a cancelled run may still be unwinding, and the caller should not wait for it
+            task = asyncio.create_task(self._release(team))
+            self._releasing.add(task)
+            task.add_done_callback(self._releasing.discard)
+
+    async def _release(self, team: AcademicSearchTeam):
+        replacement = team
+        try:
+            await team.reset()
+        except Exception as e:
+            print(f"Error resetting team, replacing it: {str(e)}")
+            replacement = self._factory()
+        except asyncio.CancelledError:
+            # A half-reset team must not be handed to the next query
+            self._idle.put_nowait(self._factory())
+            raise
+        self._idle.put_nowait(replacement)
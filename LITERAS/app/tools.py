@@ -1,118 +1,507 @@
 import aiohttp
-import xml.etree.ElementTree as ET
-from datetime import datetime
-from typing import Dict, List
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
 import asyncio
+import os
+import time
+from .pubmed_cache import get_pubmed_cache
+from .pubmed_parser import PubmedArticleStreamParser
+from .articles import Article
+from .run_context import get_run_context
+from .scoring import prescore_articles
+from .rate_limit import TokenBucket
+
+NCBI_API_KEY = os.getenv("NCBI_API_KEY", '4e6ad5ec68a6f95b8526b7440dbdcda2a009')
+# Override to point the tools at a local stand-in (see benchmarks/replay_benchmark.py)
+EUTILS_BASE_URL = os.getenv("EUTILS_BASE_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+
+_session: Optional[aiohttp.ClientSession] = None
+_rate_limiter: Optional[TokenBucket] = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Process-wide pooled HTTP session with keep-alive connections to NCBI.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            ssl=False,
+            limit=int(os.getenv("NCBI_MAX_CONNECTIONS", "10")),
+            keepalive_timeout=60
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=60)
+        )
+    return _session
+
+
+def get_rate_limiter() -> TokenBucket:
+    """
+    Token bucket shared by every concurrent E-utilities request.
+
+    NCBI allows 10 requests/second with an API key and 3 without one.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        default_rate = "10" if NCBI_API_KEY else "3"
+        _rate_limiter = TokenBucket(rate=float(os.getenv("NCBI_REQUESTS_PER_SECOND", default_rate)))
+    return _rate_limiter
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def _record_pubmed(endpoint: str, start: float, ok: bool):
+    run = get_run_context()
+    if run is not None:
+        run.metrics.record_pubmed(endpoint, time.perf_counter() - start, ok)
+
+
+def _record_cache(kind: str, hits: int, misses: int):
+    run = get_run_context()
+    if run is not None:
+        run.metrics.record_cache(kind, hits, misses)
+
+
+async def _esearch(session: aiohttp.ClientSession, query: str, max_results: int,
+                   max_retries: int = 3) -> Optional[List[str]]:
+    """
+    Run esearch and return the PMID list, or None if the request failed.
+    """
+    params = {
+        "db": "pubmed",
+        "term": query,
+        "retmax": max_results,
+        "retmode": "json",
+        "api_key": NCBI_API_KEY
+    }
+
+    for attempt in range(max_retries):
+        await get_rate_limiter().acquire()
+        start = time.perf_counter()
+        async with session.get(f"{EUTILS_BASE_URL}/esearch.fcgi", params=params) as response:
+            if response.status == 429:
+                _record_pubmed("esearch", start, ok=False)
+                print("Rate limit exceeded. Waiting before retrying...")
+                await asyncio.sleep(2 ** attempt)
+                continue
+            elif response.status != 200:
+                _record_pubmed("esearch", start, ok=False)
+                print(f"Search API error: Status {response.status}")
+                return None
+
+            try:
+                search_data = await response.json()
+                _record_pubmed("esearch", start, ok=True)
+                return search_data.get("esearchresult", {}).get("idlist", [])
+            except Exception as e:
+                _record_pubmed("esearch", start, ok=False)
+                print(f"Error parsing search results: {str(e)}")
+                return None
+
+    return None
+
+
+async def _efetch_records(session: aiohttp.ClientSession, params: Dict,
+                         max_retries: int = 3) -> AsyncGenerator[Dict, None]:
+    """
+    Request one efetch page and yield article records as the XML is parsed.
+
+    Parameters are POSTed, so long ID lists stay out of the URL.
+    """
+    data = {"db": "pubmed", "retmode": "xml", "api_key": NCBI_API_KEY, **params}
+
+    for attempt in range(max_retries):
+        await get_rate_limiter().acquire()
+        start = time.perf_counter()
+        async with session.post(f"{EUTILS_BASE_URL}/efetch.fcgi", data=data) as response:
+            if response.status == 429:
+                _record_pubmed("efetch", start, ok=False)
+                print("Rate limit exceeded. Waiting before retrying...")
+                await asyncio.sleep(2 ** attempt)
+                continue
+            elif response.status != 200:
+                _record_pubmed("efetch", start, ok=False)
+                print(f"Fetch API error: Status {response.status}")
+                return
+
+            # Parse the XML as it arrives instead of buffering the whole body
+            parser = PubmedArticleStreamParser()
+            async for chunk in response.content.iter_chunked(65536):
+                for record in parser.feed(chunk):
+                    yield record
+            for record in parser.close():
+                yield record
+
+        _record_pubmed("efetch", start, ok=True)
+        return
+
+
+async def _efetch(session: aiohttp.ClientSession, ids: List[str], batch_size: int = 50) -> List[Dict]:
+    """
+    Fetch and parse article records for the given PMIDs.
+
+    Batches are requested concurrently; the shared rate limiter keeps the
+    combined request rate within NCBI's budget.
+    """
+    async def fetch_batch(batch_ids: List[str]) -> List[Dict]:
+        return [record async for record in _efetch_records(session, {"id": ",".join(batch_ids)})]
+
+    batches = await asyncio.gather(*(
+        fetch_batch(ids[i:i + batch_size]) for i in range(0, len(ids), batch_size)
+    ))
+    return [article for batch in batches for article in batch]
+
+
+async def _esearch_history(session: aiohttp.ClientSession, query: str,
+                           max_retries: int = 3) -> Optional[Tuple[int, str, str]]:
+    """
+    Run esearch with usehistory=y and return (count, WebEnv, query_key), or None if it failed.
+
+    The PMIDs stay on the NCBI history server; efetch pages through them.
+    """
+    params = {
+        "db": "pubmed",
+        "term": query,
+        "retmax": 0,
+        "retmode": "json",
+        "usehistory": "y",
+        "api_key": NCBI_API_KEY
+    }
+
+    for attempt in range(max_retries):
+        await get_rate_limiter().acquire()
+        start = time.perf_counter()
+        async with session.get(f"{EUTILS_BASE_URL}/esearch.fcgi", params=params) as response:
+            if response.status == 429:
+                _record_pubmed("esearch", start, ok=False)
+                print("Rate limit exceeded. Waiting before retrying...")
+                await asyncio.sleep(2 ** attempt)
+                continue
+            elif response.status != 200:
+                _record_pubmed("esearch", start, ok=False)
+                print(f"Search API error: Status {response.status}")
+                return None
+
+            try:
+                result = (await response.json()).get("esearchresult", {})
+                _record_pubmed("esearch", start, ok=True)
+                return int(result.get("count", 0)), result["webenv"], result["querykey"]
+            except Exception as e:
+                _record_pubmed("esearch", start, ok=False)
+                print(f"Error parsing search results: {str(e)}")
+                return None
+
+    return None
+
+
+async def pubmed_search_stream(query: str, max_results: int = 2000,
+                               page_size: int = 200) -> AsyncGenerator[Article, None]:
+    """
+    Stream up to max_results articles for a query using the NCBI history server.
+
+    One esearch stores the result set as WebEnv/query_key; efetch pages
+    (retstart/retmax) are then requested concurrently under the shared
+    rate limit, and articles are yielded as each page is parsed, so the
+    caller can start ranking before the last page arrives. Order follows
+    page completion, not PubMed's relevance order. Closing the generator
+    cancels the outstanding pages.
+    """
+    session = get_session()
+    history = await _esearch_history(session, query)
+    if history is None:
+        return
+    count, webenv, query_key = history
+    total = min(count, max_results)
+
+    cache = get_pubmed_cache()
+    queue: asyncio.Queue = asyncio.Queue()
+    page_done = object()
+
+    async def fetch_page(retstart: int):
+        records = []
+        try:
+            params = {"WebEnv": webenv, "query_key": query_key, "retstart": retstart,
+                      "retmax": min(page_size, total - retstart)}
+            async for record in _efetch_records(session, params):
+                records.append(record)
+                queue.put_nowait(record)
+        except Exception as e:
+            print(f"Error fetching PubMed page at {retstart}: {str(e)}")
+        finally:
+            queue.put_nowait(page_done)
+        if cache and records:
+            cache.put_articles(records)
+
+    pages = [asyncio.create_task(fetch_page(retstart)) for retstart in range(0, total, page_size)]
+    try:
+        remaining = len(pages)
+        while remaining:
+            item = await queue.get()
+            if item is page_done:
+                remaining -= 1
+                continue
+            yield Article.from_record(item)
+    finally:
+        for page in pages:
+            page.cancel()
+
+
+async def _search_ids(session: aiohttp.ClientSession, query: str, max_results: int) -> Optional[List[str]]:
+    cache = get_pubmed_cache()
+    ids = cache.get_search(query, max_results) if cache else None
+    if cache:
+        _record_cache("search", int(ids is not None), int(ids is None))
+    if ids is None:
+        ids = await _esearch(session, query, max_results)
+        if ids is not None and cache:
+            cache.put_search(query, max_results, ids)
+    return ids
+
+
+async def _fetch_articles(session: aiohttp.ClientSession, ids: List[str]) -> List[Article]:
+    """
+    Return articles for the PMIDs in order, fetching only unknown ones.
+
+    PMIDs already seen in the current run resolve to the run's Article
+    objects; the rest come from the cache or, failing that, from efetch.
+    """
+    run = get_run_context()
+    known = {}
+    if run is not None:
+        for pmid in ids:
+            article = run.articles.get(pmid=pmid)
+            if article is not None:
+                known[pmid] = article
+
+    cache = get_pubmed_cache()
+    unknown_ids = [pmid for pmid in ids if pmid not in known]
+    cached_records = cache.get_articles(unknown_ids) if cache else {}
+    missing_ids = [pmid for pmid in unknown_ids if pmid not in cached_records]
+    if cache:
+        _record_cache("article", len(cached_records), len(missing_ids))
+    fetched = await _efetch(session, missing_ids) if missing_ids else []
+
+    if cache:
+        cache.put_articles(fetched)
+
+    # Merge everything back into esearch order
+    records = dict(cached_records)
+    records.update((record["pmid"], record) for record in fetched)
+    results = []
+    for pmid in ids:
+        if pmid in known:
+            results.append(known[pmid])
+        elif pmid in records:
+            results.append(Article.from_record(records[pmid]))
+
+    print(f"Successfully retrieved {len(results)} articles "
+          f"({len(known)} seen this run, {len(cached_records)} from cache, {len(fetched)} fetched)")
+    return results
+
+
+def _present(articles: List[Article], top_k: Optional[int] = None) -> Tuple[List[Dict], int]:
+    """
+    Tool-result view of the articles and the number pruned by pre-scoring.
+
+    Within a run, articles seen earlier are returned as references only.
+    New articles are pre-scored against the topic; clearly irrelevant ones
+    are dropped and the best PRESCORE_TOP_K are returned with their scores.
+    """
+    run = get_run_context()
+    if run is None:
+        return [article.to_prompt_dict() for article in articles], 0
+
+    results = []
+    new_articles = []
+    for article in articles:
+        existing = run.articles.get(article.pmid, article.doi)
+        if existing is not None:
+            results.append({"citation_key": existing.citation_key, "already_returned": True})
+        else:
+            new_articles.append(article)
+
+    kept, pruned = prescore_articles(
+        new_articles,
+        run.topic,
+        top_k=top_k or int(os.getenv("PRESCORE_TOP_K", "25")),
+        min_relevance=float(os.getenv("PRESCORE_MIN_RELEVANCE", "0.5"))
+    )
+    added = []
+    for article, scores in kept:
+        article, _ = run.articles.add(article)
+        run.prescores[article.citation_key] = scores
+        results.append({**article.to_prompt_dict(), "prescores": scores})
+        added.append(article)
+    run.index.add_articles(added)
+
+    if added:
+        run.emit("scored_papers", [
+            {"citation_key": article.citation_key, "title": article.title, "year": article.year,
+             "doi": article.doi, **run.prescores[article.citation_key]}
+            for article in added
+        ])
+
+    return results, pruned
 
 
 async def pubmed_search(query: str, max_results: int = 35) -> List[Dict]:
     """
     Search PubMed for academic articles using E-utilities.
+
+    Articles already returned earlier in the same run are listed only by
+    citation_key with "already_returned": true. New articles carry
+    metadata-derived "prescores" and are ordered best first.
     """
     try:
-        api_key = '4e6ad5ec68a6f95b8526b7440dbdcda2a009'
-        base_params = {
-            "db": "pubmed",
-            "term": query,
-            "retmax": max_results,
-            "retmode": "json",
-            "api_key": api_key
-        }
+        session = get_session()
+        ids = await _search_ids(session, query, max_results)
 
-        request_delay = 0.34
-        ssl_context = aiohttp.TCPConnector(ssl=False)
-
-        async with aiohttp.ClientSession(connector=ssl_context) as session:
-            search_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-
-            async with session.get(search_url, params=base_params) as response:
-                if response.status == 429:
-                    print("Rate limit exceeded. Waiting before retrying...")
-                    await asyncio.sleep(2)
-                    return []
-                elif response.status != 200:
-                    print(f"Search API error: Status {response.status}")
-                    return []
-
-                try:
-                    search_data = await response.json()
-                    ids = search_data.get("esearchresult", {}).get("idlist", [])
-                except Exception as e:
-                    print(f"Error parsing search results: {str(e)}")
-                    return []
-
-            if not ids:
-                print("No articles found")
-                return []
-
-            # Process results in batches
-            batch_size = 50
-            results = []
-
-            for i in range(0, len(ids), batch_size):
-                batch_ids = ids[i:i + batch_size]
-                await asyncio.sleep(request_delay)
-
-                fetch_params = {
-                    "db": "pubmed",
-                    "id": ",".join(batch_ids),
-                    "retmode": "xml",
-                    "api_key": api_key
-                }
-
-                fetch_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-
-                async with session.get(fetch_url, params=fetch_params) as response:
-                    if response.status != 200:
-                        continue
-
-                    content = await response.text()
-                    root = ET.fromstring(content)
-
-                    for article in root.findall(".//PubmedArticle"):
-                        try:
-                            article_data = {
-                                "title": article.find(".//ArticleTitle").text if article.find(
-                                    ".//ArticleTitle") is not None else "No title available",
-                                "abstract": article.find(".//Abstract/AbstractText").text if article.find(
-                                    ".//Abstract/AbstractText") is not None else "No abstract available",
-                                "journal": article.find(".//Journal/Title").text if article.find(
-                                    ".//Journal/Title") is not None else "No journal available",
-                                "date": "Unknown",
-                                "doi": article.find(".//ArticleId[@IdType='doi']").text if article.find(
-                                    ".//ArticleId[@IdType='doi']") is not None else "No DOI available",
-                                "first_author": "No author name available",
-                                "pmid": article.find(".//PMID").text if article.find(".//PMID") is not None else ""
-                            }
-
-                            # Extract date
-                            pub_date = article.find(".//PubDate")
-                            if pub_date is not None:
-                                year = pub_date.find("Year")
-                                month = pub_date.find("Month")
-                                year_text = year.text if year is not None else "Unknown"
-                                month_text = month.text if month is not None else "01"
-                                article_data["date"] = f"{year_text}-{month_text}"
-
-                            # Extract first author
-                            authors = article.findall(".//Author")
-                            if authors:
-                                last_name = authors[0].find("LastName")
-                                first_name = authors[0].find("ForeName")
-                                if last_name is not None and first_name is not None:
-                                    article_data["first_author"] = f"{first_name.text} {last_name.text}"
-                                    if len(authors) > 1:
-                                        article_data["first_author"] += " et al."
-
-                            results.append(article_data)
-
-                        except Exception as e:
-                            print(f"Error processing article: {str(e)}")
-                            continue
-
-        print(f"Successfully retrieved {len(results)} articles")
+        run = get_run_context()
+        if run is not None:
+            run.emit("search_stats", {"query_stats": [{"query": query, "hits": len(ids or [])}]})
+
+        if not ids:
+            print("No articles found")
+            return []
+
+        results, pruned = _present(await _fetch_articles(session, ids))
+        if pruned:
+            print(f"Pre-scoring pruned {pruned} low-relevance articles")
         return results
 
     except Exception as e:
         print(f"Error in PubMed search: {str(e)}")
         return []
+
+
+async def pubmed_multi_search(queries: List[str], max_results_per_query: int = 35) -> Dict:
+    """
+    Run several PubMed searches concurrently and return the deduplicated union.
+
+    All esearch calls run at once under the shared rate limit, then a single
+    efetch pass retrieves the union of PMIDs. The result includes per-query
+    hit counts and overlap statistics between queries. As with
+    pubmed_search, articles seen earlier in the run are only referenced.
+    topic_ranking lists the run's best papers so far by BM25 against the topic.
+    """
+    try:
+        session = get_session()
+        queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+        id_lists = await asyncio.gather(*(
+            _search_ids(session, query, max_results_per_query) for query in queries
+        ))
+        id_lists = [ids or [] for ids in id_lists]
+
+        # Union in first-seen order, remembering which queries found each PMID
+        found_by: Dict[str, List[int]] = {}
+        for index, ids in enumerate(id_lists):
+            for pmid in ids:
+                found_by.setdefault(pmid, []).append(index)
+
+        query_stats = [
+            {
+                "query": query,
+                "hits": len(ids),
+                "unique_hits": sum(1 for pmid in ids if len(found_by[pmid]) == 1)
+            }
+            for query, ids in zip(queries, id_lists)
+        ]
+
+        pairwise = []
+        id_sets = [set(ids) for ids in id_lists]
+        for i in range(len(queries)):
+            for j in range(i + 1, len(queries)):
+                shared = len(id_sets[i] & id_sets[j])
+                if shared:
+                    pairwise.append({"queries": [queries[i], queries[j]], "shared": shared})
+
+        total_hits = sum(len(ids) for ids in id_lists)
+        run = get_run_context()
+        if run is not None:
+            run.emit("search_stats", {
+                "query_stats": query_stats,
+                "unique_articles": len(found_by),
+                "duplicate_hits": total_hits - len(found_by)
+            })
+
+        articles, pruned = _present(await _fetch_articles(session, list(found_by))) if found_by else ([], 0)
+
+        topic_ranking = [
+            {"citation_key": key, "bm25": score} for key, score in run.index.rank(run.topic, top_k=15)
+        ] if run is not None else []
+
+        return {
+            "articles": articles,
+            "topic_ranking": topic_ranking,
+            "query_stats": query_stats,
+            "overlap": {
+                "total_hits": total_hits,
+                "unique_articles": len(found_by),
+                "duplicate_hits": total_hits - len(found_by),
+                "pairwise": pairwise
+            },
+            "pruned_low_relevance": pruned
+        }
+
+    except Exception as e:
+        print(f"Error in PubMed multi-search: {str(e)}")
+        return {"articles": [], "query_stats": [], "overlap": {}}
+
+
+async def pubmed_large_search(query: str, max_results: int = 2000, top_k: int = 25) -> Dict:
+    """
+    Search PubMed for a broad topic with many hits and return only the best candidates.
+
+    Up to max_results articles are paged from the NCBI history server and
+    pre-scored locally as they arrive; the top_k most relevant new articles
+    are returned as with pubmed_search, and the rest are dropped.
+    Use it when a focused query would miss relevant work among thousands of hits.
+    """
+    try:
+        run = get_run_context()
+        articles = []
+        async for article in pubmed_search_stream(query, max_results=max_results):
+            articles.append(article)
+            if run is not None and len(articles) % 200 == 0:
+                run.emit("search_progress", {"query": query, "fetched": len(articles)})
+        if run is not None:
+            run.emit("search_progress", {"query": query, "fetched": len(articles), "done": True})
+            run.emit("search_stats", {"query_stats": [{"query": query, "hits": len(articles)}]})
+
+        results, pruned = _present(articles, top_k=top_k)
+        return {
+            "articles": results,
+            "candidates_screened": len(articles),
+            "pruned_low_relevance": pruned
+        }
+
+    except Exception as e:
+        print(f"Error in PubMed large search: {str(e)}")
+        return {"articles": [], "candidates_screened": 0}
+
+
+async def rank_articles(query: str, top_k: int = 20) -> List[Dict]:
+    """
+    Rank every article retrieved so far in this run against a topic or subtheme.
+
+    Uses the run's local BM25 index (plus embeddings if configured), so no
+    PubMed or LLM call is made.
+    """
+    run = get_run_context()
+    if run is None:
+        return []
+    ranked = []
+    for key, score in run.index.rank(query, top_k=top_k):
+        article = run.articles.get_by_key(key)
+        ranked.append({
+            "citation_key": key,
+            "score": score,
+            "title": article.title if article is not None else None
+        })
+    return ranked
@@ -0,0 +1,166 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from .pubmed_cache import normalize_query
+from .scoring import terms
+
+MODES = ("serve", "warm")
+
+
+def topic_similarity(a: Set[str], b: Set[str]) -> float:
+    """
+    Jaccard similarity of two topics' stemmed, stopword-free term sets.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class TopicCache:
+    """
+    Results of finished runs keyed by research topic.
+
+    Each entry holds the planned queries, the approved references with
+    their article records, and the final markdown. Lookups match the
+    normalized topic text exactly, or else the most similar stored topic
+    whose term-set similarity reaches the threshold. Entries expire after
+    ttl_seconds because new literature keeps appearing, and the table is
+    trimmed to max_entries by least-recent use.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 7 * 24 * 3600, max_entries: int = 1000,
+                 threshold: float = 0.8):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS topics ("
+            "key TEXT PRIMARY KEY, topic TEXT NOT NULL, terms TEXT NOT NULL, data TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS topics_accessed ON topics(accessed)")
+        self._conn.commit()
+
+    def lookup(self, topic: str) -> Optional[Tuple[Dict, float]]:
+        """
+        The stored entry for the closest matching topic and its similarity, or None.
+
+        The entry has "topic", "queries", "approved_references", "articles",
+        "markdown" and "created".
+        """
+        key = normalize_query(topic)
+        topic_terms = set(terms(topic))
+        cutoff = time.time() - self.ttl_seconds
+        best: Optional[Tuple[str, float]] = None
+        # The table is small (max_entries rows), so a scan is cheaper than maintaining a term index
+        for row_key, row_terms in self._conn.execute(
+            "SELECT key, terms FROM topics WHERE created >= ?", (cutoff,)
+        ):
+            similarity = 1.0 if row_key == key else topic_similarity(topic_terms, set(json.loads(row_terms)))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (row_key, similarity)
+                if similarity == 1.0:
+                    break
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        row = self._conn.execute("SELECT topic, data, created FROM topics WHERE key = ?", (best[0],)).fetchone()
+        self._conn.execute("UPDATE topics SET accessed = ? WHERE key = ?", (time.time(), best[0]))
+        self._conn.commit()
+        self.hits += 1
+        return {"topic": row[0], **json.loads(row[1]), "created": row[2]}, round(best[1], 3)
+
+    def put(self, topic: str, queries: List[str], approved_references: List[Dict], articles: List[Dict],
+            markdown: str, created: Optional[float] = None):
+        """
+        Store a finished run's search results under its topic.
+
+        Pass the cached entry's created time when the run was warm-started,
+        so results first found long ago still expire ttl_seconds after that.
+        """
+        now = time.time()
+        data = {
+            "queries": queries,
+            "approved_references": approved_references,
+            "articles": articles,
+            "markdown": markdown
+        }
+        self._conn.execute(
+            "INSERT OR REPLACE INTO topics (key, topic, terms, data, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+            (normalize_query(topic), topic, json.dumps(sorted(set(terms(topic)))), json.dumps(data),
+             now if created is None else created, now)
+        )
+        self._evict()
+        self._conn.commit()
+
+    def _evict(self):
+        # Expired rows go first, then the least recently used ones over the limit
+        self._conn.execute("DELETE FROM topics WHERE created < ?", (time.time() - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM topics WHERE rowid IN (SELECT rowid FROM topics ORDER BY accessed ASC LIMIT ?)",
+                (excess,)
+            )
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0],
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "threshold": self.threshold
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+_cache: Optional[TopicCache] = None
+
+
+def get_topic_cache() -> Optional[TopicCache]:
+    """
+    Process-wide topic cache configured from the environment.
+
+    Set TOPIC_CACHE_PATH to an empty string to disable it.
+    """
+    global _cache
+    if _cache is None:
+        path = os.getenv("TOPIC_CACHE_PATH", "cache/topic_cache.sqlite3")
+        if not path:
+            return None
+        _cache = TopicCache(
+            path,
+            ttl_seconds=int(os.getenv("TOPIC_CACHE_TTL", str(7 * 24 * 3600))),
+            max_entries=int(os.getenv("TOPIC_CACHE_MAX_ENTRIES", "1000")),
+            threshold=float(os.getenv("TOPIC_CACHE_THRESHOLD", "0.8"))
+        )
+    return _cache
+
+
+def topic_cache_mode() -> str:
+    """
+    TOPIC_CACHE_MODE: "serve" returns the cached result, "warm" (default) reruns synthesis from its references.
+    """
+    mode = os.getenv("TOPIC_CACHE_MODE", "warm").lower()
+    if mode not in MODES:
+        raise ValueError(f"Unknown TOPIC_CACHE_MODE '{mode}'; expected one of {', '.join(MODES)}")
+    return mode
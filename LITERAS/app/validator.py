@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import ChatMessage, TextMessage
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, SystemMessage, UserMessage
+from .message_parsing import extract_json
+from .run_context import get_run_context
+
+SCORE_FIELDS = ("relevance_score", "recency_score", "methodology_score", "applicability_score", "innovation_score")
+
+SYSTEM_MESSAGE = """Score each article using these criteria (total 25 points):
+1. Direct relevance to the research topic (0-5 points)
+2. Recency of publication (0-5 points)
+3. Study type/methodology (0-5 points)
+4. Clinical applicability (0-5 points)
+5. Innovation/novelty (0-5 points)
+
+Articles include "prescores" computed from PubMed metadata.
+Use prescores.recency_score and prescores.methodology_score as-is, and treat
+prescores.relevance_score as a lexical starting point for your relevance judgement.
+
+Score every article you are given, exactly once, identified by its citation_key.
+Reply with JSON only:
+{
+    "scored_papers": [
+        {
+            "citation_key": "key from the article",
+            "title": "paper title",
+            "doi": "doi number",
+            "relevance_score": X,
+            "recency_score": Y,
+            "methodology_score": Z,
+            "applicability_score": A,
+            "innovation_score": B,
+            "total_score": N,
+            "reason": "one-sentence explanation"
+        }
+    ]
+}"""
+
+
+def validator_shard_size() -> int:
+    return max(1, int(os.getenv("VALIDATOR_SHARD_SIZE", "10")))
+
+
+def check_shard(output: Optional[str], keys: Sequence[str]) -> Tuple[Optional[List[Dict]], str]:
+    """
+    The shard's scored papers in key order, or None and why the output fails the schema.
+
+    Every key must be scored with all five scores as numbers from 0 to 5;
+    papers from outside the shard are ignored and total_score is recomputed.
+    """
+    data = extract_json(output) if isinstance(output, str) else None
+    if not isinstance(data, dict) or not isinstance(data.get("scored_papers"), list):
+        return None, 'the reply is not a JSON object with a "scored_papers" list'
+
+    scored = {}
+    for paper in data["scored_papers"]:
+        if not isinstance(paper, dict) or paper.get("citation_key") not in keys:
+            continue
+        key = paper["citation_key"]
+        scores = {}
+        for name in SCORE_FIELDS:
+            value = paper.get(name)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 5:
+                return None, f"{key} has no valid {name} (a number from 0 to 5)"
+            scores[name] = value
+        scored[key] = {**paper, **scores, "total_score": round(sum(scores.values()), 2),
+                       "reason": str(paper.get("reason", ""))}
+
+    missing = [key for key in keys if key not in scored]
+    if missing:
+        return None, f"{len(missing)} of {len(keys)} papers were not scored: {', '.join(missing)}"
+    return [scored[key] for key in keys], ""
+
+
+class ShardedValidator(BaseChatAgent):
+    """
+    Validator that scores the round's papers in fixed-size shards, concurrently.
+
+    Each turn scores the papers pre-scored since the previous turn. They are
+    split into shards of shard_size, and each shard is one model call. A
+    shard's reply must pass check_shard(); only shards that fail are sent
+    again, with the failure reason, up to max_retries times. A shard that
+    never passes falls back to its metadata prescores. The merged result is
+    one message in the usual {"scored_papers", "summary"} format, so latency
+    depends on the shard size rather than on the number of papers.
+    """
+
+    def __init__(self, model_client: ChatCompletionClient, name: str = "Validator",
+                 shard_size: Optional[int] = None, max_concurrency: Optional[int] = None,
+                 max_retries: Optional[int] = None):
+        super().__init__(name, "Paper scoring specialist")
+        self.model_client = model_client
+        self.shard_size = shard_size or validator_shard_size()
+        self.max_concurrency = max_concurrency or int(os.getenv("VALIDATOR_MAX_CONCURRENCY", "4"))
+        self.max_retries = int(os.getenv("VALIDATOR_SHARD_RETRIES", "2")) if max_retries is None else max_retries
+        self._scored: set = set()
+        self._searched: List[Dict] = []
+
+    @property
+    def produced_message_types(self) -> List[type[ChatMessage]]:
+        return [TextMessage]
+
+    async def on_messages(self, messages: Sequence[ChatMessage], cancellation_token: CancellationToken) -> Response:
+        for message in messages:
+            if message.source == "SearchAgent" and isinstance(message.content, str):
+                found = extract_json(message.content)
+                if isinstance(found, dict) and isinstance(found.get("articles"), list):
+                    self._searched.extend(a for a in found["articles"] if isinstance(a, dict) and a.get("title"))
+
+        papers = [paper for paper in self._papers() if paper["citation_key"] not in self._scored]
+        shards = [papers[i:i + self.shard_size] for i in range(0, len(papers), self.shard_size)]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        run = get_run_context()
+
+        async def score(index: int, shard: List[Dict]) -> Tuple[List[Dict], int, bool]:
+            async with semaphore:
+                scored, retries, ok = await self._score_shard(shard, cancellation_token)
+            if run is not None:
+                run.emit("validator_progress", {"shard": index + 1, "shards": len(shards), "papers": len(shard),
+                                                "retries": retries, "ok": ok})
+            return scored, retries, ok
+
+        results = await asyncio.gather(*(score(i, shard) for i, shard in enumerate(shards)))
+        scored_papers = [paper for scored, _, _ in results for paper in scored]
+        self._scored.update(paper["citation_key"] for paper in papers)
+
+        content = json.dumps({
+            "scored_papers": scored_papers,
+            "summary": {
+                "total_papers": len(scored_papers),
+                "high_quality_papers": sum(1 for paper in scored_papers if paper["total_score"] >= 20),
+                "shards": len(shards),
+                "retried_shards": sum(1 for _, retries, _ in results if retries),
+                "fallback_shards": sum(1 for _, _, ok in results if not ok)
+            }
+        }, indent=2)
+        return Response(chat_message=TextMessage(content=content, source=self.name))
+
+    def _papers(self) -> List[Dict]:
+        """
+        Candidates in prompt form: the run's pre-scored articles, or else those parsed from search output.
+        """
+        run = get_run_context()
+        if run is None:
+            return list({paper["citation_key"]: paper for paper in self._searched if paper.get("citation_key")}.values())
+        papers = []
+        for key, prescores in run.prescores.items():
+            article = run.articles.get_by_key(key)
+            if article is not None:
+                papers.append({**article.to_prompt_dict(), "prescores": prescores})
+        return papers
+
+    async def _score_shard(self, shard: List[Dict], cancellation_token: CancellationToken) -> Tuple[List[Dict], int, bool]:
+        """
+        Scored papers for one shard, the number of retries it took, and whether the model's scores were used.
+        """
+        keys = [paper["citation_key"] for paper in shard]
+        run = get_run_context()
+        topic = run.topic if run is not None else ""
+        json_output = bool(self.model_client.capabilities.get("json_output"))
+        messages = [
+            SystemMessage(content=SYSTEM_MESSAGE),
+            UserMessage(content=f"Research topic: {topic}\n\nArticles:\n{json.dumps(shard)}", source=self.name)
+        ]
+        problem = ""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # The reason changes the prompt, so a retry is never answered from the completion cache
+                messages = messages[:2] + [UserMessage(
+                    content=f"Your previous reply was rejected: {problem}. Reply again with JSON only, "
+                            f"scoring all {len(keys)} articles.",
+                    source=self.name
+                )]
+            try:
+                result = await self.model_client.create(messages, json_output=json_output,
+                                                        cancellation_token=cancellation_token)
+                scored, problem = check_shard(result.content if isinstance(result.content, str) else None, keys)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                scored, problem = None, f"the model call failed ({str(e)})"
+            if scored is not None:
+                return scored, attempt, True
+
+        print(f"Validator shard of {len(keys)} papers failed validation, using prescores: {problem}")
+        return [self._prescored(paper) for paper in shard], self.max_retries, False
+
+    @staticmethod
+    def _prescored(paper: Dict) -> Dict:
+        prescores = paper.get("prescores", {})
+        scores = {name: prescores.get(name, 0) for name in SCORE_FIELDS}
+        return {
+            "citation_key": paper["citation_key"],
+            "title": paper.get("title", ""),
+            "doi": paper.get("doi", ""),
+            **scores,
+            "total_score": round(sum(scores.values()), 2),
+            "reason": "Model scores failed validation; metadata prescores only."
+        }
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        self._scored = set()
+        self._searched = []
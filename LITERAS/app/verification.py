@@ -0,0 +1,415 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional
+
+import aiohttp
+from dotenv import load_dotenv
+
+from .articles import Article, ArticleStore, extract_dois, normalize_doi
+from .tools import EUTILS_BASE_URL, NCBI_API_KEY, close_session, get_rate_limiter, get_session
+
+BATCH_SIZE = 200
+TITLE_MATCH_THRESHOLD = 0.85
+
+_PMID_TEXT = re.compile(r"PMID:?\s*(\d{5,9})", re.IGNORECASE)
+_PMID_URL = re.compile(r"(?:pubmed\.ncbi\.nlm\.nih\.gov|ncbi\.nlm\.nih\.gov/pubmed)/(\d{5,9})")
+_YEAR = re.compile(r"\b((?:19|20)\d{2})\b")
+
+
+def _normalize_title(title: Optional[str]) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", (title or "").lower()))
+
+
+def title_similarity(a: Optional[str], b: Optional[str]) -> float:
+    a, b = _normalize_title(a), _normalize_title(b)
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _surname(name: Optional[str]) -> Optional[str]:
+    """
+    Surname from an author name such as "van der Berg J" or "De Souza, A. B."
+
+    Everything before the first comma is kept, minus trailing initials, so
+    multi-word surnames stay whole.
+    """
+    words = str(name or "").split(",")[0].split()
+    while len(words) > 1 and re.fullmatch(r"[A-Z][A-Z.\-]*", words[-1]) \
+            and len(re.sub(r"[.\-]", "", words[-1])) <= 3:
+        words.pop()
+    return " ".join(words) or None
+
+
+def _normalize_name(name: Optional[str]) -> str:
+    # Accents and case are dropped, so "Müller" matches "Muller" and "DE SOUZA" matches "De Souza"
+    name = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode()
+    return " ".join(re.findall(r"[a-z]+", name.lower()))
+
+
+class VerifiedIndex:
+    """
+    On-disk index of identifiers already resolved against PubMed.
+
+    Keys are "pmid:<id>" and "doi:<normalized doi>"; both point to the same
+    metadata record (pmid, doi, title, first_author, year). Identifiers that
+    PubMed does not know are stored with a null record and a shorter TTL,
+    so they are re-checked later without being looked up on every run.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 90 * 24 * 3600, negative_ttl_seconds: int = 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verified (key TEXT PRIMARY KEY, data TEXT, verified REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, keys: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """
+        Known keys mapped to their record, or to None if PubMed had no match.
+        """
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT key, data, verified FROM verified WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, data, verified in rows:
+                ttl = self.ttl_seconds if data is not None else self.negative_ttl_seconds
+                if now - verified <= ttl:
+                    found[key] = json.loads(data) if data is not None else None
+        return found
+
+    def put(self, entries: Dict[str, Optional[Dict]]):
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO verified (key, data, verified) VALUES (?, ?, ?)",
+            [(key, json.dumps(record) if record is not None else None, now) for key, record in entries.items()]
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+_index: Optional[VerifiedIndex] = None
+
+
+def get_verified_index() -> VerifiedIndex:
+    global _index
+    if _index is None:
+        _index = VerifiedIndex(os.getenv("VERIFICATION_INDEX_PATH", "cache/verified_ids.sqlite3"))
+    return _index
+
+
+def _record_from_summary(summary: Dict) -> Dict:
+    doi = next((a.get("value") for a in summary.get("articleids", []) if a.get("idtype") == "doi"), None)
+    authors = summary.get("authors") or []
+    first_author = _surname(authors[0].get("name")) if authors else None
+    year = _YEAR.search(summary.get("pubdate") or summary.get("epubdate") or "")
+    return {
+        "pmid": str(summary.get("uid")),
+        "doi": normalize_doi(doi),
+        "title": (summary.get("title") or "").rstrip("."),
+        "first_author": first_author or None,
+        "year": year.group(1) if year else None
+    }
+
+
+def _record_from_article(article: Article) -> Dict:
+    return {
+        "pmid": article.pmid,
+        "doi": normalize_doi(article.doi),
+        "title": (article.title or "").rstrip("."),
+        "first_author": article.first_author_last_name,
+        "year": article.year
+    }
+
+
+async def _post(session: aiohttp.ClientSession, endpoint: str, params: Dict, max_retries: int = 3) -> Dict:
+    """
+    POST an E-utilities request and return the JSON reply.
+
+    Rate limiting, server errors and transport errors are retried; if the
+    request still fails, RuntimeError is raised rather than returning an
+    empty reply, so a failed lookup is never mistaken for "not in PubMed".
+    """
+    problem = ""
+    for attempt in range(max_retries):
+        if attempt:
+            await asyncio.sleep(2 ** (attempt - 1))
+        await get_rate_limiter().acquire()
+        try:
+            # POST keeps 200 IDs out of the URL
+            async with session.post(f"{EUTILS_BASE_URL}/{endpoint}",
+                                    data={**params, "api_key": NCBI_API_KEY}) as response:
+                if response.status == 429 or response.status >= 500:
+                    problem = f"Status {response.status}"
+                    continue
+                if response.status != 200:
+                    raise RuntimeError(f"E-utilities {endpoint} error: Status {response.status}")
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            problem = str(e) or type(e).__name__
+            continue
+        if not isinstance(data, dict) or "error" in data:
+            problem = f"error reply {str(data)[:200]}"
+            continue
+        return data
+    raise RuntimeError(f"E-utilities {endpoint} failed after {max_retries} attempts: {problem}")
+
+
+async def _esummary(session: aiohttp.ClientSession, pmids: List[str]) -> Dict[str, Dict]:
+    """
+    Records for the PMIDs PubMed knows; the others are left out of the result.
+    """
+    data = await _post(session, "esummary.fcgi", {"db": "pubmed", "id": ",".join(pmids), "retmode": "json"})
+    result = data.get("result", {})
+    return {
+        uid: _record_from_summary(result[uid])
+        for uid in result.get("uids", []) if uid in result and "error" not in result[uid]
+    }
+
+
+async def _pmids_for_dois(session: aiohttp.ClientSession, dois: List[str]) -> List[str]:
+    term = " OR ".join(f'"{doi}"[doi]' for doi in dois)
+    data = await _post(session, "esearch.fcgi", {"db": "pubmed", "term": term, "retmax": len(dois) * 2,
+                                                  "retmode": "json"})
+    return data.get("esearchresult", {}).get("idlist", [])
+
+
+class ReferenceVerifier:
+    """
+    Bulk resolution of DOIs and PMIDs with a local verified-ID index.
+
+    Identifiers missing from the index are resolved in batches of
+    BATCH_SIZE: one ESummary call per batch of PMIDs, and for DOIs one
+    esearch plus one ESummary call per batch. Batches run concurrently
+    under the shared NCBI rate limiter.
+    """
+
+    def __init__(self, index: Optional[VerifiedIndex] = None, batch_size: int = BATCH_SIZE):
+        self.index = index or get_verified_index()
+        self.batch_size = batch_size
+
+    async def resolve(self, pmids: Iterable[str] = (), dois: Iterable[str] = (),
+                      known: Optional[ArticleStore] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Map "pmid:<id>" / "doi:<doi>" keys to PubMed metadata, or None if not found.
+
+        Articles in `known` were fetched from PubMed during the run and
+        count as resolved without another request. Only identifiers that a
+        successful PubMed reply did not contain are recorded as not found;
+        if a lookup fails, RuntimeError is raised and nothing is written.
+        """
+        keys = [f"pmid:{p}" for p in dict.fromkeys(pmids) if p]
+        keys += [f"doi:{d}" for d in dict.fromkeys(normalize_doi(d) for d in dois) if d]
+        resolved = self.index.get(keys)
+
+        fresh: Dict[str, Optional[Dict]] = {}
+        if known is not None:
+            for key in keys:
+                if key in resolved:
+                    continue
+                kind, value = key.split(":", 1)
+                article = known.get(pmid=value) if kind == "pmid" else known.get(doi=value)
+                if article is not None:
+                    fresh[key] = _record_from_article(article)
+
+        missing_pmids = [k[5:] for k in keys if k not in resolved and k not in fresh and k.startswith("pmid:")]
+        missing_dois = [k[4:] for k in keys if k not in resolved and k not in fresh and k.startswith("doi:")]
+        if missing_pmids or missing_dois:
+            session = get_session()
+            doi_batches = [missing_dois[i:i + self.batch_size] for i in range(0, len(missing_dois), self.batch_size)]
+            doi_pmids = await asyncio.gather(*(_pmids_for_dois(session, batch) for batch in doi_batches))
+            all_pmids = list(dict.fromkeys(missing_pmids + [p for batch in doi_pmids for p in batch]))
+            summaries = await asyncio.gather(*(
+                _esummary(session, all_pmids[i:i + self.batch_size])
+                for i in range(0, len(all_pmids), self.batch_size)
+            ))
+            records = {pmid: record for batch in summaries for pmid, record in batch.items()}
+            by_doi = {record["doi"]: record for record in records.values() if record["doi"]}
+            for pmid in missing_pmids:
+                fresh[f"pmid:{pmid}"] = records.get(pmid)
+            for doi in missing_dois:
+                fresh[f"doi:{doi}"] = by_doi.get(doi)
+
+        if fresh:
+            self.index.put(fresh)
+        return {**resolved, **fresh}
+
+    async def verify(self, references: List[Dict], known: Optional[ArticleStore] = None) -> List[Dict]:
+        """
+        Check claimed references ({title, first_author or authors, year, doi, pmid}).
+
+        Each result has status "verified", "mismatch", "not_found" or
+        "no_identifier", plus the list of issues and the PubMed record.
+        """
+        resolved = await self.resolve(
+            pmids=[str(ref["pmid"]) for ref in references if ref.get("pmid")],
+            dois=[ref["doi"] for ref in references if ref.get("doi")],
+            known=known
+        )
+        return [self._compare(ref, resolved) for ref in references]
+
+    @staticmethod
+    def _compare(ref: Dict, resolved: Dict[str, Optional[Dict]]) -> Dict:
+        records = []
+        if ref.get("pmid"):
+            records.append(resolved.get(f"pmid:{ref['pmid']}"))
+        if ref.get("doi"):
+            records.append(resolved.get(f"doi:{normalize_doi(ref['doi'])}"))
+        if not records:
+            return {"reference": ref, "status": "no_identifier", "issues": [], "record": None}
+        record = next((r for r in records if r is not None), None)
+        if record is None:
+            return {"reference": ref, "status": "not_found", "issues": ["identifier not found in PubMed"],
+                    "record": None}
+
+        issues = []
+        if len(records) == 2 and records[0] and records[1] and records[0]["pmid"] != records[1]["pmid"]:
+            issues.append("PMID and DOI point to different articles")
+        if ref.get("title") and title_similarity(ref["title"], record["title"]) < TITLE_MATCH_THRESHOLD:
+            issues.append(f"title mismatch (PubMed: {record['title']})")
+        claimed_author = ref.get("first_author")
+        if not claimed_author and ref.get("authors"):
+            claimed_author = _surname(ref["authors"][0])
+        if claimed_author and record["first_author"] \
+                and _normalize_name(claimed_author) != _normalize_name(record["first_author"]):
+            issues.append(f"first author mismatch (PubMed: {record['first_author']})")
+        if ref.get("year") and record["year"] and str(ref["year"])[:4] != record["year"]:
+            issues.append(f"year mismatch (PubMed: {record['year']})")
+        return {"reference": ref, "status": "mismatch" if issues else "verified", "issues": issues,
+                "record": record}
+
+
+def summarize(results: List[Dict]) -> Dict:
+    counts = {"verified": 0, "mismatch": 0, "not_found": 0, "no_identifier": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    checked = counts["verified"] + counts["mismatch"] + counts["not_found"]
+    return {**counts, "total": len(results),
+            "correct_rate": round(counts["verified"] / checked, 4) if checked else None}
+
+
+def parse_reference_line(line: str) -> Dict:
+    """
+    Heuristic metadata from a free-text reference ("Authors. Title. Journal. Year;...").
+    """
+    text = re.sub(r"^\s*(?:\[\d+\]|\d+[.)])\s*", "", line).strip()
+    doi = extract_dois(text)
+    pmid = _PMID_TEXT.search(text) or _PMID_URL.search(text)
+    year = _YEAR.search(text)
+    segments = [s.strip() for s in re.split(r"\.\s+", text) if s.strip()]
+    first_author = _surname(segments[0]) if segments else None
+    return {
+        "text": text,
+        # "van der Berg" is a surname too; only the last word needs a capital
+        "first_author": first_author if first_author and first_author.split()[-1][:1].isupper() else None,
+        "title": segments[1] if len(segments) > 1 else None,
+        "year": year.group(1) if year else None,
+        "doi": doi[0] if doi else None,
+        "pmid": pmid.group(1) if pmid else None
+    }
+
+
+def references_from_text(text: str) -> List[Dict]:
+    """
+    Numbered entries of the references section of a generated introduction.
+    """
+    parts = re.split(r"(?i)#*\s*references\s*:?\s*\n", text or "", maxsplit=1)
+    if len(parts) < 2:
+        return []
+    entries = [line for line in parts[1].splitlines() if re.match(r"^\s*(?:\[\d+\]|\d+[.)])\s+\S", line)]
+    return [parse_reference_line(line) for line in entries]
+
+
+def references_from_urls(urls: Iterable[str]) -> List[Dict]:
+    """
+    Citation URLs that carry a PMID or DOI; other URLs cannot be checked and are skipped.
+    """
+    references = []
+    for url in urls:
+        if not isinstance(url, str):
+            continue
+        pmid = _PMID_URL.search(url)
+        doi = extract_dois(url)
+        if pmid or doi:
+            references.append({"text": url, "pmid": pmid.group(1) if pmid else None,
+                               "doi": doi[0] if doi else None})
+    return references
+
+
+async def verify_perplexity_output(path: str, output: Optional[str] = None) -> Dict:
+    """
+    Verify every reference in a "Preplexity Control.py" results sheet in one bulk pass.
+    """
+    # Only this command-line path needs pandas, so the web app does not load it
+    import pandas as pd
+
+    df = pd.read_excel(path) if not path.endswith(".csv") else pd.read_csv(path)
+    rows = []
+    for _, row in df.iterrows():
+        references = references_from_text(row.get("Main Text"))
+        urls = [row[col] for col in df.columns if str(col).startswith("Reference ")]
+        references += references_from_urls(urls)
+        rows.append((row.get("Title"), references))
+
+    verifier = ReferenceVerifier()
+    all_refs = [ref for _, refs in rows for ref in refs]
+    results = await verifier.verify(all_refs)
+
+    details, per_title, position = [], [], 0
+    for title, refs in rows:
+        title_results = results[position:position + len(refs)]
+        position += len(refs)
+        per_title.append({"Title": title, **summarize(title_results)})
+        details.extend({
+            "Title": title,
+            "Reference": result["reference"].get("text"),
+            "Status": result["status"],
+            "Issues": "; ".join(result["issues"]),
+            "PubMed Title": (result["record"] or {}).get("title"),
+            "PMID": (result["record"] or {}).get("pmid")
+        } for result in title_results)
+
+    overall = summarize(results)
+    if output:
+        with pd.ExcelWriter(output) as writer:
+            pd.DataFrame(per_title).to_excel(writer, sheet_name="Summary", index=False)
+            pd.DataFrame(details).to_excel(writer, sheet_name="References", index=False)
+        print(f"Verification results saved to {output}")
+    return overall
+
+
+async def _main(args: argparse.Namespace):
+    try:
+        overall = await verify_perplexity_output(args.input, args.output)
+    finally:
+        await close_session()
+    print(json.dumps(overall, indent=2))
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Bulk-verify the references in a generated results sheet.")
+    parser.add_argument("input", help="Results .xlsx/.csv, e.g. perplexity_literature_review.xlsx")
+    parser.add_argument("--output", default="reference_verification.xlsx")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,151 @@
+"""
+Compare the legacy efetch parser with the streaming PubmedArticleStreamParser.
+
+Usage (from the LITERAS directory):
+    python -m benchmarks.parser_benchmark recorded_efetch_1.xml recorded_efetch_2.xml
+    python -m benchmarks.parser_benchmark --synthetic 2000
+
+Recorded payloads are raw efetch.fcgi responses (retmode=xml). The
+synthetic mode replicates one realistic article N times for quick runs.
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, List
+
+from app.pubmed_parser import parse_pubmed_xml
+
+SYNTHETIC_ARTICLE = """<PubmedArticle>
+<MedlineCitation Status="MEDLINE" Owner="NLM">
+<PMID Version="1">{pmid}</PMID>
+<Article PubModel="Print-Electronic">
+<Journal>
+<ISSN IssnType="Electronic">1234-5678</ISSN>
+<JournalIssue CitedMedium="Internet"><Volume>12</Volume><Issue>3</Issue>
+<PubDate><Year>2023</Year><Month>Nov</Month></PubDate></JournalIssue>
+<Title>Journal of Synthetic Benchmark Medicine</Title>
+<ISOAbbreviation>J Synth Bench Med</ISOAbbreviation>
+</Journal>
+<ArticleTitle>Synthetic article {pmid} on <i>benchmark</i> outcomes in adults.</ArticleTitle>
+<Pagination><MedlinePgn>101-110</MedlinePgn></Pagination>
+<ELocationID EIdType="doi" ValidYN="Y">10.0000/synthetic.{pmid}</ELocationID>
+<Abstract>
+<AbstractText Label="BACKGROUND">{filler}</AbstractText>
+<AbstractText Label="METHODS">{filler}</AbstractText>
+<AbstractText Label="RESULTS">{filler}</AbstractText>
+<AbstractText Label="CONCLUSIONS">{filler}</AbstractText>
+</Abstract>
+<AuthorList CompleteYN="Y">
+<Author ValidYN="Y"><LastName>Doe</LastName><ForeName>Jane</ForeName><Initials>J</Initials></Author>
+<Author ValidYN="Y"><LastName>Roe</LastName><ForeName>Richard</ForeName><Initials>R</Initials></Author>
+<Author ValidYN="Y"><LastName>Poe</LastName><ForeName>Alex</ForeName><Initials>A</Initials></Author>
+</AuthorList>
+<PublicationTypeList><PublicationType UI="D016449">Randomized Controlled Trial</PublicationType></PublicationTypeList>
+</Article>
+<MeshHeadingList>
+<MeshHeading><DescriptorName UI="D006801">Humans</DescriptorName></MeshHeading>
+<MeshHeading><DescriptorName UI="D000328">Adult</DescriptorName></MeshHeading>
+</MeshHeadingList>
+</MedlineCitation>
+<PubmedData>
+<ArticleIdList>
+<ArticleId IdType="pubmed">{pmid}</ArticleId>
+<ArticleId IdType="doi">10.0000/synthetic.{pmid}</ArticleId>
+</ArticleIdList>
+</PubmedData>
+</PubmedArticle>
+"""
+
+
+def synthetic_payload(count: int) -> bytes:
+    filler = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 12
+    body = "".join(SYNTHETIC_ARTICLE.format(pmid=10000000 + i, filler=filler) for i in range(count))
+    return f'<?xml version="1.0" ?>\n<PubmedArticleSet>\n{body}</PubmedArticleSet>\n'.encode()
+
+
+def legacy_parse(content: bytes) -> List[Dict]:
+    """
+    The original tools.pubmed_search parser: whole-document tree, two finds per field.
+    """
+    root = ET.fromstring(content.decode())
+    results = []
+    for article in root.findall(".//PubmedArticle"):
+        article_data = {
+            "title": article.find(".//ArticleTitle").text if article.find(
+                ".//ArticleTitle") is not None else "No title available",
+            "abstract": article.find(".//Abstract/AbstractText").text if article.find(
+                ".//Abstract/AbstractText") is not None else "No abstract available",
+            "journal": article.find(".//Journal/Title").text if article.find(
+                ".//Journal/Title") is not None else "No journal available",
+            "date": "Unknown",
+            "doi": article.find(".//ArticleId[@IdType='doi']").text if article.find(
+                ".//ArticleId[@IdType='doi']") is not None else "No DOI available",
+            "first_author": "No author name available",
+            "pmid": article.find(".//PMID").text if article.find(".//PMID") is not None else ""
+        }
+        pub_date = article.find(".//PubDate")
+        if pub_date is not None:
+            year = pub_date.find("Year")
+            month = pub_date.find("Month")
+            year_text = year.text if year is not None else "Unknown"
+            month_text = month.text if month is not None else "01"
+            article_data["date"] = f"{year_text}-{month_text}"
+        authors = article.findall(".//Author")
+        if authors:
+            last_name = authors[0].find("LastName")
+            first_name = authors[0].find("ForeName")
+            if last_name is not None and first_name is not None:
+                article_data["first_author"] = f"{first_name.text} {last_name.text}"
+                if len(authors) > 1:
+                    article_data["first_author"] += " et al."
+        results.append(article_data)
+    return results
+
+
+def measure(parse: Callable[[bytes], List[Dict]], payload: bytes, repeat: int) -> Dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        articles = parse(payload)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "articles": len(articles),
+        "median_s": statistics.median(timings),
+        "per_article_us": statistics.median(timings) / max(len(articles), 1) * 1e6,
+        "peak_kib": peak / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("payloads", nargs="*", help="Recorded efetch XML responses")
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate a payload with N articles")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = []
+    for path in args.payloads:
+        with open(path, "rb") as f:
+            payloads.append((path, f.read()))
+    if args.synthetic or not payloads:
+        count = args.synthetic or 500
+        payloads.append((f"synthetic x{count}", synthetic_payload(count)))
+
+    print(f"{'payload':<32} {'parser':<10} {'articles':>8} {'median ms':>10} {'us/article':>11} {'peak KiB':>10}")
+    for name, payload in payloads:
+        for label, parse in (("legacy", legacy_parse), ("streaming", parse_pubmed_xml)):
+            result = measure(parse, payload, args.repeat)
+            print(f"{name[-32:]:<32} {label:<10} {result['articles']:>8} {result['median_s'] * 1000:>10.1f} "
+                  f"{result['per_article_us']:>11.1f} {result['peak_kib']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+"""
+Recorded fixtures and stand-ins for replaying a pipeline run offline.
+
+A fixture file is one JSON document:
+    {
+        "topic": "research topic the run was started with",
+        "model": "model the completions came from",
+        "searches": {"<normalized esearch term>": ["pmid", ...]},
+        "articles": {"<pmid>": "<PubmedArticle>...</PubmedArticle>"},
+        "completions": [{"content": "..." | [{"id", "name", "arguments"}],
+                         "prompt_tokens": N, "completion_tokens": M, "latency_s": T}, ...]
+    }
+
+Articles are stored one <PubmedArticle> element per PMID rather than as
+whole efetch responses, so a replay does not depend on how the tools batch
+their efetch requests. Completions are replayed in the order they were
+recorded; the selector is deterministic, so the same flow asks for them
+in the same order.
+"""
+import asyncio
+import json
+import math
+import re
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, AsyncGenerator, Dict, List, Mapping, Optional, Sequence, Union
+
+import aiohttp
+from aiohttp import web
+from autogen_core import CancellationToken, FunctionCall
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage, ModelCapabilities, RequestUsage
+from autogen_core.tools import Tool, ToolSchema
+
+from app import tools, verification
+from app.articles import normalize_doi
+from app.model_clients import DelegatingChatCompletionClient
+from app.pubmed_cache import normalize_query
+from app.pubmed_parser import parse_article_element
+from app.validator import validator_shard_size
+
+ARTICLE_TEMPLATE = """<PubmedArticle>
+<MedlineCitation Status="MEDLINE" Owner="NLM">
+<PMID Version="1">{pmid}</PMID>
+<Article PubModel="Print-Electronic">
+<Journal>
+<ISSN IssnType="Electronic">1234-5678</ISSN>
+<JournalIssue CitedMedium="Internet"><Volume>{volume}</Volume><Issue>{issue}</Issue>
+<PubDate><Year>{year}</Year><Month>Mar</Month></PubDate></JournalIssue>
+<Title>Journal of Synthetic Benchmark Medicine</Title>
+<ISOAbbreviation>J Synth Bench Med</ISOAbbreviation>
+</Journal>
+<ArticleTitle>{title}</ArticleTitle>
+<Pagination><MedlinePgn>{first_page}-{last_page}</MedlinePgn></Pagination>
+<ELocationID EIdType="doi" ValidYN="Y">10.5555/synthetic.{pmid}</ELocationID>
+<Abstract>
+<AbstractText Label="BACKGROUND">{background}</AbstractText>
+<AbstractText Label="METHODS">{filler}</AbstractText>
+<AbstractText Label="RESULTS">{filler}</AbstractText>
+<AbstractText Label="CONCLUSIONS">{background}</AbstractText>
+</Abstract>
+<AuthorList CompleteYN="Y">
+<Author ValidYN="Y"><LastName>{last_name}</LastName><ForeName>{fore_name}</ForeName><Initials>{initial}</Initials></Author>
+<Author ValidYN="Y"><LastName>Roe</LastName><ForeName>Richard</ForeName><Initials>R</Initials></Author>
+<Author ValidYN="Y"><LastName>Poe</LastName><ForeName>Alex</ForeName><Initials>A</Initials></Author>
+</AuthorList>
+<PublicationTypeList><PublicationType UI="D016449">{publication_type}</PublicationType></PublicationTypeList>
+</Article>
+<MeshHeadingList>
+<MeshHeading><DescriptorName UI="D006801">Humans</DescriptorName></MeshHeading>
+</MeshHeadingList>
+</MedlineCitation>
+<PubmedData>
+<ArticleIdList>
+<ArticleId IdType="pubmed">{pmid}</ArticleId>
+<ArticleId IdType="doi">10.5555/synthetic.{pmid}</ArticleId>
+</ArticleIdList>
+</PubmedData>
+</PubmedArticle>"""
+
+SURNAMES = [
+    "Adams", "Baker", "Carter", "Diaz", "Evans", "Fischer", "Garcia", "Hughes", "Ito", "Jensen",
+    "Kowalski", "Lopez", "Moreau", "Nakamura", "Okafor", "Patel", "Quinn", "Rossi", "Silva", "Tanaka"
+]
+PUBLICATION_TYPES = ["Randomized Controlled Trial", "Systematic Review", "Meta-Analysis", "Cohort Studies"]
+
+
+class ReplayExhausted(RuntimeError):
+    pass
+
+
+class Fixtures:
+    """
+    Recorded NCBI responses and LLM completions for one topic.
+    """
+
+    def __init__(self, topic: str = "", model: str = "replay", searches: Optional[Dict[str, List[str]]] = None,
+                 articles: Optional[Dict[str, str]] = None, completions: Optional[List[Dict]] = None):
+        self.topic = topic
+        self.model = model
+        self.searches = searches or {}
+        self.articles = articles or {}
+        self.completions = completions or []
+
+    @classmethod
+    def load(cls, path: str) -> "Fixtures":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("topic", ""), data.get("model", "replay"), data.get("searches"),
+                   data.get("articles"), data.get("completions"))
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "topic": self.topic,
+                "model": self.model,
+                "searches": self.searches,
+                "articles": self.articles,
+                "completions": self.completions
+            }, f, indent=1)
+
+    def efetch_payload(self, ids: Sequence[str]) -> bytes:
+        body = "\n".join(self.articles[pmid] for pmid in ids if pmid in self.articles)
+        return f'<?xml version="1.0" ?>\n<PubmedArticleSet>\n{body}\n</PubmedArticleSet>\n'.encode()
+
+    def record_efetch(self, content: bytes) -> List[str]:
+        """
+        Store each article of an efetch response; returns their PMIDs in response order.
+        """
+        pmids = []
+        root = ET.fromstring(content)
+        for article in root.iter("PubmedArticle"):
+            pmid = article.findtext("MedlineCitation/PMID")
+            if pmid:
+                self.articles[pmid] = ET.tostring(article, encoding="unicode").strip()
+                pmids.append(pmid)
+        return pmids
+
+    def esummary_result(self, ids: Sequence[str]) -> Dict:
+        """
+        ESummary JSON "result" for the given PMIDs, derived from the recorded articles.
+        """
+        result: Dict[str, Any] = {"uids": list(ids)}
+        for pmid in ids:
+            if pmid not in self.articles:
+                result[pmid] = {"uid": pmid, "error": "cannot get document summary"}
+                continue
+            record = parse_article_element(ET.fromstring(self.articles[pmid]))
+            result[pmid] = {
+                "uid": pmid,
+                "title": record["title"] or "",
+                "pubdate": record["year"] or "",
+                "authors": [{"name": f"{a['last_name']} {a.get('initials') or ''}".strip()}
+                            for a in record["authors"]],
+                "articleids": [{"idtype": "doi", "value": record["doi"]}] if record["doi"] else []
+            }
+        return result
+
+    def pmids_for_dois(self, dois: Sequence[str]) -> List[str]:
+        wanted = {normalize_doi(doi) for doi in dois}
+        return [pmid for pmid, xml in self.articles.items()
+                if normalize_doi(parse_article_element(ET.fromstring(xml))["doi"]) in wanted]
+
+
+def use_eutils(base_url: str):
+    """
+    Point the PubMed tools and the reference verifier at another E-utilities base URL.
+    """
+    tools.EUTILS_BASE_URL = base_url
+    verification.EUTILS_BASE_URL = base_url
+
+
+class StandInEutils:
+    """
+    Local aiohttp server answering esearch.fcgi, efetch.fcgi and esummary.fcgi from fixtures.
+
+    With upstream set, every request is forwarded there and the response is
+    recorded into the fixtures instead. latency_s is added to each replayed
+    request to approximate NCBI round trips. usehistory=y searches get a
+    WebEnv/query_key that efetch can page through with retstart/retmax.
+    ESummary replies and "<doi>"[doi] searches are answered from the
+    recorded articles, for the reference verifier.
+    """
+
+    def __init__(self, fixtures: Fixtures, latency_s: float = 0.0, upstream: Optional[str] = None):
+        self.fixtures = fixtures
+        self.latency_s = latency_s
+        self.upstream = upstream
+        self.requests = {"esearch": 0, "efetch": 0, "esummary": 0}
+        self.misses = 0
+        # "<WebEnv>|<query_key>" -> normalized term, and recorded history pages by retstart
+        self._history: Dict[str, str] = {}
+        self._pages: Dict[str, Dict[int, List[str]]] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Start serving and return the base URL to use in place of EUTILS_BASE_URL.
+        """
+        app = web.Application()
+        app.router.add_route("*", "/esearch.fcgi", self._esearch)
+        app.router.add_route("*", "/efetch.fcgi", self._efetch)
+        app.router.add_route("*", "/esummary.fcgi", self._esummary)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        if self.upstream:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        return f"http://{bound_host}:{bound_port}"
+
+    async def stop(self):
+        if self._session is not None:
+            await self._session.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _params(self, request: web.Request) -> Dict[str, str]:
+        params = dict(request.query)
+        if request.method == "POST":
+            params.update(await request.post())
+        return params
+
+    async def _forward(self, endpoint: str, params: Dict[str, str]):
+        async with self._session.post(f"{self.upstream}/{endpoint}", data=params) as response:
+            return response.status, await response.read(), response.content_type
+
+    async def _esearch(self, request: web.Request) -> web.Response:
+        self.requests["esearch"] += 1
+        params = await self._params(request)
+        term, retmax = params.get("term", ""), int(params.get("retmax", 20))
+        use_history = params.get("usehistory") == "y"
+
+        if self.upstream:
+            status, body, content_type = await self._forward("esearch.fcgi", params)
+            if status == 200:
+                result = json.loads(body).get("esearchresult", {})
+                if use_history:
+                    # The PMIDs are recorded as the history pages are fetched
+                    self._history[f"{result.get('webenv')}|{result.get('querykey')}"] = normalize_query(term)
+                else:
+                    self.fixtures.searches[normalize_query(term)] = result.get("idlist", [])
+            return web.Response(status=status, body=body, content_type=content_type)
+
+        await asyncio.sleep(self.latency_s)
+        dois = re.findall(r'"([^"]+)"\[doi\]', term)
+        ids = self.fixtures.pmids_for_dois(dois) if dois else self.fixtures.searches.get(normalize_query(term))
+        if ids is None:
+            self.misses += 1
+            ids = []
+        result = {"count": str(len(ids)), "retmax": str(min(retmax, len(ids))), "idlist": ids[:retmax]}
+        if use_history:
+            webenv = f"STANDIN_{len(self._history) + 1}"
+            self._history[f"{webenv}|1"] = normalize_query(term)
+            result.update({"webenv": webenv, "querykey": "1"})
+        return web.json_response({"esearchresult": result})
+
+    async def _efetch(self, request: web.Request) -> web.Response:
+        self.requests["efetch"] += 1
+        params = await self._params(request)
+        ids = [pmid for pmid in params.get("id", "").split(",") if pmid]
+        history = f"{params.get('WebEnv')}|{params.get('query_key')}" if "WebEnv" in params else None
+        retstart, retmax = int(params.get("retstart", 0)), int(params.get("retmax", 20))
+
+        if self.upstream:
+            status, body, content_type = await self._forward("efetch.fcgi", params)
+            if status == 200:
+                pmids = self.fixtures.record_efetch(body)
+                term = self._history.get(history) if history else None
+                if term is not None:
+                    pages = self._pages.setdefault(term, {})
+                    pages[retstart] = pmids
+                    self.fixtures.searches[term] = [pmid for start in sorted(pages) for pmid in pages[start]]
+            return web.Response(status=status, body=body, content_type=content_type)
+
+        await asyncio.sleep(self.latency_s)
+        if history:
+            term = self._history.get(history)
+            ids = (self.fixtures.searches.get(term) or [])[retstart:retstart + retmax] if term else []
+        self.misses += sum(1 for pmid in ids if pmid not in self.fixtures.articles)
+        return web.Response(body=self.fixtures.efetch_payload(ids), content_type="text/xml")
+
+    async def _esummary(self, request: web.Request) -> web.Response:
+        self.requests["esummary"] += 1
+        params = await self._params(request)
+        if self.upstream:
+            # Summaries are derived from the recorded articles, so they are not recorded themselves
+            status, body, content_type = await self._forward("esummary.fcgi", params)
+            return web.Response(status=status, body=body, content_type=content_type)
+
+        await asyncio.sleep(self.latency_s)
+        ids = [pmid for pmid in params.get("id", "").split(",") if pmid]
+        return web.json_response({"result": self.fixtures.esummary_result(ids)})
+
+
+def _serialize(result: CreateResult, latency: float) -> Dict:
+    if isinstance(result.content, str):
+        content: Any = result.content
+    else:
+        content = [{"id": call.id, "name": call.name, "arguments": call.arguments} for call in result.content]
+    return {
+        "content": content,
+        "prompt_tokens": result.usage.prompt_tokens,
+        "completion_tokens": result.usage.completion_tokens,
+        "latency_s": round(latency, 3)
+    }
+
+
+def _deserialize(entry: Dict) -> CreateResult:
+    content = entry["content"]
+    if not isinstance(content, str):
+        content = [FunctionCall(id=call["id"], name=call["name"], arguments=call["arguments"]) for call in content]
+    return CreateResult(
+        finish_reason="stop" if isinstance(content, str) else "function_calls",
+        content=content,
+        usage=RequestUsage(prompt_tokens=entry.get("prompt_tokens", 0),
+                           completion_tokens=entry.get("completion_tokens", 0)),
+        cached=False
+    )
+
+
+class ReplayChatCompletionClient(ChatCompletionClient):
+    """
+    Model client that returns recorded completions in order.
+
+    latency_scale multiplies each completion's recorded latency (0 replays
+    instantly). Streaming calls yield the text in chunks before the result,
+    like the OpenAI client; with stream_usage_opt_in the result of a stream
+    carries usage only if stream_options.include_usage was requested, as
+    with the OpenAI API. Running out of completions means the flow no
+    longer matches the recording and raises ReplayExhausted.
+    """
+
+    def __init__(self, completions: List[Dict], model: str = "replay", latency_scale: float = 0.0,
+                 chunk_size: int = 64, stream_usage_opt_in: bool = False):
+        self.completions = completions
+        self.stream_usage_opt_in = stream_usage_opt_in
+        self.latency_scale = latency_scale
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self._usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        # Read by DelegatingChatCompletionClient.model_name for the metrics
+        self._create_args = {"model": model}
+
+    async def _next(self) -> CreateResult:
+        if self.calls >= len(self.completions):
+            raise ReplayExhausted(
+                f"Replay fixtures exhausted after {len(self.completions)} completions; "
+                "the flow no longer matches the recording"
+            )
+        entry = self.completions[self.calls]
+        self.calls += 1
+        if self.latency_scale:
+            await asyncio.sleep(entry.get("latency_s", 0) * self.latency_scale)
+        result = _deserialize(entry)
+        self._usage = RequestUsage(
+            prompt_tokens=self._usage.prompt_tokens + result.usage.prompt_tokens,
+            completion_tokens=self._usage.completion_tokens + result.usage.completion_tokens
+        )
+        return result
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        return await self._next()
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        result = await self._next()
+        if isinstance(result.content, str):
+            for i in range(0, len(result.content), self.chunk_size):
+                yield result.content[i:i + self.chunk_size]
+        if self.stream_usage_opt_in and not (extra_create_args.get("stream_options") or {}).get("include_usage"):
+            # Like the OpenAI API: a stream carries no usage unless the caller asks for it
+            result = result.model_copy(update={"usage": RequestUsage(prompt_tokens=0, completion_tokens=0)})
+        yield result
+
+    def actual_usage(self) -> RequestUsage:
+        return self._usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._usage
+
+    def count_tokens(self, messages: Sequence[LLMMessage], tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return sum(len(str(getattr(message, "content", ""))) for message in messages) // 4
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return 128000 - self.count_tokens(messages, tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:
+        return {"vision": False, "function_calling": True, "json_output": True}
+
+
+class RecordingChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Forwards to a real model client and keeps every completion for a fixture file.
+    """
+
+    def __init__(self, inner: ChatCompletionClient):
+        super().__init__(inner)
+        self.completions: List[Dict] = []
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        # Concurrent calls (Validator shards) are recorded in the order they were made, which is the replay order
+        slot = len(self.completions)
+        self.completions.append({})
+        start = time.perf_counter()
+        result = await super().create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token
+        )
+        self.completions[slot] = _serialize(result, time.perf_counter() - start)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        slot = len(self.completions)
+        self.completions.append({})
+        start = time.perf_counter()
+        async for chunk in super().create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token
+        ):
+            if isinstance(chunk, CreateResult):
+                self.completions[slot] = _serialize(chunk, time.perf_counter() - start)
+            yield chunk
+
+
+def synthetic_fixtures(topic: str = "exercise therapy for chronic low back pain", articles: int = 20,
+                       approved: int = 8, revise: bool = True) -> Fixtures:
+    """
+    Self-consistent fixtures for one run: one search round, Critic approval,
+    and (with revise) a synthesis that fails the reference check first.
+    """
+    filler = "Participants were followed for twelve months with standardized outcome measures. " * 6
+    fixtures = Fixtures(topic=topic, model="synthetic")
+    pmids = [str(30000000 + i) for i in range(articles)]
+    # One year per surname cycle keeps every (author, year) pair, and so every citation key, unique
+    years = [2024 - i // len(SURNAMES) for i in range(articles)]
+    keys = []
+    for i, pmid in enumerate(pmids):
+        last_name, year = SURNAMES[i % len(SURNAMES)], years[i]
+        keys.append(f"{last_name}{year}")
+        fixtures.articles[pmid] = ARTICLE_TEMPLATE.format(
+            pmid=pmid, volume=10 + i % 7, issue=1 + i % 4, year=year, first_page=100 + i, last_page=110 + i,
+            title=f"{topic.capitalize()}: outcomes in cohort {i + 1}.",
+            background=f"This study examines {topic} and its effect on patient outcomes.",
+            filler=filler, last_name=last_name, fore_name="Sam", initial="S",
+            publication_type=PUBLICATION_TYPES[i % len(PUBLICATION_TYPES)]
+        )
+
+    queries = [topic, f"{topic} randomized controlled trial", f"{topic} systematic review"]
+    width = max(1, articles * 3 // 5)
+    for i, query in enumerate(queries):
+        start = (articles - width) * i // max(1, len(queries) - 1)
+        fixtures.searches[normalize_query(query)] = pmids[start:start + width]
+
+    scored = [
+        {
+            "title": f"{topic.capitalize()}: outcomes in cohort {i + 1}.",
+            "doi": f"10.5555/synthetic.{pmid}",
+            "citation_key": keys[i],
+            "relevance_score": 5, "recency_score": 4, "methodology_score": 4,
+            "applicability_score": 4, "innovation_score": 3,
+            "total_score": 20 - i % 5,
+            "reason": "Directly addresses the topic with a robust design."
+        }
+        for i, pmid in enumerate(pmids)
+    ]
+    references = [
+        {
+            "title": paper["title"],
+            "authors": [f"{SURNAMES[i % len(SURNAMES)]} S", "Roe R", "et al."],
+            "year": str(years[i]),
+            "journal": "Journal of Synthetic Benchmark Medicine",
+            "doi": paper["doi"],
+            "citation_key": paper["citation_key"]
+        }
+        for i, paper in enumerate(scored[:approved])
+    ]
+
+    def synthesis(cited: List[str]) -> str:
+        sentences = [f"Evidence on {topic} continues to accumulate [{key}]." for key in cited]
+        return ("## Topic Introduction\n\n" + " ".join(sentences[:len(sentences) // 2]) +
+                "\n\n## Literature Summary\n\n" + " ".join(sentences[len(sentences) // 2:]) +
+                "\n\n## Study Objective\n\nThis review addresses the remaining gaps.\n\nSYNTHESIS_COMPLETE")
+
+    approved_keys = [ref["citation_key"] for ref in references]
+    outputs: List[Any] = [
+        "```json\n" + json.dumps({"main_queries": queries}, indent=2) + "\n```",
+        [{"id": "call_search_1", "name": "pubmed_multi_search", "arguments": json.dumps({"queries": queries})}],
+        # The Validator makes one call per shard; each shard keeps only its own papers from the full list
+        *[json.dumps({"scored_papers": scored})] * math.ceil(articles / validator_shard_size()),
+        "PROCEED_TO_SYNTHESIS\nApproved References:\n" + json.dumps(references, indent=2)
+    ]
+    if revise:
+        outputs.append(synthesis(approved_keys[:-1] + ["Unapproved2001"]))
+    outputs.append(synthesis(approved_keys))
+
+    for content in outputs:
+        fixtures.completions.append({
+            "content": content,
+            "prompt_tokens": 1500,
+            "completion_tokens": len(content if isinstance(content, str) else json.dumps(content)) // 4,
+            "latency_s": 1.0
+        })
+    return fixtures
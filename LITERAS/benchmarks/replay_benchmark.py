@@ -0,0 +1,305 @@
+"""
+Replay benchmark for pubmed_search, history paging, the efetch parser and the full AcademicSearchTeam flow.
+
+Usage (from the LITERAS directory):
+    python -m benchmarks.replay_benchmark
+    python -m benchmarks.replay_benchmark --fixtures recorded_run.json --runs 20 --concurrency 4
+    python -m benchmarks.replay_benchmark --json current.json --baseline baseline.json
+    python -m benchmarks.replay_benchmark --record recorded_run.json --topic "..."
+
+NCBI is replaced by a local stand-in server that answers esearch/efetch
+from the fixtures, and every agent gets a replay model client that returns
+the recorded completions in order. The tools, parser, selector, reference
+check and formatter all run their real code, without API quota. Without
+--fixtures a synthetic run is generated (see benchmarks/replay.py).
+
+--record runs one real query (needs OPENAI_API_KEY and network access)
+through a recording proxy and client and writes the fixture file.
+With --baseline, the exit status is 1 if any stage's p95 latency or peak
+memory regresses by more than --tolerance against a previous --json file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from autogen_ext.models.openai import OpenAIChatCompletionClient
+
+from app import tools
+from app.agents import AcademicSearchTeam
+from app.metrics import RunMetrics
+from app.pubmed_parser import parse_pubmed_xml
+from benchmarks.replay import (Fixtures, RecordingChatCompletionClient, ReplayChatCompletionClient, StandInEutils,
+                               synthetic_fixtures, use_eutils)
+
+
+def percentile_ms(timings: List[float], q: float) -> Optional[float]:
+    if not timings:
+        return None
+    ordered = sorted(timings)
+    return round(ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))] * 1000, 2)
+
+
+def stage_summary(timings: List[float], elapsed: float, memory: Optional[Dict] = None) -> Dict:
+    """
+    Count, throughput and p50/p95 latency of one stage, plus its memory profile if measured.
+    """
+    return {
+        "count": len(timings),
+        "per_s": round(len(timings) / elapsed, 2) if elapsed else None,
+        "p50_ms": percentile_ms(timings, 0.5),
+        "p95_ms": percentile_ms(timings, 0.95),
+        "peak_kib": memory["peak_kib"] if memory else None,
+        "blocks": memory["blocks"] if memory else None
+    }
+
+
+async def traced(work: Callable[[], Awaitable]) -> Dict:
+    """
+    Peak traced memory and the number of memory blocks allocated (and still live) by one run of work.
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    await work()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return {"peak_kib": round(peak / 1024), "blocks": blocks}
+
+
+async def bench_pubmed_search(fixtures: Fixtures, repeat: int) -> Dict:
+    async def search_all(timings: List[float]):
+        for term in fixtures.searches:
+            start = time.perf_counter()
+            await tools.pubmed_search(term)
+            timings.append(time.perf_counter() - start)
+
+    timings: List[float] = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await search_all(timings)
+    elapsed = time.perf_counter() - start
+    return stage_summary(timings, elapsed, await traced(lambda: search_all([])))
+
+
+async def bench_search_stream(fixtures: Fixtures, repeat: int) -> Dict[str, Dict]:
+    """
+    History-paged streaming of the largest recorded search: time to the first article and to the last.
+    """
+    term = max(fixtures.searches, key=lambda t: len(fixtures.searches[t]))
+
+    async def stream(first: List[float], total: List[float]):
+        start = time.perf_counter()
+        async for _ in tools.pubmed_search_stream(term, max_results=len(fixtures.searches[term])):
+            if len(first) < len(total) + 1:
+                first.append(time.perf_counter() - start)
+        total.append(time.perf_counter() - start)
+
+    first: List[float] = []
+    total: List[float] = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await stream(first, total)
+    elapsed = time.perf_counter() - start
+    return {
+        "pubmed_search_stream": stage_summary(total, elapsed, await traced(lambda: stream([], []))),
+        "  first article": stage_summary(first, elapsed)
+    }
+
+
+async def bench_parse(fixtures: Fixtures, repeat: int) -> Dict:
+    payload = fixtures.efetch_payload(list(fixtures.articles))
+    timings = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse_start = time.perf_counter()
+        parse_pubmed_xml(payload)
+        timings.append(time.perf_counter() - parse_start)
+    elapsed = time.perf_counter() - start
+
+    async def parse_once():
+        parse_pubmed_xml(payload)
+
+    return stage_summary(timings, elapsed, await traced(parse_once))
+
+
+async def run_pipeline(fixtures: Fixtures, latency_scale: float) -> RunMetrics:
+    """
+    One full AcademicSearchTeam run against the fixtures; raises if it does not reach the formatter.
+    """
+    # OpenAI-style streams: synthesis tokens are only counted if the streaming client asks for usage
+    client = ReplayChatCompletionClient(fixtures.completions, model=fixtures.model, latency_scale=latency_scale,
+                                        stream_usage_opt_in=True)
+    team = AcademicSearchTeam(model_client=client)
+    formatted = False
+    async for update in team.process_query(fixtures.topic):
+        if update.get("type") == "error":
+            raise RuntimeError(update["message"])
+        if update.get("type") == "update" and update.get("agent") == "FormatterAgent":
+            formatted = True
+    if not formatted:
+        raise RuntimeError(f"Replay ended without a formatted result after {client.calls} completions; "
+                           "the fixtures no longer match the pipeline")
+    synthesis = team.run_context.metrics.llm.get("SynthesisAgent")
+    if synthesis is not None and not synthesis["completion_tokens"]:
+        raise RuntimeError("Streamed SynthesisAgent calls recorded no token usage")
+    return team.run_context.metrics
+
+
+async def bench_pipeline(fixtures: Fixtures, runs: int, concurrency: int, latency_scale: float) -> Dict[str, Dict]:
+    """
+    Whole-run stage plus per-agent turn, LLM call and PubMed request stages taken from the run traces.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_run() -> RunMetrics:
+        async with semaphore:
+            return await run_pipeline(fixtures, latency_scale)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one_run() for _ in range(runs)))
+    elapsed = time.perf_counter() - start
+
+    stages: Dict[str, List[float]] = {}
+    for metrics in results:
+        for event in metrics.trace:
+            if event["kind"] == "message":
+                stages.setdefault(f"  agent {event['agent']}", []).append(event["duration_s"])
+            elif event["kind"] == "llm_call":
+                stages.setdefault("  llm call", []).append(event["duration_s"])
+            elif event["kind"] == "pubmed":
+                stages.setdefault(f"  pubmed {event['endpoint']}", []).append(event["duration_s"])
+
+    summaries = {"pipeline": stage_summary([m.wall_time_s for m in results], elapsed,
+                                           await traced(lambda: run_pipeline(fixtures, latency_scale)))}
+    for name in sorted(stages):
+        summaries[name] = stage_summary(stages[name], elapsed)
+    return summaries
+
+
+def compare(stages: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            min_delta_ms: float, min_delta_kib: float) -> List[str]:
+    """
+    Stages whose p95 latency or peak memory is worse than the baseline by more than tolerance.
+    """
+    regressions = []
+    for name, current in stages.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for key, floor in (("p95_ms", min_delta_ms), ("peak_kib", min_delta_kib)):
+            old, new = previous.get(key), current.get(key)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append(f"{name.strip()} {key}: {old} -> {new} (+{(new - old) / old:.0%})")
+    return regressions
+
+
+def print_table(stages: Dict[str, Dict]):
+    def cell(value, width):
+        return f"{'-' if value is None else value:>{width}}"
+
+    print(f"{'stage':<36} {'count':>6} {'per s':>9} {'p50 ms':>10} {'p95 ms':>10} {'peak KiB':>9} {'blocks':>8}")
+    for name, s in stages.items():
+        print(f"{name[:36]:<36} {cell(s['count'], 6)} {cell(s['per_s'], 9)} {cell(s['p50_ms'], 10)} "
+              f"{cell(s['p95_ms'], 10)} {cell(s['peak_kib'], 9)} {cell(s['blocks'], 8)}")
+
+
+async def record(path: str, topic: str, model: str):
+    fixtures = Fixtures(topic=topic, model=model)
+    server = StandInEutils(fixtures, upstream=tools.EUTILS_BASE_URL)
+    use_eutils(await server.start())
+    client = RecordingChatCompletionClient(
+        OpenAIChatCompletionClient(model=model, temperature=0.7, api_key=os.getenv("OPENAI_API_KEY"))
+    )
+    try:
+        async for update in AcademicSearchTeam(model_client=client).process_query(topic):
+            if update.get("type") == "update":
+                print(f"[{update['agent']}] {str(update['content'])[:100]!r}")
+    finally:
+        await tools.close_session()
+        await server.stop()
+    # Calls that failed keep an empty slot; they have no completion to replay
+    fixtures.completions = [completion for completion in client.completions if completion]
+    fixtures.save(path)
+    print(f"Recorded {len(fixtures.searches)} searches, {len(fixtures.articles)} articles and "
+          f"{len(fixtures.completions)} completions to {path}")
+
+
+async def benchmark(args) -> Dict[str, Dict]:
+    fixtures = Fixtures.load(args.fixtures) if args.fixtures else synthetic_fixtures(articles=args.synthetic)
+    server = StandInEutils(fixtures, latency_s=args.ncbi_latency)
+    use_eutils(await server.start())
+    try:
+        stages = {"pubmed_search": await bench_pubmed_search(fixtures, args.repeat)}
+        stages.update(await bench_search_stream(fixtures, args.repeat))
+        stages["parse_pubmed_xml"] = await bench_parse(fixtures, args.repeat)
+        stages.update(await bench_pipeline(fixtures, args.runs, args.concurrency, args.llm_latency_scale))
+    finally:
+        await tools.close_session()
+        await server.stop()
+    if server.misses:
+        print(f"Warning: {server.misses} NCBI requests were not covered by the fixtures")
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", help="Recorded fixture file (default: synthetic fixtures)")
+    parser.add_argument("--synthetic", type=int, default=20, help="Articles in the synthetic fixtures")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions of the pubmed_search and parser stages")
+    parser.add_argument("--runs", type=int, default=10, help="Full pipeline runs")
+    parser.add_argument("--concurrency", type=int, default=2, help="Pipeline runs in flight at once")
+    parser.add_argument("--ncbi-latency", type=float, default=0.0, help="Seconds added to each stand-in NCBI request")
+    parser.add_argument("--llm-latency-scale", type=float, default=0.0,
+                        help="Multiplier on the recorded completion latencies (0 replays instantly)")
+    parser.add_argument("--json", help="Write the stage results to this file")
+    parser.add_argument("--baseline", help="Previous --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Ignore p95 changes smaller than this")
+    parser.add_argument("--min-delta-kib", type=float, default=64.0,
+                        help="Ignore peak memory changes smaller than this")
+    parser.add_argument("--record", help="Record a real run of --topic to this fixture file")
+    parser.add_argument("--topic", help="Topic to record")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Model to record with")
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.topic:
+            parser.error("--record needs --topic")
+        asyncio.run(record(args.record, args.topic, args.model))
+        return
+
+    # Measure the pipeline itself: no PubMed or topic cache, no NCBI rate limit, no trace files
+    os.environ["PUBMED_CACHE_PATH"] = ""
+    os.environ["TOPIC_CACHE_PATH"] = ""
+    os.environ["LLM_CACHE_PATH"] = ""
+    os.environ["NCBI_REQUESTS_PER_SECOND"] = "100000"
+    os.environ["TRACE_DIR"] = ""
+    os.environ["VERIFICATION_INDEX_PATH"] = ":memory:"
+
+    stages = asyncio.run(benchmark(args))
+    print_table(stages)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"fixtures": args.fixtures or f"synthetic x{args.synthetic}", "stages": stages}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+        regressions = compare(stages, baseline, args.tolerance, args.min_delta_ms, args.min_delta_kib)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
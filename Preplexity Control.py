@@ -1,13 +1,16 @@
 import os
 import re
+import json
 import time
+import random
+import asyncio
+import argparse
 import logging
 import traceback
-from datetime import datetime
 
 import pandas as pd
 from tqdm import tqdm
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 # Configure logging
 logging.basicConfig(
@@ -22,10 +25,33 @@ if not API_KEY:
     raise ValueError("API_KEY environment variable not set")
 
 # Create OpenAI client
-client = OpenAI(api_key=API_KEY, base_url="https://api.perplexity.ai")
+client = AsyncOpenAI(api_key=API_KEY, base_url="https://api.perplexity.ai")
 
 
-def get_introduction(title, max_retries=3):
+class RequestRateLimiter:
+    """
+    Token bucket limiting API requests per minute across all concurrent workers.
+    """
+
+    def __init__(self, requests_per_minute):
+        self.rate = requests_per_minute / 60.0
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+
+async def get_introduction(title, rate_limiter, semaphore, max_retries=5):
     """
     Get a medical research paper introduction for a given title using the Perplexity API.
     """
@@ -67,12 +93,15 @@ Augmentation: If there are any specific instructions about the gap that the stud
 
     for attempt in range(max_retries):
         try:
-            logger.info(f"Calling Perplexity API (attempt {attempt + 1}/{max_retries})...")
-            start_time = time.time()
-            response = client.chat.completions.create(
-                model="sonar",
-                messages=messages,
-            )
+            # Only the request itself holds a concurrency slot, not the retry backoff
+            async with semaphore:
+                await rate_limiter.acquire()
+                logger.info(f"Calling Perplexity API (attempt {attempt + 1}/{max_retries})...")
+                start_time = time.time()
+                response = await client.chat.completions.create(
+                    model="sonar",
+                    messages=messages,
+                )
             api_time = time.time() - start_time
             logger.info(f"API call successful! (took {api_time:.2f} seconds)")
             logger.info(
@@ -92,9 +121,10 @@ Augmentation: If there are any specific instructions about the gap that the stud
         except Exception as e:
             logger.error(f"Error calling API (attempt {attempt + 1}/{max_retries}): {e}")
             if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                logger.info(f"Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
+                # Full jitter keeps retrying workers from hitting the API in lockstep
+                wait_time = random.uniform(0, 2 ** (attempt + 1))
+                logger.info(f"Waiting {wait_time:.1f} seconds before retry...")
+                await asyncio.sleep(wait_time)
             else:
                 logger.error("All retry attempts failed")
                 return None, None
@@ -134,34 +164,149 @@ def extract_references(text, citations):
     return full_text, reference_links
 
 
-def save_interim_results(results, filename=None):
-    """Save interim results to prevent data loss."""
-    if filename is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"interim_perplexity_results_{timestamp}.xlsx"
+class CheckpointStore:
+    """
+    Append-only JSONL log with one record per finished title.
+
+    Each record is flushed and fsynced as soon as it is written, so a crash
+    loses at most the titles still in flight. On restart the log is read back
+    and titles that already have a record are skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = self._load()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        complete = 0
+        with open(self.path, "rb") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.endswith(b"\n"):
+                    # A crash mid-write can leave a torn last line; that title is simply redone
+                    logger.warning(f"Dropping torn checkpoint line {line_number} in {self.path}")
+                    break
+                complete += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Ignoring unreadable checkpoint line {line_number} in {self.path}")
+                    continue
+                records[record["title"]] = record["row"]
+        if complete < os.path.getsize(self.path):
+            # Cut the torn line off so the next record does not get appended to it
+            with open(self.path, "r+b") as f:
+                f.truncate(complete)
+        logger.info(f"Loaded {len(records)} finished titles from checkpoint {self.path}")
+        return records
+
+    def __contains__(self, title):
+        return title in self.records
+
+    def append(self, title, row):
+        self._file.write(json.dumps({"title": title, "row": row}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records[title] = row
+
+    def close(self):
+        self._file.close()
+
+
+def process_result(title, intro_text, citations):
+    """Build the Excel row for one title, or None if the API call failed."""
+    if not (intro_text and citations):
+        logger.error(f"Failed to get introduction for: {title}")
+        return None
+
+    full_text, reference_links = extract_references(intro_text, citations)
+    row = {"Title": title, "Main Text": full_text}
+
+    logger.info(f"Adding {len(reference_links)} references to Excel row")
+    for j, url in reference_links.items():
+        row[f"Reference {j}"] = url
+
+    logger.info("WHAT'S BEING SAVED TO EXCEL:")
+    logger.info(f"  - Title: \"{title}\"")
+    logger.info(f"  - Main Text Length: {len(full_text)} characters")
+    logger.info(f"  - Reference Count: {len(reference_links)}")
+    return row
+
+
+async def process_titles(titles, checkpoint, concurrency, requests_per_minute, max_retries):
+    """
+    Process the titles that have no checkpoint record yet, concurrently.
+
+    At most `concurrency` requests are in flight, and all workers share one
+    requests-per-minute budget. Each successful row is appended to the
+    checkpoint as soon as it is ready; failed titles are not recorded, so a
+    rerun retries them.
+    """
+    pending = [(i, title) for i, title in enumerate(titles) if title not in checkpoint]
+    logger.info(f"{len(titles) - len(pending)} titles already checkpointed, {len(pending)} to process")
+
+    rate_limiter = RequestRateLimiter(requests_per_minute)
+    semaphore = asyncio.Semaphore(concurrency)
+    progress = tqdm(total=len(pending), desc="Processing titles")
+
+    async def worker(i, title):
+        logger.info("=" * 80)
+        logger.info(f"PROCESSING TITLE {i + 1}/{len(titles)}: \"{title}\"")
+        logger.info("=" * 80)
+        intro_text, citations = await get_introduction(title, rate_limiter, semaphore, max_retries=max_retries)
+
+        row = process_result(title, intro_text, citations)
+        if row is not None:
+            checkpoint.append(title, row)
+            logger.info(f"Checkpointed row for title #{i + 1}")
+        progress.update(1)
 
     try:
-        # Create a deep copy of results to be saved.
-        results_copy = [row.copy() for row in results]
-        df_interim = pd.DataFrame(results_copy)
+        await asyncio.gather(*(worker(i, title) for i, title in pending))
+    finally:
+        progress.close()
 
-        logger.info(f"Excel columns to be saved: {list(df_interim.columns)}")
-        logger.info(f"DataFrame shape: {df_interim.shape}")
 
-        df_interim.to_excel(filename, index=False)
-        logger.info(f"Interim results saved to {filename}")
-    except Exception as e:
-        logger.error(f"Error saving interim results: {e}")
+def export_results(results, output_file):
+    """Write the final rows to Excel, or to Parquet if the output ends in .parquet."""
+    df_results = pd.DataFrame(results)
+    logger.info(f"Final DataFrame shape: {df_results.shape}")
+    logger.info(f"Final columns: {list(df_results.columns)}")
+
+    if output_file.endswith(".parquet"):
+        df_results.to_parquet(output_file, index=False)
+    else:
+        df_results.to_excel(output_file, index=False)
+    logger.info(f"Final results saved to {output_file}")
+    return df_results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate introductions for a sheet of titles with Perplexity.")
+    parser.add_argument("--input", default="title_sheet.xlsx", help="Excel file with a 'titles' column")
+    parser.add_argument("--output", default="perplexity_literature_review.xlsx",
+                        help="Final export; .xlsx or .parquet")
+    parser.add_argument("--checkpoint", default="perplexity_checkpoint.jsonl",
+                        help="Append-only log of finished titles; rerun with the same file to resume")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum requests in flight")
+    parser.add_argument("--rpm", type=float, default=50, help="Request budget per minute")
+    parser.add_argument("--max-retries", type=int, default=5)
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+
     logger.info("=" * 80)
     logger.info("PERPLEXITY MEDICAL PAPER GENERATOR")
     logger.info("=" * 80)
 
     # Configuration: input and output file names.
-    input_file = "title_sheet.xlsx"
-    output_file = "perplexity_literature_review.xlsx"
+    input_file = args.input
+    output_file = args.output
 
     try:
         if not os.path.exists(input_file):
@@ -182,43 +327,18 @@ def main():
         logger.error(f"Error reading Excel file: {e}")
         return
 
-    results = []
-    max_refs = 0
-
-    for i, title in enumerate(tqdm(titles, desc="Processing titles")):
-        logger.info("=" * 80)
-        logger.info(f"PROCESSING TITLE {i + 1}/{len(titles)}: \"{title}\"")
-        logger.info("=" * 80)
-
-        intro_text, citations = get_introduction(title)
-
-        if intro_text and citations:
-            full_text, reference_links = extract_references(intro_text, citations)
-            row = {"Title": title, "Main Text": full_text}
-
-            logger.info(f"Adding {len(reference_links)} references to Excel row")
-            for j, url in reference_links.items():
-                row[f"Reference {j}"] = url
-
-            max_refs = max(max_refs, len(reference_links))
-            logger.info(f"Max references across all titles so far: {max_refs}")
-            logger.info("WHAT'S BEING SAVED TO EXCEL:")
-            logger.info(f"  - Title: \"{title}\"")
-            logger.info(f"  - Main Text Length: {len(full_text)} characters")
-            logger.info(f"  - Reference Count: {len(reference_links)}")
-
-            results.append(row)
-            logger.info(f"Successfully added row for title #{i + 1} to results")
-
-            # Save interim results every 10 titles or at the end.
-            if (i + 1) % 10 == 0 or (i + 1) == len(titles):
-                save_interim_results(results)
+    logger.info(f"Running with concurrency={args.concurrency}, rpm={args.rpm}")
+    checkpoint = CheckpointStore(args.checkpoint)
+    try:
+        asyncio.run(process_titles(titles, checkpoint, args.concurrency, args.rpm, args.max_retries))
+    finally:
+        checkpoint.close()
 
-            wait_time = 2
-            logger.info(f"Waiting {wait_time} seconds before next API call...")
-            time.sleep(wait_time)
-        else:
-            logger.error(f"Failed to get introduction for: {title}")
+    # The export is built once, in input order, from everything checkpointed so far.
+    results = [dict(checkpoint.records[title]) for title in dict.fromkeys(titles) if title in checkpoint]
+    logger.info(f"{len(results)}/{len(titles)} titles have results")
+    max_refs = max((sum(1 for key in row if key.startswith("Reference ")) for row in results), default=0)
+    logger.info(f"Max references across all titles: {max_refs}")
 
     if results:
         logger.info("Preparing final Excel file...")
@@ -229,12 +349,7 @@ def main():
                 if f"Reference {i}" not in row:
                     row[f"Reference {i}"] = ""
 
-        df_results = pd.DataFrame(results)
-        logger.info(f"Final DataFrame shape: {df_results.shape}")
-        logger.info(f"Final columns: {list(df_results.columns)}")
-
-        df_results.to_excel(output_file, index=False)
-        logger.info(f"Final results saved to {output_file}")
+        df_results = export_results(results, output_file)
 
         logger.info("Sample of final data (first row):")
         sample_row = df_results.iloc[0] if not df_results.empty else None